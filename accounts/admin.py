@@ -1,8 +1,52 @@
 from django.contrib import admin
+from django.utils.translation import ugettext_lazy as _
 
-from accounts.models import User
+from accounts.bulk import activate_clients, close_clients
+from accounts.models import (
+    User, QueuedMail, BalanceTransaction, StatusChange)
 
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    pass
+    # Balance is changed only through balance transactions and status
+    # only through transitions, see ``accounts.transitions``
+    readonly_fields = ('balance', 'status', 'status_changed', 'version')
+    actions = ('activate', 'confirm_deactivation')
+
+    def change_statuses(self, request, queryset, change, status):
+        results = change(list(queryset.values_list('pk', flat=True)))
+        changed = sum(result == status for result in results.values())
+        self.message_user(request, _('{} of {} clients changed.').format(
+            changed, len(results)))
+
+    def activate(self, request, queryset):
+        self.change_statuses(request, queryset, activate_clients,
+                             User.STATUS_CHOICES.activated)
+    activate.short_description = _('Activate selected clients')
+
+    def confirm_deactivation(self, request, queryset):
+        self.change_statuses(request, queryset, close_clients,
+                             User.STATUS_CHOICES.closed)
+    confirm_deactivation.short_description = _(
+        'Confirm deactivation of selected clients')
+
+
+@admin.register(QueuedMail)
+class QueuedMailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts',
+                    'next_attempt', 'sent')
+    list_filter = ('status', )
+
+
+@admin.register(BalanceTransaction)
+class BalanceTransactionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'amount', 'description', 'created')
+    raw_id_fields = ('user', )
+
+
+@admin.register(StatusChange)
+class StatusChangeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'old_status', 'status', 'changed_at',
+                    'duration')
+    list_filter = ('status', )
+    raw_id_fields = ('user', )
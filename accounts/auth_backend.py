@@ -1,16 +1,19 @@
+from django.core.exceptions import PermissionDenied
 from django.contrib.auth.backends import ModelBackend
 
-from accounts.models import User
+from accounts.models import User, make_pin_digest
+from accounts.sharding import find_user
 
 
 class PinBackend(ModelBackend):
 
-    def authenticate(self, **credentials):
-        pin = credentials.get('pin')
-        if pin:
-            try:
-                return User.objects.get(pin=pin)
-            except User.DoesNotExist as error:
-                raise error
+    def authenticate(self, request=None, pin=None, **credentials):
+        if pin is None:
+            return None
 
-        return None
+        try:
+            return find_user(pin=make_pin_digest(pin))
+        except User.DoesNotExist:
+            # Pin login is not valid for other backends, stop here instead
+            # of letting them query users table again
+            raise PermissionDenied
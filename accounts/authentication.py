@@ -0,0 +1,61 @@
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authentication import (
+    BaseAuthentication, TokenAuthentication, get_authorization_header)
+
+from accounts.models import User
+from accounts.cache import token_cache
+from accounts.sharding import get_user_shard
+from accounts.tokens import InvalidToken, read_token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    ``TokenAuthentication`` which resolves token key through
+    ``token_cache``, so repeated requests with the same token do not
+    query token and user.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, (user, token))
+        return user, token
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates ``Authorization: Bearer <token>`` with signed access
+    token of ``accounts.tokens``. User is built from the token without
+    database query (only shard is read from directory when users are
+    sharded), other fields are loaded on access.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed(_('Invalid token header.'))
+
+        try:
+            user_id, status = read_token(auth[1].decode())
+        except UnicodeError:
+            raise AuthenticationFailed(_('Invalid token header.'))
+        except InvalidToken as error:
+            raise AuthenticationFailed(error.args[0])
+
+        # Tokens of deactivated users are revoked
+        loaded = {'id': user_id, 'status': status, 'is_active': True}
+        field_names = [field.attname for field in User._meta.concrete_fields
+                       if field.attname in loaded]
+        user = User.from_db(get_user_shard(user_id), field_names,
+                            [loaded[name] for name in field_names])
+        return user, auth[1].decode()
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,321 @@
+import json
+import math
+import time
+import random
+from itertools import count
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db.models import Sum
+from django.db import OperationalError, connection, transaction
+from django.urls import reverse
+from django.test import RequestFactory
+from django.core.handlers.wsgi import WSGIHandler
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.authentication import TokenAuthentication
+
+from accounts.ledger import post_entry
+from accounts.tokens import issue_tokens
+from accounts.models import User, BalanceTransaction, make_pin_digest
+from accounts.cache import token_cache
+from accounts.authentication import CachedTokenAuthentication
+from accounts.serializers import UserSerializer, UserValuesSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+def create_clients(count):
+    User.objects.bulk_create(
+        (User(email=f'benchmark{i}@example.com', password='!',
+              first_name='First', last_name='Last', balance=i,
+              passport_number=f'BENCH{i}')
+         for i in range(count)), batch_size=500)
+    return User.objects.filter(email__startswith='benchmark')
+
+
+def rows_per_second(count, serialize):
+    started = time.perf_counter()
+    serialize()
+    return count / (time.perf_counter() - started)
+
+
+def benchmark_serializers(sizes=(1000, 10000, 100000)):
+    """
+    Measures rows per second of client list serialization, from query to
+    JSON, with ``UserSerializer`` and ``UserValuesSerializer``. Clients are
+    created in transaction which is rolled back afterwards.
+    Returns list of (rows, model rows/s, values rows/s).
+    """
+    renderer = JSONRenderer()
+    fields = UserValuesSerializer.fields
+    results = []
+    for size in sizes:
+        try:
+            with transaction.atomic():
+                queryset = create_clients(size).order_by('id')
+
+                def models():
+                    renderer.render(UserSerializer(list(queryset),
+                                                   many=True).data)
+
+                def values():
+                    renderer.render(UserValuesSerializer(
+                        list(queryset.values(*fields)), many=True).data)
+
+                results.append((size, rows_per_second(size, models),
+                                rows_per_second(size, values)))
+                raise Rollback
+        except Rollback:
+            pass
+    return results
+
+
+def benchmark_token_authentication(requests=10000):
+    """
+    Measures requests per second and queries per request of token
+    authentication with stock ``TokenAuthentication`` and
+    ``CachedTokenAuthentication``. Manager is created in transaction which
+    is rolled back afterwards.
+    Returns dict of class name to (requests/s, queries per request).
+    """
+    results = {}
+    try:
+        with transaction.atomic():
+            manager = User.objects.create(
+                email='benchmark-manager@example.com', is_manager=True,
+                is_active=True)
+            token = Token.objects.create(user=manager)
+            request = RequestFactory().get(
+                '/', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+            for authentication in (TokenAuthentication(),
+                                   CachedTokenAuthentication()):
+                def authenticate():
+                    for i in range(requests):
+                        authentication.authenticate(request)
+
+                token_cache.clear()
+                authentication.authenticate(request)  # warm up cache
+                with CaptureQueriesContext(connection) as queries:
+                    authentication.authenticate(request)
+                results[type(authentication).__name__] = (
+                    rows_per_second(requests, authenticate), len(queries))
+            raise Rollback
+    except Rollback:
+        pass
+    token_cache.delete(token.key)
+    return results
+
+
+def stress_ledger(threads=8, postings=500):
+    """
+    Posts ``postings`` entries from each of ``threads`` concurrent threads
+    to one client and compares its balance with the ledger. Client is
+    committed to be visible to all threads and deleted afterwards.
+    Returns dict with postings per second, expected and actual balance
+    and ledger sum.
+    """
+    user = User.objects.create(email='stress@example.com', password='!')
+
+    def post():
+        try:
+            for i in range(postings):
+                while True:
+                    try:
+                        post_entry(user.pk, 1)
+                        break
+                    except OperationalError:  # SQLite database is locked
+                        time.sleep(0.001)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(post) for i in range(threads)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    result = {
+        'postings_per_second': threads * postings / elapsed,
+        'expected': threads * postings,
+        'balance': User.objects.values_list('balance', flat=True).get(
+            pk=user.pk),
+        'ledger': BalanceTransaction.objects.filter(user=user).aggregate(
+            total=Sum('amount'))['total']
+    }
+    user.delete()
+    return result
+
+
+def seed_clients(count, seed=0):
+    """
+    Creates manager and ``count`` clients with factories, a quarter of
+    clients in each status. Data depends only on ``seed``, so runs are
+    comparable. Activated clients have pins ``000000``, ``000001``...
+    Returns manager and dict of status to client ids.
+    """
+    # Test libraries are needed only for seeding
+    from faker import Faker
+    from factory import fuzzy
+    from accounts.tests.factories import UserFactory, ManagerFactory
+
+    random.seed(seed)
+    Faker.seed(seed)
+    fuzzy.reseed_random(seed)
+    UserFactory.reset_sequence()
+
+    statuses = [status for status, _ in User.STATUS_CHOICES]
+    clients = UserFactory.build_batch(count, password=None)
+    for i, client in enumerate(clients):
+        client.status = statuses[i % len(statuses)]
+        client.is_active = client.status == User.STATUS_CHOICES.activated
+        if client.is_active:
+            client.pin = make_pin_digest(f'{i // len(statuses):06d}')
+    User.objects.bulk_create(clients, batch_size=100)
+
+    ids = {status: [] for status in statuses}
+    for pk, status in User.objects.filter(is_manager=False).\
+            order_by('id').values_list('pk', 'status'):
+        ids[status].append(pk)
+    return ManagerFactory(password=None), ids
+
+
+def percentile(latencies, percent):
+    # Nearest rank of sorted latencies
+    return latencies[max(math.ceil(percent / 100 * len(latencies)) - 1, 0)]
+
+
+def benchmark_endpoints(users=1000, requests=200, threads=4, seed=0):
+    """
+    Seeds clients with ``seed_clients`` and sends ``requests`` requests to
+    each endpoint from ``threads`` concurrent threads through the WSGI
+    application, without network. Clients are committed, run it on empty
+    (test) database.
+    Activation requests are limited by number of clients in ``creating``
+    status. Returns dict of endpoint to requests/s, p50/p95/p99 latency in
+    milliseconds, average queries per request and failed requests count.
+    """
+    manager, ids = seed_clients(users, seed)
+    auth = {'HTTP_AUTHORIZATION': 'Bearer ' + issue_tokens(manager)['access']}
+    factory = RequestFactory()
+    activated = len(ids[User.STATUS_CHOICES.activated])
+    creating = iter(ids[User.STATUS_CHOICES.creating])
+    sequence = count()
+    lock = Lock()
+
+    def register():
+        i = next(sequence)
+        return factory.post(reverse('accounts:register'), json.dumps({
+            'email': f'load{i}@example.com', 'first_name': 'Load',
+            'last_name': 'Test', 'passport_number': f'L{i}'
+        }), content_type='application/json')
+
+    def login():
+        pin = f'{random.randrange(activated):06d}'
+        return factory.post(reverse('accounts:login'),
+                            json.dumps({'pin': pin}),
+                            content_type='application/json')
+
+    def activate():
+        with lock:
+            pk = next(creating)
+        return factory.patch(
+            reverse('accounts:users-activate', kwargs={'pk': pk}), **auth)
+
+    scenarios = {
+        'register': register,
+        'login': login,
+        'users-list': lambda: factory.get(
+            reverse('accounts:users-list'), **auth),
+        'users-detail': lambda: factory.get(reverse(
+            'accounts:users-detail',
+            kwargs={'pk': random.choice(ids[User.STATUS_CHOICES.closing])}),
+            **auth),
+        'users-counts': lambda: factory.get(
+            reverse('accounts:users-counts'), **auth),
+        'users-activate': activate,
+    }
+
+    handler = WSGIHandler()
+    results = {}
+    for name, make_request in scenarios.items():
+        if name == 'users-activate':
+            requests = min(requests, len(ids[User.STATUS_CHOICES.creating]))
+        results[name] = load_test(handler, make_request, requests, threads)
+    return results
+
+
+def load_test(handler, make_request, requests, threads):
+    """
+    Sends ``requests`` requests made by ``make_request`` to WSGI
+    ``handler`` from ``threads`` concurrent threads. Returns requests/s,
+    p50/p95/p99 latency in milliseconds, average queries per request and
+    failed requests count.
+    """
+    samples = []
+
+    def send():
+        environ = make_request().environ
+        statuses = []
+        started = time.perf_counter()
+        response = handler(environ, lambda status, headers:
+                           statuses.append(status))
+        b''.join(response)
+        elapsed = time.perf_counter() - started
+        # Query log is reset when next request starts
+        queries = len(connection.queries_log)
+        response.close()
+        return elapsed, queries, not statuses[0].startswith(('2', '3'))
+
+    def run(requests):
+        connection.force_debug_cursor = True
+        try:
+            return [send() for i in range(requests)]
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for part in executor.map(run, [len(range(i, requests, threads))
+                                       for i in range(threads)]):
+            samples += part
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, _, _ in samples)
+    return {
+        'requests_per_second': round(len(samples) / elapsed, 1),
+        'p50': round(percentile(latencies, 50), 2),
+        'p95': round(percentile(latencies, 95), 2),
+        'p99': round(percentile(latencies, 99), 2),
+        'queries': round(sum(queries for _, queries, _ in samples) /
+                         len(samples), 2),
+        'errors': sum(failed for _, _, failed in samples),
+    }
+
+
+def benchmark_registration(requests=200, threads=8):
+    """
+    Load tests ``RegisterView`` with concurrent registrations of new
+    clients, see ``load_test``. Failed requests are mostly "database is
+    locked" errors. Registrations are committed, run it on empty (test)
+    database.
+    """
+    from accounts.tests.factories import ManagerFactory
+
+    ManagerFactory()
+    factory = RequestFactory()
+    sequence = count()
+    url = reverse('accounts:register')
+
+    def register():
+        i = next(sequence)
+        return factory.post(url, json.dumps({
+            'email': f'register{i}@example.com', 'first_name': 'Load',
+            'last_name': 'Test', 'passport_number': f'R{i}'
+        }), content_type='application/json')
+
+    return load_test(WSGIHandler(), register, requests, threads)
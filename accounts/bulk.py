@@ -0,0 +1,241 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, Value, When
+from django.utils import timezone
+from django.db.models.functions import Lower
+from django.utils.translation import ugettext_lazy as _
+
+from allauth.account.models import EmailAddress
+
+from accounts.db import get_chunk_size
+from accounts.pins import claim_pins, retry_pin_collisions
+from accounts.models import User, make_pin_digest
+from accounts.cache import get_manager_emails, bump_users_versions
+from accounts.counters import count_status_change, get_status_count
+from accounts.history import record_status_changes
+from accounts.transitions import can_change_status, change_statuses
+from accounts.mail import queue_mail, queue_mails, activation_mail
+from accounts.serializers import (
+    RegisterSerializer, BulkRegisterRowSerializer)
+from accounts.sharding import (
+    atomic_on_all_shards, get_directory, get_shard_querysets,
+    save_new_user, save_new_users)
+
+CHUNK_SIZE = getattr(settings, 'BULK_REGISTRATION_CHUNK_SIZE', 500)
+# Ids per UPDATE statement at most, fewer if database limits parameters
+UPDATE_CHUNK_SIZE = 400
+# Parameters of activation UPDATE for each id: id and pin of ``When``, id
+# and version in WHERE. The rest are status guard and set values.
+UPDATE_PARAMS_PER_ID = 4
+UPDATE_FIXED_PARAMS = 10
+
+NOT_FOUND = 'not_found'
+
+ERROR_MESSAGES = RegisterSerializer.default_error_messages
+
+
+def register_clients(rows, chunk_size=CHUNK_SIZE):
+    """
+    Registers clients from iterable of dicts with ``RegisterSerializer``
+    fields. Rows are validated and inserted by chunks, uniqueness is
+    checked with one query per chunk. Managers get one mail per batch.
+
+    Returns report ``{'created': count, 'errors': [{'index', 'errors'}]}``.
+    """
+    report = {'created': 0, 'errors': []}
+    rows = iter(rows)
+    offset = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        _register_chunk(chunk, offset, report)
+        offset += len(chunk)
+    report['errors'].sort(key=lambda error: error['index'])
+
+    if report['created']:
+        mail_context = {
+            'registered': report['created'],
+            'waiting': get_status_count(User.STATUS_CHOICES.creating)
+        }
+        queue_mail(  # Digest mail to managers
+            subject=_('New clients registered in buddha application!'),
+            template_path='email/clients_registered_mail_to_manager.txt',
+            context=mail_context,
+            recipient_list=get_manager_emails())
+
+    return report
+
+
+def _register_chunk(chunk, offset, report):
+    errors = report['errors']
+
+    valid = []
+    for index, row in enumerate(chunk, offset):
+        if not isinstance(row, dict):
+            errors.append({'index': index, 'errors': {
+                'non_field_errors': [_('Invalid row.')]}})
+            continue
+
+        serializer = BulkRegisterRowSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    # Emails are compared case-insensitively, like in single registration
+    emails = {data['email'].lower() for index, data in valid}
+    passports = {data['passport_number'] for index, data in valid}
+    taken_emails = set(_lower_emails(get_directory(), emails))
+    taken_emails.update(_lower_emails(EmailAddress.objects, emails))
+    taken_passports = set(get_directory().filter(
+        passport_number__in=passports).values_list(
+        'passport_number', flat=True))
+
+    users = []
+    for index, data in valid:
+        if data['email'].lower() in taken_emails:
+            errors.append({'index': index, 'errors': {
+                'email': [ERROR_MESSAGES['email_taken']]}})
+        elif data['passport_number'] in taken_passports:
+            errors.append({'index': index, 'errors': {
+                'non_field_errors': [ERROR_MESSAGES['passport_taken']]}})
+        else:
+            # Also catches duplicates inside the batch
+            taken_emails.add(data['email'].lower())
+            taken_passports.add(data['passport_number'])
+            users.append((index, User(
+                **data, status=User.STATUS_CHOICES.creating)))
+
+    with transaction.atomic():
+        created = _create_users(users, errors)
+        count_status_change(None, User.STATUS_CHOICES.creating, len(created))
+        record_status_changes(created, None, User.STATUS_CHOICES.creating,
+                              timezone.now())
+        bump_users_versions(user.pk for user in created)
+        queue_mails({  # Mails to clients
+            'subject': _('You have been registered in buddha application!'),
+            'template_path': 'email/client_registered_mail.txt',
+            'context': {'first_name': user.first_name,
+                        'last_name': user.last_name},
+            'recipient_list': [user.email]
+        } for user in created)
+
+    report['created'] += len(created)
+
+
+def _lower_emails(queryset, emails):
+    return queryset.annotate(email_lower=Lower('email')).filter(
+        email_lower__in=emails).values_list('email_lower', flat=True)
+
+
+def _create_users(users, errors):
+    try:
+        with transaction.atomic():
+            save_new_users([user for index, user in users])
+    except IntegrityError:
+        pass
+    else:
+        created = [user for index, user in users]
+        _set_pks(created)
+        return created
+
+    # Concurrent registration took some email or passport number, find it
+    # row by row
+    serializer = RegisterSerializer()
+    created = []
+    for index, user in users:
+        try:
+            with transaction.atomic():
+                save_new_user(user)
+        except IntegrityError:
+            errors.append({'index': index, 'errors': (
+                serializer.get_uniqueness_errors(
+                    user.email, user.passport_number) or
+                {'email': [ERROR_MESSAGES['email_taken']]})})
+        else:
+            created.append(user)
+    return created
+
+
+def _set_pks(users):
+    # Only some databases return ids of bulk inserted rows
+    if users and users[0].pk is None:
+        pks = dict(User.objects.filter(
+            email__in=[user.email for user in users]).
+            values_list('email', 'pk'))
+        for user in users:
+            user.pk = pks[user.email]
+
+
+def _load_clients(ids, results):
+    """
+    Returns clients of given ids, results of missing ids are set to
+    ``NOT_FOUND``.
+    """
+    queryset = User.objects.filter(pk__in=ids, is_manager=False).only(
+        'pk', 'status', 'status_changed', 'version', 'email', 'first_name',
+        'last_name')
+    clients = [user for queryset in get_shard_querysets(queryset)
+               for user in queryset]
+    found = {user.pk for user in clients}
+    for pk in ids:
+        if pk not in found:
+            results[pk] = NOT_FOUND
+    return clients
+
+
+def _chunks(ids):
+    ids = list(dict.fromkeys(ids))
+    size = get_chunk_size(UPDATE_PARAMS_PER_ID, UPDATE_FIXED_PARAMS,
+                          UPDATE_CHUNK_SIZE)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+@retry_pin_collisions
+@atomic_on_all_shards()
+def activate_clients(ids):
+    """
+    Bulk version of ``UserAPI.activate`` for clients in ``creating``
+    status. Each chunk is activated with one UPDATE which sets pins
+    claimed from the pool. Returns result for each id.
+    """
+    activated = User.STATUS_CHOICES.activated
+    results = {}
+    for chunk in _chunks(ids):
+        clients = _load_clients(chunk, results)
+        pks = [user.pk for user in clients
+               if can_change_status(user, activated)]
+        pins = dict(zip(pks, claim_pins(len(pks))))
+        pin = Case(*[When(pk=pk, then=Value(make_pin_digest(pin)))
+                     for pk, pin in pins.items()], output_field=CharField())
+
+        changed, failed = change_statuses(clients, activated, pin=pin)
+        results.update(failed)
+        queue_mails(activation_mail(user, pins[user.pk])
+                    for user in changed)
+        for user in changed:
+            results[user.pk] = activated
+
+    return results
+
+
+@atomic_on_all_shards()
+def close_clients(ids):
+    """
+    Bulk version of ``UserAPI.deactivate_confirm`` for clients in
+    ``closing`` status. Returns result for each id.
+    """
+    closed = User.STATUS_CHOICES.closed
+    results = {}
+    for chunk in _chunks(ids):
+        changed, failed = change_statuses(
+            _load_clients(chunk, results), closed)
+        results.update(failed)
+        for user in changed:
+            results[user.pk] = closed
+
+    return results
@@ -0,0 +1,180 @@
+import time
+import uuid
+import threading
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.core.cache import cache
+from django.db.models.base import ModelState
+from rest_framework.authtoken.models import Token
+
+from accounts.models import User
+
+MANAGER_EMAILS_KEY = 'accounts:manager-emails'
+# Safety net for changes made without signals (e.g. ``QuerySet.update``)
+MANAGER_EMAILS_TIMEOUT = getattr(
+    settings, 'MANAGER_EMAILS_CACHE_TIMEOUT', 60 * 60)
+
+TOKEN_KEY = 'accounts:token:{}'
+TOKEN_CACHE_TIMEOUT = getattr(settings, 'TOKEN_CACHE_TIMEOUT', 5 * 60)
+# Other processes can not invalidate in-process entries, so their timeout
+# is how long revoked token may still work in other worker processes
+TOKEN_LOCAL_CACHE_TIMEOUT = getattr(
+    settings, 'TOKEN_LOCAL_CACHE_TIMEOUT', 10)
+TOKEN_LOCAL_CACHE_SIZE = getattr(settings, 'TOKEN_LOCAL_CACHE_SIZE', 1024)
+
+USERS_VERSION_KEY = 'accounts:users:version'
+USER_VERSION_KEY = 'accounts:user:{}:version'
+USERS_RESPONSE_KEY = 'accounts:users:response:{}'
+# Responses are cached under version, so they are never invalidated, only
+# replaced by new version. Expired version is replaced by new one too.
+USERS_RESPONSE_TIMEOUT = getattr(
+    settings, 'USERS_RESPONSE_CACHE_TIMEOUT', 60 * 60)
+
+
+def get_manager_emails():
+    """
+    Returns emails of all managers. List is cached and invalidated by
+    ``User`` signals, see ``accounts.signals``.
+    """
+    emails = cache.get(MANAGER_EMAILS_KEY)
+    if emails is None:
+        emails = list(User.objects.filter(is_manager=True).
+                      values_list('email', flat=True))
+        cache.set(MANAGER_EMAILS_KEY, emails, MANAGER_EMAILS_TIMEOUT)
+    return emails
+
+
+def invalidate_manager_emails():
+    cache.delete(MANAGER_EMAILS_KEY)
+
+
+class TokenCache(object):
+    """
+    Caches ``(user, token)`` of authentication token key. In-process LRU
+    with TTL is checked first, then Django cache shared by processes.
+    Entries are invalidated by ``Token`` and ``User`` signals, see
+    ``accounts.signals``.
+    """
+
+    def __init__(self, size, local_timeout, timeout):
+        self.size = size
+        self.local_timeout = local_timeout
+        self.timeout = timeout
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is not None and entry[0] > now:
+                self.local.move_to_end(key)
+                self.stats['local_hits'] += 1
+                return self._copy(entry[1])
+
+        value = cache.get(TOKEN_KEY.format(key))
+        with self.lock:
+            self.stats['hits' if value is not None else 'misses'] += 1
+        if value is None:
+            return None
+        self._set_local(key, value)
+        return self._copy(value)
+
+    def set(self, key, value):
+        cache.set(TOKEN_KEY.format(key), value, self.timeout)
+        self._set_local(key, self._copy(value))
+
+    def delete(self, *keys):
+        cache.delete_many([TOKEN_KEY.format(key) for key in keys])
+        with self.lock:
+            for key in keys:
+                self.local.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.local.clear()
+            self.stats.clear()
+
+    def _set_local(self, key, value):
+        with self.lock:
+            self.local[key] = (time.monotonic() + self.local_timeout, value)
+            self.local.move_to_end(key)
+            while len(self.local) > self.size:
+                self.local.popitem(last=False)
+
+    @staticmethod
+    def _copy(value):
+        # Requests change and save ``request.user``, cached one must stay
+        # as is. Model ``copy.copy`` goes through pickling, this is faster.
+        user, token = (_copy_instance(instance) for instance in value)
+        token.user = user
+        return user, token
+
+
+def _copy_instance(instance):
+    clone = instance.__class__.__new__(instance.__class__)
+    clone.__dict__.update(instance.__dict__)
+    clone._state = ModelState()
+    clone._state.__dict__.update(instance._state.__dict__)
+    return clone
+
+
+token_cache = TokenCache(TOKEN_LOCAL_CACHE_SIZE, TOKEN_LOCAL_CACHE_TIMEOUT,
+                         TOKEN_CACHE_TIMEOUT)
+
+
+def invalidate_user_tokens(user_ids):
+    """
+    Drops cached tokens of given users, call it after change of fields
+    checked by authentication (``User.AUTH_STATE_FIELDS``).
+    """
+    keys = list(Token.objects.filter(user_id__in=user_ids).
+                values_list('key', flat=True))
+    if keys:
+        token_cache.delete(*keys)
+        # Other request may cache old state before transaction is committed
+        transaction.on_commit(lambda: token_cache.delete(*keys))
+
+
+def _new_version():
+    # Random token, version evicted from cache is never reused
+    return uuid.uuid4().hex, int(time.time())
+
+
+def get_users_version(user_id=None):
+    """
+    Returns ``(token, modified timestamp)`` version of client list or of
+    one client. Version is changed by ``bump_users_versions``.
+    """
+    if user_id is None:
+        key = USERS_VERSION_KEY
+    else:
+        key = USER_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, USERS_RESPONSE_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_users_versions(user_ids):
+    """
+    Changes version of client list and of given clients, call it on every
+    change of users. Version is changed after commit, so no request reads
+    old rows under new version.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    def bump():
+        version = _new_version()
+        versions = {USER_VERSION_KEY.format(pk): version for pk in user_ids}
+        versions[USERS_VERSION_KEY] = version
+        cache.set_many(versions, USERS_RESPONSE_TIMEOUT)
+
+    transaction.on_commit(bump)
@@ -0,0 +1,65 @@
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from accounts.models import User, StatusCounter
+from accounts.sharding import get_shard_querysets
+
+SHARDS = getattr(settings, 'STATUS_COUNTER_SHARDS', 8)
+
+
+def _add(status, delta):
+    shard = random.randrange(SHARDS)
+    counter = StatusCounter.objects.filter(status=status, shard=shard)
+    if not counter.update(count=F('count') + delta):
+        StatusCounter.objects.get_or_create(status=status, shard=shard)
+        counter.update(count=F('count') + delta)
+
+
+def count_status_change(old_status, new_status, count=1):
+    """
+    Moves ``count`` users between status counters. Call it in transaction
+    which changes user status.
+    """
+    if old_status == new_status or not count:
+        return
+
+    if old_status in User.STATUS_CHOICES:
+        _add(old_status, -count)
+    if new_status in User.STATUS_CHOICES:
+        _add(new_status, count)
+
+
+def get_status_counts():
+    counts = {status: 0 for status, _ in User.STATUS_CHOICES}
+    counts.update(StatusCounter.objects.values_list('status').
+                  annotate(Sum('count')))
+    return counts
+
+
+def get_status_count(status):
+    count = StatusCounter.objects.filter(status=status).\
+        aggregate(count=Sum('count'))['count']
+    return count or 0
+
+
+@transaction.atomic
+def reconcile_status_counters():
+    """
+    Recounts users by status and resets counters. Returns new counts.
+    """
+    counts = {status: 0 for status, _ in User.STATUS_CHOICES}
+    for queryset in get_shard_querysets(
+            User.objects.filter(status__in=list(counts))):
+        for status, count in queryset.values_list('status').annotate(
+                Count('id')):
+            counts[status] += count
+
+    StatusCounter.objects.all().delete()
+    StatusCounter.objects.bulk_create(
+        StatusCounter(status=status, shard=shard,
+                      count=count if shard == 0 else 0)
+        for status, count in counts.items() for shard in range(SHARDS))
+    return counts
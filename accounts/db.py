@@ -0,0 +1,32 @@
+from django.db import connections
+
+# SQLite before 3.32 allows this many parameters per query
+# (SQLITE_MAX_VARIABLE_NUMBER), Django 1.11 uses it for bulk inserts only
+SQLITE_MAX_QUERY_PARAMS = 999
+
+
+def get_max_query_params():
+    """
+    Returns the smallest limit of parameters per query of all databases,
+    ``None`` if no database has a limit.
+    """
+    limits = []
+    for connection in connections.all():
+        limit = getattr(connection.features, 'max_query_params', None)
+        if limit is None and connection.vendor == 'sqlite':
+            limit = SQLITE_MAX_QUERY_PARAMS
+        if limit is not None:
+            limits.append(limit)
+    return min(limits, default=None)
+
+
+def get_chunk_size(params_per_row, fixed_params=0, max_size=None):
+    """
+    Returns rows per query with ``params_per_row`` parameters for each row
+    and ``fixed_params`` more, at most ``max_size``.
+    """
+    max_params = get_max_query_params()
+    if max_params is None:
+        return max_size
+    size = (max_params - fixed_params) // params_per_row
+    return size if max_size is None else min(size, max_size)
@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from accounts.models import User, StatusChange, StatusChangeRollup
+
+# Default and maximum days of status report, report reads one rollup row
+# per day and transition
+STATUS_REPORT_DAYS = getattr(settings, 'STATUS_REPORT_DAYS', 30)
+STATUS_REPORT_MAX_DAYS = getattr(settings, 'STATUS_REPORT_MAX_DAYS', 366)
+
+
+def _add_to_rollup(day, old_status, status, count, duration):
+    rollup = StatusChangeRollup.objects.filter(
+        day=day, old_status=old_status, status=status)
+    values = {'count': F('count') + count,
+              'total_duration': F('total_duration') + duration}
+    if not rollup.update(**values):
+        StatusChangeRollup.objects.get_or_create(
+            day=day, old_status=old_status, status=status)
+        rollup.update(**values)
+
+
+def record_status_changes(users, old_status, status, changed_at):
+    """
+    Appends history rows of ``users`` moved from ``old_status`` (None for
+    registration) at ``changed_at`` and adds them to daily rollup. Call it
+    in transaction which changes status, before ``status_changed`` of
+    ``users`` is set to the new time.
+    """
+    if not users:
+        return
+
+    old_status = old_status or ''
+    changes = []
+    for user in users:
+        duration = None
+        if old_status and user.status_changed:
+            duration = max(int(
+                (changed_at - user.status_changed).total_seconds()), 0)
+        changes.append(StatusChange(
+            user_id=user.pk, old_status=old_status, status=status,
+            changed_at=changed_at, duration=duration))
+    StatusChange.objects.bulk_create(changes)
+
+    _add_to_rollup(timezone.localdate(changed_at), old_status, status,
+                   len(changes), sum(change.duration or 0
+                                     for change in changes))
+
+
+def get_status_report(since, until):
+    """
+    Returns status changes of days from ``since`` to ``until`` inclusive,
+    read from daily rollups only. ``funnel`` is number of clients which
+    reached each status, ``transitions`` have average time in seconds
+    clients spent in old status.
+    """
+    rows = StatusChangeRollup.objects.filter(day__range=(since, until)).\
+        values_list('old_status', 'status').\
+        annotate(Sum('count'), Sum('total_duration')).\
+        order_by('old_status', 'status')
+
+    funnel = {status: 0 for status, _ in User.STATUS_CHOICES}
+    transitions = []
+    for old_status, status, count, total_duration in rows:
+        funnel[status] += count
+        if not old_status:
+            continue
+        transitions.append({
+            'from': old_status,
+            'to': status,
+            'count': count,
+            'average_duration': total_duration / count if count else None
+        })
+
+    return {
+        'since': since,
+        'until': until,
+        'funnel': funnel,
+        'transitions': transitions,
+    }
+
+
+@transaction.atomic
+def rebuild_status_rollups():
+    """
+    Recomputes daily rollups from status history. Returns rollups count.
+    """
+    rollups = StatusChange.objects.annotate(day=TruncDate('changed_at')).\
+        values_list('day', 'old_status', 'status').\
+        annotate(Count('id'), Sum('duration')).order_by()
+
+    StatusChangeRollup.objects.all().delete()
+    created = StatusChangeRollup.objects.bulk_create(
+        StatusChangeRollup(day=day, old_status=old_status, status=status,
+                           count=count, total_duration=total_duration or 0)
+        for day, old_status, status, count, total_duration in rollups)
+    return len(created)
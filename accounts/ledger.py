@@ -0,0 +1,144 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils.translation import ugettext_lazy as _
+
+from accounts.db import get_chunk_size
+from accounts.models import User, BalanceTransaction
+from accounts.cache import bump_users_versions
+from accounts.sharding import (
+    atomic_on_all_shards, atomic_on_shard, get_user_shards, using_user_shard)
+
+BATCH_CHUNK_SIZE = 500
+# Users per balance UPDATE at most, fewer if database limits parameters
+BALANCE_CHUNK_SIZE = 400
+# Parameters of balance UPDATE for each user: id and amount of ``When``
+# and id in WHERE
+BALANCE_PARAMS_PER_USER = 3
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+@transaction.atomic
+def post_entry(user_id, amount, idempotency_key=None, description='',
+               min_balance=None):
+    """
+    Adds ledger entry and changes user balance with atomic UPDATE.
+    User row is locked only to check that balance stays at least
+    ``min_balance``, otherwise ``InsufficientFunds`` is raised.
+
+    Returns entry and whether it was created, entry of already posted
+    ``idempotency_key`` is returned as is. Entry is kept in default
+    database, balance in shard of the user.
+    """
+    users = using_user_shard(User.objects.all(), user_id)
+    with atomic_on_shard(users.db):
+        if min_balance is not None:
+            balance = users.select_for_update().values_list(
+                'balance', flat=True).get(pk=user_id)
+            if balance + amount < min_balance:
+                raise InsufficientFunds(user_id)
+
+        try:
+            with transaction.atomic():
+                entry = BalanceTransaction.objects.create(
+                    user_id=user_id, amount=amount,
+                    idempotency_key=idempotency_key, description=description)
+        except IntegrityError:
+            if idempotency_key is None:
+                raise
+            return BalanceTransaction.objects.get(
+                idempotency_key=idempotency_key), False
+
+        users.filter(pk=user_id).update(balance=F('balance') + amount)
+    bump_users_versions([user_id])
+    return entry, True
+
+
+@atomic_on_all_shards()
+def post_entries(entries, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Posts many ledger entries in one transaction, ``entries`` are dicts of
+    ``post_entry`` arguments. Each chunk is inserted at once and balances
+    are changed with one UPDATE per ``BALANCE_CHUNK_SIZE`` users.
+
+    Returns report ``{'posted': count, 'skipped': count, 'errors': [...]}``,
+    entries with already posted ``idempotency_key`` are skipped.
+    """
+    entries = list(entries)
+    report = {'posted': 0, 'skipped': 0, 'errors': []}
+    for start in range(0, len(entries), chunk_size):
+        _post_chunk(entries[start:start + chunk_size], start, report)
+    return report
+
+
+def _post_chunk(chunk, offset, report):
+    user_ids = {entry['user_id'] for entry in chunk}
+    keys = {entry['idempotency_key'] for entry in chunk
+            if entry.get('idempotency_key')}
+    existing_users = get_user_shards(user_ids)
+    posted_keys = set(BalanceTransaction.objects.filter(
+        idempotency_key__in=keys).values_list('idempotency_key', flat=True))
+
+    transactions = []
+    for index, entry in enumerate(chunk, offset):
+        key = entry.get('idempotency_key') or None
+        if entry['user_id'] not in existing_users:
+            report['errors'].append({'index': index, 'errors': {
+                'user_id': [_('User does not exist.')]}})
+        elif key in posted_keys:
+            report['skipped'] += 1
+        else:
+            if key is not None:
+                posted_keys.add(key)  # also skips repeats inside the batch
+            transactions.append(BalanceTransaction(
+                user_id=entry['user_id'], amount=entry['amount'],
+                idempotency_key=key,
+                description=entry.get('description', '')))
+
+    transactions = _create_transactions(transactions, report)
+    report['posted'] += len(transactions)
+
+    deltas = Counter()
+    for entry in transactions:
+        deltas[entry.user_id] += entry.amount
+    bump_users_versions(user_id for user_id, delta in deltas.items()
+                        if delta)
+    by_shard = {}
+    for user_id, delta in deltas.items():
+        if delta:
+            by_shard.setdefault(existing_users[user_id], []).append(
+                (user_id, delta))
+    size = get_chunk_size(BALANCE_PARAMS_PER_USER, max_size=BALANCE_CHUNK_SIZE)
+    for alias, shard_deltas in by_shard.items():
+        for start in range(0, len(shard_deltas), size):
+            part = dict(shard_deltas[start:start + size])
+            User.objects.using(alias).filter(pk__in=part).update(
+                balance=F('balance') + Case(
+                    *[When(pk=user_id, then=Value(delta))
+                      for user_id, delta in part.items()],
+                    output_field=IntegerField()))
+
+
+def _create_transactions(transactions, report):
+    try:
+        with transaction.atomic():
+            BalanceTransaction.objects.bulk_create(transactions)
+        return transactions
+    except IntegrityError:
+        pass
+
+    # Concurrent posting used some idempotency key, find it row by row
+    created = []
+    for entry in transactions:
+        try:
+            with transaction.atomic():
+                entry.save(force_insert=True)
+        except IntegrityError:
+            report['skipped'] += 1
+        else:
+            created.append(entry)
+    return created
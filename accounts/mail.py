@@ -0,0 +1,167 @@
+import uuid
+import logging
+from time import perf_counter
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from django import db
+from django.conf import settings
+from django.utils import timezone
+from django.core.mail import get_connection
+from django.template.loader import render_to_string
+from django.utils.translation import ugettext_lazy as _
+
+from accounts.models import QueuedMail
+from accounts.cache import get_manager_emails
+from accounts.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Delay before first retry in seconds, doubled for every next attempt
+RETRY_DELAY = getattr(settings, 'MAIL_QUEUE_RETRY_DELAY', 60)
+MAX_ATTEMPTS = getattr(settings, 'MAIL_QUEUE_MAX_ATTEMPTS', 5)
+# Claimed mails of crashed worker are picked up again after this timeout
+CLAIM_TIMEOUT = getattr(settings, 'MAIL_QUEUE_CLAIM_TIMEOUT', 300)
+
+
+def queue_mail(subject, template_path, context, recipient_list):
+    """
+    Puts mail to outbox instead of sending it inline, so request does not
+    wait for mail server. Call it inside transaction of the change
+    mail notifies about.
+    """
+    if not recipient_list:
+        return None
+
+    return QueuedMail.objects.create(
+        subject=subject,
+        message=render_to_string(template_path, context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipients='\n'.join(recipient_list))
+
+
+def queue_mails(mails):
+    """
+    Bulk version of ``queue_mail``, ``mails`` are dicts of its arguments.
+    """
+    return QueuedMail.objects.bulk_create(
+        QueuedMail(subject=mail['subject'],
+                   message=render_to_string(mail['template_path'],
+                                            mail['context']),
+                   from_email=settings.DEFAULT_FROM_EMAIL,
+                   recipients='\n'.join(mail['recipient_list']))
+        for mail in mails if mail['recipient_list'])
+
+
+def activation_mail(user, pin):
+    """
+    Returns ``queue_mail`` arguments of mail with pin of activated client.
+    """
+    return {
+        'subject': _('Your account approved in buddha application!'),
+        'template_path': 'email/client_account_have_been_activated.txt',
+        'context': {
+            'pin': pin,
+            'first_name': user.first_name,
+            'last_name': user.last_name
+        },
+        'recipient_list': get_manager_emails()
+    }
+
+
+def claim_mails(batch_size):
+    """
+    Marks batch of due mails with unique claim, so concurrent workers
+    never send the same mail twice.
+    """
+    now = timezone.now()
+    claim = uuid.uuid4().hex
+    due = QueuedMail.objects.filter(
+        status=QueuedMail.STATUS_CHOICES.pending, next_attempt__lte=now)
+    pks = list(due.order_by('next_attempt').
+               values_list('pk', flat=True)[:batch_size])
+
+    due.filter(pk__in=pks).update(
+        claim=claim, next_attempt=now + timedelta(seconds=CLAIM_TIMEOUT))
+    return list(QueuedMail.objects.filter(claim=claim))
+
+
+def _mark_sent(mail):
+    # Body is cleared after sending, it may contain client pin
+    QueuedMail.objects.filter(pk=mail.pk).update(
+        status=QueuedMail.STATUS_CHOICES.sent, sent=timezone.now(),
+        message='', claim=None, attempts=mail.attempts + 1)
+
+
+def _mark_failed(mail, error):
+    attempts = mail.attempts + 1
+    fields = {'attempts': attempts, 'last_error': str(error), 'claim': None}
+    if attempts >= MAX_ATTEMPTS:
+        # Body is not sent any more, it may contain client pin
+        fields.update(status=QueuedMail.STATUS_CHOICES.failed, message='')
+    else:
+        delay = RETRY_DELAY * 2 ** (attempts - 1)
+        fields['next_attempt'] = timezone.now() + timedelta(seconds=delay)
+
+    logger.warning('Sending mail %s failed (attempt %s): %s',
+                   mail.pk, attempts, error)
+    QueuedMail.objects.filter(pk=mail.pk).update(**fields)
+
+
+def send_mails(mails):
+    """
+    Sends mails over one mail server connection. Returns sent mails count.
+    """
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        for mail in mails:
+            _mark_failed(mail, error)
+        return 0
+
+    sent = 0
+    try:
+        for mail in mails:
+            started = perf_counter()
+            try:
+                mail.as_message(connection=connection).send()
+            except Exception as error:
+                registry.inc('buddha_mails_total', (('result', 'failed'), ))
+                _mark_failed(mail, error)
+            else:
+                registry.observe('buddha_mail_send_duration_seconds', (),
+                                 perf_counter() - started)
+                registry.inc('buddha_mails_total', (('result', 'sent'), ))
+                _mark_sent(mail)
+                sent += 1
+    finally:
+        connection.close()
+
+    return sent
+
+
+def _send_mails_in_thread(mails):
+    try:
+        return send_mails(mails)
+    finally:
+        db.connection.close()
+
+
+def send_queued_mail(batch_size=100, workers=1):
+    """
+    Sends one batch of due mails, splitting it between ``workers``
+    concurrent senders. Returns processed and sent mails count.
+    """
+    mails = claim_mails(batch_size)
+    if not mails:
+        return 0, 0
+
+    if workers <= 1:
+        return len(mails), send_mails(mails)
+
+    chunks = [mails[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        sent = sum(executor.map(_send_mails_in_thread,
+                                [chunk for chunk in chunks if chunk]))
+    return len(mails), sent
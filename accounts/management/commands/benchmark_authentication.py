@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from accounts.benchmarks import benchmark_token_authentication
+
+
+class Command(BaseCommand):
+    help = 'Compares stock and cached token authentication speed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        results = benchmark_token_authentication(options['requests'])
+        self.stdout.write(f'{"class":>26} {"requests/s":>12} {"queries":>8}')
+        for name, (rate, queries) in results.items():
+            self.stdout.write(f'{name:>26} {rate:>12.0f} {queries:>8}')
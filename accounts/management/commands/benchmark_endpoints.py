@@ -0,0 +1,71 @@
+import os
+import json
+from tempfile import TemporaryDirectory
+
+from django.db import connections
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases
+
+from accounts.benchmarks import benchmark_endpoints
+
+
+class Command(BaseCommand):
+    help = ('Load tests endpoints on new test database, prints throughput, '
+            'latency percentiles and queries per request as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per endpoint')
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Also write results to file')
+        parser.add_argument('--baseline',
+                            help='Results file of previous run to compare')
+        parser.add_argument('--max-regression', type=float, default=0.2,
+                            help='Allowed p95 latency growth over baseline')
+
+    def handle(self, *args, **options):
+        with TemporaryDirectory() as directory:
+            # In-memory SQLite test database fails concurrent writes at
+            # once instead of waiting for lock
+            for connection in connections.all():
+                if connection.vendor == 'sqlite' and \
+                        not connection.settings_dict['TEST']['NAME']:
+                    connection.settings_dict['TEST']['NAME'] = \
+                        os.path.join(directory, f'{connection.alias}.db')
+
+            # Same empty database for every run, results are comparable
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                results = benchmark_endpoints(
+                    options['users'], options['requests'],
+                    options['threads'], options['seed'])
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+        report = json.dumps(results, indent=2, sort_keys=True)
+        self.stdout.write(report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                self.compare(json.load(baseline), results,
+                             options['max_regression'])
+
+    def compare(self, baseline, results, max_regression):
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before, after = baseline[name], result
+            if after['p95'] > before['p95'] * (1 + max_regression):
+                regressions.append(
+                    f'{name}: p95 {before["p95"]} -> {after["p95"]} ms')
+            if after['queries'] > before['queries']:
+                regressions.append(f'{name}: queries {before["queries"]} '
+                                   f'-> {after["queries"]}')
+        if regressions:
+            raise CommandError('Regressions:\n' + '\n'.join(regressions))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from accounts.benchmarks import benchmark_serializers
+
+
+class Command(BaseCommand):
+    help = 'Compares client list serialization speed, model vs values rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[1000, 10000, 100000])
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"rows":>8} {"models/s":>12} {"values/s":>12}')
+        for size, models, values in benchmark_serializers(options['sizes']):
+            self.stdout.write(f'{size:>8} {models:>12.0f} {values:>12.0f} '
+                              f'(x{values / models:.1f})')
@@ -0,0 +1,57 @@
+import os
+import json
+from tempfile import TemporaryDirectory
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases
+
+from accounts.benchmarks import benchmark_registration
+
+ENGINES = ('django.db.backends.sqlite3', 'accounts.sqlite3')
+
+
+class Command(BaseCommand):
+    help = ('Load tests concurrent registrations on new SQLite database '
+            'file with Django and tuned backend, prints results as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        settings_dict = connections.databases[DEFAULT_DB_ALIAS]
+        if 'sqlite' not in settings_dict['ENGINE']:
+            raise CommandError('Default database is not SQLite.')
+        engine = settings_dict['ENGINE']
+        test_name = settings_dict['TEST'].get('NAME')
+
+        results = {}
+        try:
+            for settings_dict['ENGINE'] in ENGINES:
+                with TemporaryDirectory() as directory:
+                    self.reconnect()
+                    settings_dict['TEST']['NAME'] = os.path.join(
+                        directory, 'default.db')
+                    old_config = setup_databases(
+                        verbosity=0, interactive=False)
+                    try:
+                        results[settings_dict['ENGINE']] = \
+                            benchmark_registration(options['requests'],
+                                                   options['threads'])
+                    finally:
+                        teardown_databases(old_config, verbosity=0)
+        finally:
+            settings_dict['ENGINE'] = engine
+            settings_dict['TEST']['NAME'] = test_name
+            self.reconnect()
+
+        before, after = (results[engine]['requests_per_second']
+                         for engine in ENGINES)
+        results['throughput_gain'] = round(after / before, 2)
+        self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+
+    def reconnect(self):
+        # Connection of the new engine is created on next access
+        connections[DEFAULT_DB_ALIAS].close()
+        del connections[DEFAULT_DB_ALIAS]
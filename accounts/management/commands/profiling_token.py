@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.profiling import make_profiling_token
+
+
+class Command(BaseCommand):
+    help = ('Prints token which enables profiling of request sent with it '
+            'in X-Profile header or profile query parameter')
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_profiling_token())
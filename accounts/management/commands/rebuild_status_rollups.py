@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from accounts.history import rebuild_status_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes daily status change rollups from status history'
+
+    def handle(self, *args, **options):
+        count = rebuild_status_rollups()
+        if options['verbosity']:
+            self.stdout.write(f'{count} rollups')
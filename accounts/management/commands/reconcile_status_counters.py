@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from accounts.counters import reconcile_status_counters
+
+
+class Command(BaseCommand):
+    help = 'Recounts users by status and resets status counters'
+
+    def handle(self, *args, **options):
+        counts = reconcile_status_counters()
+        if options['verbosity']:
+            for status, count in counts.items():
+                self.stdout.write(f'{status}: {count}')
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.pins import PIN_POOL_SIZE, refill_pin_pool
+
+
+class Command(BaseCommand):
+    help = 'Adds pre-generated pins to the pool claimed by activations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=PIN_POOL_SIZE,
+                            help='Pins to keep in the pool')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep refilling the pool')
+        parser.add_argument('--interval', type=float, default=60,
+                            help='Seconds to sleep between refills')
+
+    def handle(self, *args, **options):
+        while True:
+            added = refill_pin_pool(options['size'])
+            if added and options['verbosity']:
+                self.stdout.write(f'Added {added} pins')
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.mail import send_queued_mail
+from accounts.metrics import flush
+
+
+class Command(BaseCommand):
+    help = 'Sends due mails from outbox in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of concurrent senders')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling outbox for new mails')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to sleep when outbox is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            processed, sent = send_queued_mail(
+                batch_size=options['batch_size'], workers=options['workers'])
+            # Mail metrics are served by web processes, see METRICS_DIR
+            flush()
+            if processed and options['verbosity']:
+                self.stdout.write(f'Sent {sent} of {processed} mails')
+
+            if not processed:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
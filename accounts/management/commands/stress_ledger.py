@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.benchmarks import stress_ledger
+
+
+class Command(BaseCommand):
+    help = 'Posts balance changes from concurrent threads, checks totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--postings', type=int, default=500,
+                            help='Postings per thread')
+
+    def handle(self, *args, **options):
+        result = stress_ledger(options['threads'], options['postings'])
+        self.stdout.write(
+            '{postings_per_second:.0f} postings/s, expected {expected}, '
+            'balance {balance}, ledger {ledger}'.format(**result))
+        if not result['expected'] == result['balance'] == result['ledger']:
+            raise CommandError('Lost balance updates')
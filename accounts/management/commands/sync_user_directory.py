@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from accounts.sharding import sync_directory
+
+
+class Command(BaseCommand):
+    help = ('Adds missing user directory entries, run it after turning '
+            'on user shards')
+
+    def handle(self, *args, **options):
+        added = sync_directory()
+        if options['verbosity']:
+            self.stdout.write(f'Added {added} directory entries')
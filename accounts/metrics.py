@@ -0,0 +1,317 @@
+import os
+import json
+import weakref
+import threading
+from time import perf_counter, monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.db.backends.utils import CursorWrapper, CursorDebugWrapper
+
+from accounts.counters import get_status_counts
+
+BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+# Name to type and help of exposed metrics
+METRICS = {
+    'buddha_http_request_duration_seconds': (
+        'histogram', 'Request latency by view and action'),
+    'buddha_http_requests_total': (
+        'counter', 'Responses by view, action and status code'),
+    'buddha_http_errors_total': (
+        'counter', 'Server error responses by view and action'),
+    'buddha_db_queries_total': (
+        'counter', 'Database queries made by view and action'),
+    'buddha_db_query_duration_seconds_total': (
+        'counter', 'Database query time by view and action'),
+    'buddha_mail_send_duration_seconds': (
+        'histogram', 'Time of sending one mail'),
+    'buddha_mails_total': (
+        'counter', 'Send attempts of queued mails by result'),
+    'buddha_clients': (
+        'gauge', 'Clients by status'),
+    'buddha_pin_pool_misses_total': (
+        'counter', 'Pins generated by activations because pool was short'),
+}
+
+# Processes of one server write their metrics to files in this directory
+# and every process serves metrics of all of them
+METRICS_DIR = getattr(settings, 'METRICS_DIR', None)
+METRICS_FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+# Client counts are read from counters at most once per timeout
+METRICS_GAUGE_TIMEOUT = getattr(settings, 'METRICS_GAUGE_TIMEOUT', 15)
+CLIENTS_CACHE_KEY = 'accounts:metrics:clients'
+
+
+class _ShardOwner:
+    # Thread local object, its finalizer runs when the thread exits
+    pass
+
+
+class Registry:
+    """
+    Counters and histograms of this process. Every thread updates its own
+    shard, so updates take no lock. Shards are merged when metrics are
+    collected. Shard of exited thread is merged into retired samples, so
+    short-lived threads do not add up.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _get_shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            self._local.owner = _ShardOwner()
+            weakref.finalize(self._local.owner, self._retire, shard)
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            self._shards.remove(shard)
+            _merge(self._retired, shard.items())
+
+    def inc(self, name, labels=(), amount=1):
+        shard = self._get_shard()
+        key = name, labels
+        shard[key] = shard.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        shard = self._get_shard()
+        key = name, labels
+        histogram = shard.get(key)
+        if histogram is None:
+            # Count of each bucket, sum and count of values
+            histogram = shard[key] = [0] * (len(BUCKETS) + 2)
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram[index] += 1
+                break
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def collect(self):
+        """
+        Returns dict of (name, labels) to merged value.
+        """
+        samples = {}
+        with self._lock:
+            shards = list(self._shards)
+            _merge(samples, self._retired.items())
+        for shard in shards:
+            _merge(samples, shard.copy().items())
+        return samples
+
+    def clear(self):
+        with self._lock:
+            self._retired.clear()
+            for shard in self._shards:
+                shard.clear()
+
+
+def _merge(samples, items):
+    for key, value in items:
+        if isinstance(value, list):
+            merged = samples.setdefault(key, [0] * len(value))
+            for index, item in enumerate(value):
+                merged[index] += item
+        else:
+            samples[key] = samples.get(key, 0) + value
+
+
+registry = Registry()
+_last_flush = monotonic()
+_queries = threading.local()
+
+
+def flush():
+    """
+    Writes metrics of this process to ``METRICS_DIR``.
+    """
+    global _last_flush
+    _last_flush = monotonic()
+    if not METRICS_DIR:
+        return
+
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as output:
+        json.dump([[name, labels, value] for (name, labels), value
+                   in registry.collect().items()], output)
+    os.replace(path + '.tmp', path)
+
+
+def flush_if_due():
+    if METRICS_DIR and monotonic() - _last_flush >= METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def collect():
+    """
+    Returns merged metrics of all processes when ``METRICS_DIR`` is set,
+    otherwise of this process.
+    """
+    if not METRICS_DIR:
+        return registry.collect()
+
+    flush()
+    samples = {}
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as dump:
+                rows = json.load(dump)
+        except (OSError, ValueError):  # removed or being replaced
+            continue
+        _merge(samples, (((name, tuple(map(tuple, labels))), value)
+                         for name, labels, value in rows))
+    return samples
+
+
+def get_client_counts():
+    counts = cache.get(CLIENTS_CACHE_KEY)
+    if counts is None:
+        counts = get_status_counts()
+        cache.set(CLIENTS_CACHE_KEY, counts, METRICS_GAUGE_TIMEOUT)
+    return counts
+
+
+def _format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(
+        name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for name, value in labels) + '}'
+
+
+def render():
+    """
+    Returns all metrics in Prometheus text format.
+    """
+    samples = collect()
+    for status, count in get_client_counts().items():
+        samples['buddha_clients', (('status', status), )] = count
+
+    by_name = {}
+    for (name, labels), value in sorted(samples.items()):
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in by_name.get(name, ()):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf', ), value[:-2] + [
+                    value[-1] - sum(value[:-2])]):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    name, _format_labels(labels, [('le', bound)]),
+                    cumulative))
+            lines.append(f'{name}_sum{_format_labels(labels)} {value[-2]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+class TimedCursorMixin:
+
+    def execute(self, sql, params=None):
+        started = perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            _add_query(perf_counter() - started)
+
+    def executemany(self, sql, param_list):
+        started = perf_counter()
+        try:
+            return super().executemany(sql, param_list)
+        finally:
+            _add_query(perf_counter() - started)
+
+
+class TimedCursorWrapper(TimedCursorMixin, CursorWrapper):
+    pass
+
+
+class TimedCursorDebugWrapper(TimedCursorMixin, CursorDebugWrapper):
+    pass
+
+
+def _add_query(duration):
+    _queries.count = getattr(_queries, 'count', 0) + 1
+    _queries.time = getattr(_queries, 'time', 0) + duration
+
+
+def reset_queries():
+    _queries.count, _queries.time = 0, 0
+
+
+def get_queries():
+    return getattr(_queries, 'count', 0), getattr(_queries, 'time', 0)
+
+
+def time_queries(sender, connection, **kwargs):
+    # Queries of all connections are counted for request of the thread
+    connection.make_cursor = lambda cursor: TimedCursorWrapper(
+        cursor, connection)
+    connection.make_debug_cursor = lambda cursor: TimedCursorDebugWrapper(
+        cursor, connection)
+
+
+connection_created.connect(time_queries,
+                           dispatch_uid='accounts.metrics.time_queries')
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status and database queries of every request by view
+    and action, e.g. ``UserAPI``, ``list``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.metrics_labels = (('view', 'unknown'), ('action', 'unknown'))
+        reset_queries()
+        started = perf_counter()
+        response = self.get_response(request)
+        duration = perf_counter() - started
+
+        labels = request.metrics_labels
+        registry.observe('buddha_http_request_duration_seconds', labels,
+                         duration)
+        registry.inc('buddha_http_requests_total',
+                     labels + (('status', response.status_code), ))
+        if response.status_code >= 500:
+            registry.inc('buddha_http_errors_total', labels)
+        count, query_time = get_queries()
+        registry.inc('buddha_db_queries_total', labels, count)
+        registry.inc('buddha_db_query_duration_seconds_total', labels,
+                     query_time)
+        flush_if_due()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        cls = getattr(view_func, 'cls', None)
+        if cls is None:
+            view = getattr(view_func, '__name__', 'unknown')
+            action = request.method.lower()
+        else:
+            view = cls.__name__
+            actions = getattr(view_func, 'actions', None) or {}
+            action = actions.get(request.method.lower(),
+                                 request.method.lower())
+        request.metrics_labels = (('view', view), ('action', action))
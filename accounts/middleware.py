@@ -0,0 +1,125 @@
+import re
+import json
+import random
+import logging
+from time import perf_counter
+from itertools import islice
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Literals replaced to group queries which differ only in parameters
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LISTS = re.compile(r'\(\?(?:, \?)+\)')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    return IN_LISTS.sub('(?)', LITERALS.sub('?', sql))
+
+
+def get_view_option(view_func, method, name, default=None):
+    """
+    Returns attribute ``name`` of DRF view class, for viewsets it may be
+    dict of action to value.
+    """
+    value = getattr(getattr(view_func, 'cls', None), name, default)
+    if isinstance(value, dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        return value.get(actions.get(method.lower()), default)
+    return value
+
+
+def get_query_budget(view_func, method):
+    return get_view_option(view_func, method, 'query_budget')
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records queries of sampled requests: count, total SQL time and queries
+    repeated with different parameters (N+1). Results are sent in
+    ``Server-Timing`` header and logged as JSON. Not sampled requests cost
+    one random number.
+
+    In strict mode every request is instrumented and request of view over
+    its ``query_budget`` raises ``QueryBudgetExceeded``, so tests fail.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+        self.sample_rate = 1 if self.strict else getattr(
+            settings, 'QUERY_INSTRUMENTATION_SAMPLE_RATE', 0.01)
+        # Same query fingerprint repeated this many times is reported
+        self.repeat_threshold = getattr(
+            settings, 'QUERY_REPEAT_THRESHOLD', 5)
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        request.query_budget = None
+        debug_cursors, logged, log_starts = {}, {}, {}
+        for connection in connections.all():
+            debug_cursors[connection.alias] = connection.force_debug_cursor
+            logged[connection.alias] = connection.queries_logged
+            connection.force_debug_cursor = True
+            # Log may be read by outer code too, it is not cleared
+            log_starts[connection.alias] = len(connection.queries_log)
+
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            duration = perf_counter() - start
+            queries = []
+            for connection in connections.all():
+                log_start = log_starts.get(connection.alias, 0)
+                queries += islice(connection.queries_log, log_start, None)
+                connection.force_debug_cursor = debug_cursors.get(
+                    connection.alias, False)
+                if not logged.get(connection.alias, False):
+                    # Log was not recorded before, leave it as it was
+                    while len(connection.queries_log) > log_start:
+                        connection.queries_log.pop()
+
+        return self.report(request, response, queries, duration)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, 'query_budget'):
+            request.query_budget = get_query_budget(view_func,
+                                                    request.method)
+
+    def report(self, request, response, queries, duration):
+        sql_time = sum(float(query['time']) for query in queries)
+        repeated = {
+            sql: count for sql, count in Counter(
+                fingerprint(query['sql']) for query in queries).items()
+            if count >= self.repeat_threshold}
+        budget = request.query_budget
+
+        response['Server-Timing'] = (
+            f'db;dur={sql_time * 1000:.1f};desc="{len(queries)} queries", '
+            f'total;dur={duration * 1000:.1f}')
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': len(queries),
+            'sql_time': round(sql_time, 4),
+            'duration': round(duration, 4),
+            'budget': budget,
+            'repeated': repeated,
+        }))
+
+        if self.strict and budget is not None and len(queries) > budget:
+            raise QueryBudgetExceeded(
+                f'{request.method} {request.path} made {len(queries)} '
+                f'queries, budget is {budget}')
+        return response
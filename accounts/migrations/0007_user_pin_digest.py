@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 20:39
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from accounts.models import make_pin_digest
+
+
+def hash_pins(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    users = User.objects.exclude(pin=None).only('pk', 'pin')
+    for user in users.iterator():
+        pin = make_pin_digest(user.pin) if user.pin else None
+        User.objects.filter(pk=user.pk).update(pin=pin)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_user_balance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='pin',
+            field=models.CharField(blank=True, max_length=40, null=True, verbose_name='pin code'),
+        ),
+        migrations.RunPython(hash_pins, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='pin',
+            field=models.CharField(blank=True, max_length=40, null=True, unique=True, verbose_name='pin code'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 20:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_queuedmail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='passport_number',
+            field=models.CharField(blank=True, db_index=True, max_length=8, null=True, verbose_name='passport number'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_manager'], name='accounts_us_is_mana_9a5658_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_manager', 'status'], name='accounts_us_is_mana_8d8967_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_manager', 'status', 'status_changed'], name='accounts_us_is_mana_a07217_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_manager', 'email'], name='accounts_us_is_mana_6b3a05_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['status', 'status_changed'], name='accounts_us_status_975532_idx'),
+        ),
+    ]
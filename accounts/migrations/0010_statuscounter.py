@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 20:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_statuses(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    StatusCounter = apps.get_model('accounts', 'StatusCounter')
+    counts = User.objects.exclude(status=None).values_list('status').\
+        annotate(Count('id'))
+    StatusCounter.objects.bulk_create(
+        StatusCounter(status=status, shard=0, count=count)
+        for status, count in counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_user_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('creating', 'creating'), ('activated', 'activated'), ('closing', 'closing'), ('closed', 'closed')], max_length=10, verbose_name='account status')),
+                ('shard', models.PositiveSmallIntegerField(verbose_name='shard')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+            ],
+            options={
+                'verbose_name': 'status counter',
+                'verbose_name_plural': 'status counters',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='statuscounter',
+            unique_together=set([('status', 'shard')]),
+        ),
+        migrations.RunPython(count_statuses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 20:57
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def clear_blank_passport_numbers(apps, schema_editor):
+    # Managers created in admin have empty passport number, NULLs do not
+    # conflict with each other in unique index
+    User = apps.get_model('accounts', 'User')
+    User.objects.filter(passport_number='').update(passport_number=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_statuscounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_blank_passport_numbers,
+                             migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='passport_number',
+            field=models.CharField(blank=True, max_length=8, null=True, unique=True, verbose_name='passport number'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 21:14
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_user_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_status', models.CharField(blank=True, choices=[('creating', 'creating'), ('activated', 'activated'), ('closing', 'closing'), ('closed', 'closed')], max_length=10, verbose_name='old status')),
+                ('status', models.CharField(choices=[('creating', 'creating'), ('activated', 'activated'), ('closing', 'closing'), ('closed', 'closed')], max_length=10, verbose_name='status')),
+                ('changed_at', models.DateTimeField(verbose_name='changed at')),
+                ('duration', models.PositiveIntegerField(blank=True, null=True, verbose_name='duration')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_changes', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'status change',
+                'verbose_name_plural': 'status changes',
+            },
+        ),
+        migrations.CreateModel(
+            name='StatusChangeRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('old_status', models.CharField(blank=True, choices=[('creating', 'creating'), ('activated', 'activated'), ('closing', 'closing'), ('closed', 'closed')], max_length=10, verbose_name='old status')),
+                ('status', models.CharField(choices=[('creating', 'creating'), ('activated', 'activated'), ('closing', 'closing'), ('closed', 'closed')], max_length=10, verbose_name='status')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='count')),
+                ('total_duration', models.BigIntegerField(default=0, verbose_name='total duration')),
+            ],
+            options={
+                'verbose_name': 'status change rollup',
+                'verbose_name_plural': 'status change rollups',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='statuschangerollup',
+            unique_together=set([('day', 'old_status', 'status')]),
+        ),
+        migrations.AddIndex(
+            model_name='statuschange',
+            index=models.Index(fields=['status', 'changed_at'], name='accounts_st_status_b13461_idx'),
+        ),
+    ]
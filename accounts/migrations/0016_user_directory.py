@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 21:50
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_status_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='name')),
+                ('value', models.BigIntegerField(default=0, verbose_name='value')),
+            ],
+            options={
+                'verbose_name': 'id sequence',
+                'verbose_name_plural': 'id sequences',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserDirectory',
+            fields=[
+                ('user_id', models.IntegerField(primary_key=True, serialize=False, verbose_name='user id')),
+                ('shard', models.CharField(max_length=32, verbose_name='shard')),
+                ('email', models.EmailField(max_length=254, unique=True, verbose_name='email address')),
+                ('pin', models.CharField(blank=True, max_length=40, null=True, unique=True, verbose_name='pin code')),
+                ('passport_number', models.CharField(blank=True, max_length=8, null=True, unique=True, verbose_name='passport number')),
+            ],
+            options={
+                'verbose_name': 'user directory entry',
+                'verbose_name_plural': 'user directory',
+            },
+        ),
+    ]
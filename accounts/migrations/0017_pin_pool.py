@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 22:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_user_directory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnusedPin',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pin', models.CharField(max_length=15, unique=True, verbose_name='pin code')),
+                ('claim', models.CharField(blank=True, db_index=True, max_length=32, null=True, verbose_name='claim')),
+            ],
+            options={
+                'verbose_name': 'unused pin',
+                'verbose_name_plural': 'unused pins',
+            },
+        ),
+    ]
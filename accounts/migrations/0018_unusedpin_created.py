@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 23:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_pin_pool'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unusedpin',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='created'),
+        ),
+    ]
@@ -1,10 +1,24 @@
 from django.db import models
+from django.utils import timezone
+from django.core.mail import EmailMessage
+from django.utils.crypto import constant_time_compare, salted_hmac
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.auth.models import (
     AbstractBaseUser, PermissionsMixin, BaseUserManager)
 from model_utils import Choices
 
 
+PIN_DIGEST_SALT = 'accounts.User.pin'
+
+
+def make_pin_digest(pin):
+    """
+    Returns keyed digest of raw pin code. Only digest is stored in
+    ``User.pin``, so login is a single lookup by unique indexed value.
+    """
+    return salted_hmac(PIN_DIGEST_SALT, pin).hexdigest()
+
+
 class UserManager(BaseUserManager):
     use_in_migrations = True
 
@@ -21,6 +35,9 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def get_by_pin(self, pin):
+        return self.get(pin=make_pin_digest(pin))
+
     def create_user(self, email, password=None, **extra_fields):
         return self._create_user(email, password, **extra_fields)
 
@@ -46,31 +63,319 @@ class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(_('email address'), unique=True)
     password = models.CharField(
         _('password'), max_length=128, null=True, blank=True)
-    pin = models.CharField(_('pin code'), max_length=10, blank=True, null=True)
+    pin = models.CharField(
+        _('pin code'), max_length=40, unique=True, blank=True, null=True)
     balance = models.IntegerField(_('account balance'), default=0)
     first_name = models.CharField(_('first name'), max_length=30)
     last_name = models.CharField(_('last name'), max_length=30)
     passport_number = models.CharField(
-        _('passport number'), max_length=8, null=True, blank=True)
+        _('passport number'), max_length=8, unique=True, null=True,
+        blank=True)
     status = models.CharField(
         _('account status'), max_length=10, blank=True, null=True)
     status_changed = models.DateTimeField(auto_now_add=True)
     is_staff = models.BooleanField(_('staff status'), default=False)
     is_manager = models.BooleanField(_('manager status'), default=False)
     is_active = models.BooleanField(_('active status'), default=False)
+    # Incremented by every status transition, see ``accounts.transitions``
+    version = models.PositiveIntegerField(_('version'), default=0)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
     PERSONAL_INFO_FIELDS = ['first_name', 'last_name', 'passport_number']
+    # Fields checked on authentication, cached tokens depend on them
+    AUTH_STATE_FIELDS = ('is_active', 'is_manager', 'status')
+    # Changed only with atomic UPDATE, by ``accounts.ledger`` and
+    # ``accounts.transitions``
+    CONCURRENT_FIELDS = ('balance', 'version')
 
     objects = UserManager()
 
     class Meta:
         verbose_name = _('user')
         verbose_name_plural = _('users')
+        # SQLite appends rowid (id) to every index, so client list indexes
+        # also serve ``ORDER BY id`` for keyset pagination
+        indexes = [
+            # Client list, see UserAPI.filter_queryset
+            models.Index(fields=['is_manager']),
+            models.Index(fields=['is_manager', 'status']),
+            models.Index(fields=['is_manager', 'status', 'status_changed']),
+            # Manager mails (covering)
+            models.Index(fields=['is_manager', 'email']),
+            # Clients count by status
+            models.Index(fields=['status', 'status_changed']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Saved state is compared on save to invalidate manager mails cache
+        # and cached tokens
+        instance._saved_manager_state = instance.get_manager_state()
+        instance._saved_auth_state = instance.get_auth_state()
+        return instance
+
+    def get_manager_state(self):
+        return self.__dict__.get('is_manager'), self.__dict__.get('email')
+
+    def get_auth_state(self):
+        return tuple(self.__dict__.get(field)
+                     for field in self.AUTH_STATE_FIELDS)
+
+    def save(self, *args, **kwargs):
+        # Saving whole row must not write back old values of fields
+        # changed by atomic UPDATE
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and
+                field.name not in self.CONCURRENT_FIELDS and
+                field.attname not in deferred]
+        super().save(*args, **kwargs)
+
+    def clean(self):
+        super().clean()
+        # Blank passport number from admin form must not take the unique
+        # value, NULLs do not conflict
+        if not self.passport_number:
+            self.passport_number = None
 
     def get_full_name(self):
         return f'{self.first_name} {self.last_name}'
 
     def get_short_name(self):
         return self.get_full_name()
+
+    def set_pin(self, raw_pin):
+        self.pin = make_pin_digest(raw_pin) if raw_pin else None
+
+    def check_pin(self, raw_pin):
+        if not self.pin or not raw_pin:
+            return False
+        return constant_time_compare(self.pin, make_pin_digest(raw_pin))
+
+
+class StatusCounter(models.Model):
+    """
+    Number of users in each status. Count of every status is split between
+    shards, so concurrent status changes rarely update the same row.
+    """
+    status = models.CharField(
+        _('account status'), max_length=10, choices=User.STATUS_CHOICES)
+    shard = models.PositiveSmallIntegerField(_('shard'))
+    count = models.IntegerField(_('count'), default=0)
+
+    class Meta:
+        verbose_name = _('status counter')
+        verbose_name_plural = _('status counters')
+        unique_together = ('status', 'shard')
+
+    def __str__(self):
+        return f'{self.status} #{self.shard}: {self.count}'
+
+
+class StatusChange(models.Model):
+    """
+    Append-only history of ``User.status`` changes, written by every
+    transition, see ``accounts.history``.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='status_changes',
+        verbose_name=_('user'))
+    # Blank for registration
+    old_status = models.CharField(
+        _('old status'), max_length=10, choices=User.STATUS_CHOICES,
+        blank=True)
+    status = models.CharField(
+        _('status'), max_length=10, choices=User.STATUS_CHOICES)
+    changed_at = models.DateTimeField(_('changed at'))
+    # Seconds spent in old status
+    duration = models.PositiveIntegerField(_('duration'), null=True,
+                                           blank=True)
+
+    class Meta:
+        verbose_name = _('status change')
+        verbose_name_plural = _('status changes')
+        indexes = [
+            models.Index(fields=['status', 'changed_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.old_status} -> {self.status}'
+
+
+class StatusChangeRollup(models.Model):
+    """
+    Number and total duration of status changes per day, kept up to date
+    together with ``StatusChange`` rows.
+    """
+    day = models.DateField(_('day'))
+    old_status = models.CharField(
+        _('old status'), max_length=10, choices=User.STATUS_CHOICES,
+        blank=True)
+    status = models.CharField(
+        _('status'), max_length=10, choices=User.STATUS_CHOICES)
+    count = models.PositiveIntegerField(_('count'), default=0)
+    # Sum of ``StatusChange.duration`` in seconds
+    total_duration = models.BigIntegerField(_('total duration'), default=0)
+
+    class Meta:
+        verbose_name = _('status change rollup')
+        verbose_name_plural = _('status change rollups')
+        unique_together = ('day', 'old_status', 'status')
+
+    def __str__(self):
+        return f'{self.day} {self.old_status} -> {self.status}: {self.count}'
+
+
+class QueuedMail(models.Model):
+    """
+    Outbox for transactional mails. Rows are created in the same transaction
+    as the change they notify about and sent by ``send_queued_mail`` command.
+    """
+    STATUS_CHOICES = Choices(
+        ('pending', 'pending', _('pending')),
+        ('sent', 'sent', _('sent')),
+        ('failed', 'failed', _('failed')),
+    )
+
+    subject = models.CharField(_('subject'), max_length=255)
+    message = models.TextField(_('message'), blank=True)
+    from_email = models.CharField(_('from email'), max_length=254)
+    recipients = models.TextField(_('recipients'))
+    status = models.CharField(
+        _('status'), max_length=10, choices=STATUS_CHOICES,
+        default=STATUS_CHOICES.pending)
+    attempts = models.PositiveSmallIntegerField(_('attempts'), default=0)
+    last_error = models.TextField(_('last error'), blank=True)
+    claim = models.CharField(max_length=32, blank=True, null=True)
+    next_attempt = models.DateTimeField(
+        _('next attempt'), default=timezone.now)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = _('queued mail')
+        verbose_name_plural = _('queued mails')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt']),
+            models.Index(fields=['claim']),
+        ]
+
+    def __str__(self):
+        return self.subject
+
+    def get_recipient_list(self):
+        return self.recipients.split('\n')
+
+    def as_message(self, connection=None):
+        return EmailMessage(
+            subject=self.subject, body=self.message,
+            from_email=self.from_email, to=self.get_recipient_list(),
+            connection=connection)
+
+
+class TokenRevocation(models.Model):
+    """
+    Signed tokens of the user issued before ``revoked_at`` are not valid,
+    see ``accounts.tokens``.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='+',
+        verbose_name=_('user'))
+    revoked_at = models.DateTimeField(_('revoked at'), db_index=True)
+
+    class Meta:
+        verbose_name = _('token revocation')
+        verbose_name_plural = _('token revocations')
+
+    def __str__(self):
+        return f'{self.user_id}: {self.revoked_at}'
+
+
+class BalanceTransaction(models.Model):
+    """
+    Append-only ledger of ``User.balance`` changes, see ``accounts.ledger``.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='balance_transactions',
+        verbose_name=_('user'))
+    amount = models.IntegerField(_('amount'))
+    # Repeated posting with the same key is ignored
+    idempotency_key = models.CharField(
+        _('idempotency key'), max_length=64, unique=True, null=True,
+        blank=True)
+    description = models.CharField(
+        _('description'), max_length=255, blank=True)
+    created = models.DateTimeField(_('created'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('balance transaction')
+        verbose_name_plural = _('balance transactions')
+
+    def __str__(self):
+        return f'{self.user_id}: {self.amount:+}'
+
+
+class UserDirectory(models.Model):
+    """
+    Shard and unique lookup values of every user, kept in default database
+    when users are sharded, see ``accounts.sharding``.
+    """
+    user_id = models.IntegerField(_('user id'), primary_key=True)
+    shard = models.CharField(_('shard'), max_length=32)
+    email = models.EmailField(_('email address'), unique=True)
+    pin = models.CharField(
+        _('pin code'), max_length=40, unique=True, blank=True, null=True)
+    passport_number = models.CharField(
+        _('passport number'), max_length=8, unique=True, null=True,
+        blank=True)
+
+    class Meta:
+        verbose_name = _('user directory entry')
+        verbose_name_plural = _('user directory')
+
+    def __str__(self):
+        return f'{self.user_id}: {self.shard}'
+
+
+class IdSequence(models.Model):
+    """
+    Last id allocated for rows of sharded table, so ids are unique across
+    shards.
+    """
+    name = models.CharField(_('name'), max_length=64, unique=True)
+    value = models.BigIntegerField(_('value'), default=0)
+
+    class Meta:
+        verbose_name = _('id sequence')
+        verbose_name_plural = _('id sequences')
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class UnusedPin(models.Model):
+    """
+    Pre-generated pin which is not used by any user, see ``accounts.pins``.
+    Pin is deleted from the pool when it is claimed.
+
+    Pins are stored in plaintext until they are claimed, so anyone reading
+    the database could learn pins of future activations. To limit this the
+    pool is kept small and pins older than ``PIN_POOL_MAX_AGE`` are never
+    claimed and are replaced on refill.
+    """
+    pin = models.CharField(_('pin code'), max_length=15, unique=True)
+    # Set by the UPDATE which claims the pin
+    claim = models.CharField(
+        _('claim'), max_length=32, null=True, blank=True, db_index=True)
+    created = models.DateTimeField(_('created'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('unused pin')
+        verbose_name_plural = _('unused pins')
+
+    def __str__(self):
+        return str(self.pk)
@@ -0,0 +1,143 @@
+import json
+import heapq
+from itertools import islice
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination by all queryset ordering fields. Page is selected
+    with ``WHERE (ordering) > (cursor)`` instead of OFFSET, so any page
+    costs the same. Last ordering field must be unique (e.g. ``id``).
+    """
+    ordering = ('id', )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        ``queryset`` may be list of querysets with the same ordering (e.g.
+        one for each shard), their pages are merged. Ordering fields must
+        have the same direction then.
+        """
+        querysets = queryset if isinstance(queryset, list) else [queryset]
+        self.base_url = request.build_absolute_uri()
+        self.ordering = querysets[0].query.order_by or self.ordering
+        self.page_size = self.get_page_size(request)
+
+        reverse, position = self.decode_cursor(request) or (False, None)
+        ordering = self.ordering
+        if reverse:
+            ordering = [_reverse_ordering(field) for field in ordering]
+
+        pages = []
+        for queryset in querysets:
+            if position is not None:
+                try:
+                    queryset = queryset.filter(self.get_keyset_filter(
+                        position, reverse))
+                except (ValidationError, TypeError, ValueError):
+                    # Cursor value of wrong type
+                    raise NotFound(self.invalid_cursor_message)
+            pages.append(queryset.order_by(*ordering)[:self.page_size + 1])
+
+        if len(pages) == 1:
+            results = list(pages[0])
+        else:
+            results = list(islice(heapq.merge(
+                *pages, key=self.get_position,
+                reverse=ordering[0].startswith('-')), self.page_size + 1))
+
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        return self.page
+
+    def get_keyset_filter(self, position, reverse=False):
+        """
+        Expands row comparison ``(a, b) > (x, y)`` into
+        ``a >= x AND (a > x OR (a = x AND b > y))``, following direction of
+        each field. Redundant ``a >= x`` lets database seek in index range
+        instead of reading index from the start.
+        """
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            descending = field.startswith('-') != reverse
+            lookup = '{}__{}'.format(field.lstrip('-'),
+                                     'lt' if descending else 'gt')
+            equal = {previous.lstrip('-'): value for previous, value
+                     in zip(self.ordering[:index], position)}
+            condition |= Q(**equal, **{lookup: position[index]})
+
+        if len(self.ordering) > 1:
+            first = self.ordering[0]
+            descending = first.startswith('-') != reverse
+            lookup = '{}__{}'.format(first.lstrip('-'),
+                                     'lte' if descending else 'gte')
+            condition = Q(**{lookup: position[0]}) & condition
+
+        return condition
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor((False, self.get_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor((True, self.get_position(self.page[0])))
+
+    def get_position(self, instance):
+        position = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            if isinstance(instance, dict):
+                value = instance[name]
+            else:
+                value = getattr(instance, name)
+            position.append(value)
+        return position
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            reverse, position = json.loads(
+                urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return bool(reverse), position
+
+    def encode_cursor(self, cursor):
+        reverse, position = cursor
+        cursor = json.dumps([int(reverse), position], default=_isoformat,
+                            separators=(',', ':'))
+        encoded = urlsafe_b64encode(cursor.encode('ascii')).decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded)
+
+
+def _reverse_ordering(field):
+    return field[1:] if field.startswith('-') else '-' + field
+
+
+def _isoformat(value):
+    # Full precision is needed, cursor is compared by equality
+    return value.isoformat()
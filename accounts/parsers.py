@@ -0,0 +1,49 @@
+import csv
+import json
+import codecs
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+
+class StreamParser(BaseParser):
+    """
+    Parses request body line by line and returns iterator of rows, so big
+    uploads are processed without reading them into memory.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if stream is None:
+            return iter(())
+        return self.parse_lines(codecs.getreader(encoding)(stream))
+
+    def parse_lines(self, lines):
+        raise NotImplementedError('.parse_lines() must be overridden.')
+
+
+class NDJSONParser(StreamParser):
+    """
+    Newline delimited JSON, malformed lines are returned as ``None``.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse_lines(self, lines):
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+class CSVParser(StreamParser):
+    """
+    CSV with header row of field names.
+    """
+    media_type = 'text/csv'
+
+    def parse_lines(self, lines):
+        return csv.DictReader(lines)
@@ -0,0 +1,125 @@
+import uuid
+import string
+import logging
+import secrets
+from functools import wraps
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from accounts.metrics import registry
+from accounts.models import UnusedPin, make_pin_digest
+from accounts.sharding import get_directory
+
+logger = logging.getLogger(__name__)
+
+PIN_LENGTH = 15
+# Pins kept in the pool by ``refill_pin_pool --loop`` worker (see README),
+# its interval must be well below ``PIN_POOL_MAX_AGE``. Pool pins are not
+# hashed, so the pool is small and short-lived, see ``UnusedPin``.
+PIN_POOL_SIZE = getattr(settings, 'PIN_POOL_SIZE', 100)
+# Seconds pool pin may be claimed after it was generated
+PIN_POOL_MAX_AGE = getattr(settings, 'PIN_POOL_MAX_AGE', 60 * 60)
+# Attempts of activation whose pin was saved by concurrent activation
+PIN_CLAIM_ATTEMPTS = 3
+# Pins checked and inserted per query, keeps parameters under SQLite limit
+PIN_BATCH_SIZE = 400
+
+
+def generate_pin():
+    return ''.join(secrets.choice(string.digits) for i in range(PIN_LENGTH))
+
+
+def generate_pins(count):
+    """
+    Returns ``count`` distinct pins which are neither used by users nor
+    in the pool.
+    """
+    pins = set()
+    while len(pins) < count:
+        candidates = {generate_pin() for i in range(
+            min(count - len(pins), PIN_BATCH_SIZE))} - pins
+        digests = {make_pin_digest(pin): pin for pin in candidates}
+        taken = set(UnusedPin.objects.filter(pin__in=candidates).
+                    values_list('pin', flat=True))
+        taken.update(digests[digest] for digest in get_directory().filter(
+            pin__in=digests).values_list('pin', flat=True))
+        pins.update(candidates - taken)
+    return list(pins)
+
+
+def get_pool_expiry():
+    # Pins created before are not claimed any more
+    return timezone.now() - timedelta(seconds=PIN_POOL_MAX_AGE)
+
+
+def refill_pin_pool(size=PIN_POOL_SIZE):
+    """
+    Replaces expired pins and adds new pins to the pool up to ``size``,
+    returns number of added pins.
+    """
+    UnusedPin.objects.filter(created__lt=get_pool_expiry()).delete()
+    missing = size - UnusedPin.objects.count()
+    added = 0
+    while added < missing:
+        pins = generate_pins(min(missing - added, PIN_BATCH_SIZE))
+        try:
+            with transaction.atomic():
+                UnusedPin.objects.bulk_create(
+                    UnusedPin(pin=pin) for pin in pins)
+        except IntegrityError:  # concurrent refill added the same pin
+            continue
+        added += len(pins)
+    return added
+
+
+def claim_pins(count):
+    """
+    Returns ``count`` pins taken from the pool with one UPDATE. Concurrent
+    claims take different pins, claimed pins are deleted in the same
+    transaction. Pins missing in short pool are generated.
+    """
+    if not count:
+        return []
+    claim = uuid.uuid4().hex
+    unclaimed = UnusedPin.objects.filter(
+        claim=None, created__gte=get_pool_expiry())
+    # Joins transaction of activation, savepoint is not needed
+    with transaction.atomic(savepoint=False):
+        unclaimed.filter(pk__in=unclaimed.values('pk')[:count]).update(
+            claim=claim)
+        claimed = UnusedPin.objects.filter(claim=claim)
+        pins = list(claimed.values_list('pin', flat=True))
+        claimed.delete()
+
+    if len(pins) < count:
+        # Pool was not refilled in time
+        missing = count - len(pins)
+        logger.info('Pin pool is short, generating %s pins', missing)
+        registry.inc('buddha_pin_pool_misses_total', (), missing)
+        pins += generate_pins(missing)
+    return pins
+
+
+def claim_pin():
+    return claim_pins(1)[0]
+
+
+def retry_pin_collisions(func):
+    """
+    Runs activation ``func`` again when it failed to save pin which
+    concurrent activation generated and saved too. Generated pins are
+    checked, not locked. ``func`` must run in its own transaction, so
+    failed attempt is rolled back.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(PIN_CLAIM_ATTEMPTS - 1):
+            try:
+                return func(*args, **kwargs)
+            except IntegrityError:
+                pass
+        return func(*args, **kwargs)
+    return wrapper
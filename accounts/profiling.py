@@ -0,0 +1,163 @@
+import os
+import json
+import pstats
+import logging
+import random
+import cProfile
+import tempfile
+import tracemalloc
+from time import perf_counter
+from threading import Lock
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+SALT = 'accounts.profiling'
+HEADER = 'HTTP_X_PROFILE'
+QUERY_PARAM = 'profile'
+# Frames kept for each allocation site
+TRACEMALLOC_FRAMES = 1
+
+logger = logging.getLogger(__name__)
+
+# tracemalloc is process-wide, it is started by the first and stopped by
+# the last of concurrently profiled requests
+_tracing_lock = Lock()
+_tracing = {'requests': 0, 'started': False}
+
+
+def start_tracing():
+    with _tracing_lock:
+        if not _tracing['requests'] and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _tracing['started'] = True
+        _tracing['requests'] += 1
+
+
+def stop_tracing():
+    """
+    Returns snapshot of allocations traced so far, ``None`` if tracing was
+    stopped outside of this module.
+    """
+    with _tracing_lock:
+        snapshot = None
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+        _tracing['requests'] -= 1
+        if not _tracing['requests'] and _tracing['started']:
+            tracemalloc.stop()
+            _tracing['started'] = False
+    return snapshot
+
+
+def make_profiling_token():
+    """
+    Returns signed token which enables profiling of requests sent with it
+    in ``X-Profile`` header or ``profile`` query parameter.
+    """
+    return signing.dumps('profile', salt=SALT)
+
+
+def check_profiling_token(token, max_age):
+    try:
+        return signing.loads(token, salt=SALT, max_age=max_age) == 'profile'
+    except signing.BadSignature:
+        return False
+
+
+def get_top_functions(profile, limit):
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+    return [{
+        'function': f'{filename}:{line}({name})',
+        'calls': calls,
+        'total_time': round(total_time, 6),
+        'cumulative_time': round(cumulative_time, 6),
+    } for (filename, line, name), (_, calls, total_time, cumulative_time, _)
+        in rows[:limit]]
+
+
+def get_top_allocations(snapshot, limit):
+    if snapshot is None:
+        return []
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+    return [{
+        'site': str(statistic.traceback),
+        'size': statistic.size,
+        'count': statistic.count,
+    } for statistic in snapshot.statistics('lineno')[:limit]]
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests with valid ``make_profiling_token`` token and
+    sampled share of requests (``PROFILING_SAMPLE_RATE``, off by default)
+    with cProfile and tracemalloc. Top functions and allocation sites are
+    saved as JSON to ``PROFILING_DIR``, next to full cProfile stats, file
+    name is returned in ``X-Profile-Id`` header.
+
+    tracemalloc traces all threads, allocations of concurrent requests are
+    included too. Other requests cost one header and one query parameter
+    lookup. Failure to save profile does not fail the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        self.token_max_age = getattr(
+            settings, 'PROFILING_TOKEN_MAX_AGE', 60 * 60)
+        self.directory = getattr(settings, 'PROFILING_DIR', os.path.join(
+            tempfile.gettempdir(), 'buddha-profiles'))
+        self.limit = getattr(settings, 'PROFILING_TOP', 30)
+
+    def should_profile(self, request):
+        token = request.META.get(HEADER) or request.GET.get(QUERY_PARAM)
+        if token:
+            return check_profiling_token(token, self.token_max_age)
+        return bool(self.sample_rate) and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        start_tracing()
+        profile = cProfile.Profile()
+        started = perf_counter()
+        profile.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.disable()
+            duration = perf_counter() - started
+            snapshot = stop_tracing()
+
+        try:
+            response['X-Profile-Id'] = self.save(
+                request, response, profile, snapshot, duration)
+        except OSError as error:
+            logger.warning('Saving profile of %s failed: %s',
+                           request.path, error)
+        return response
+
+    def save(self, request, response, profile, snapshot, duration):
+        os.makedirs(self.directory, exist_ok=True)
+        name = '{}-{}'.format(timezone.now().strftime('%Y%m%d%H%M%S'),
+                              get_random_string(6))
+        path = os.path.join(self.directory, name)
+
+        profile.dump_stats(path + '.prof')
+        with open(path + '.json', 'w') as output:
+            json.dump({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration': round(duration, 6),
+                'functions': get_top_functions(profile, self.limit),
+                'allocations': get_top_allocations(snapshot, self.limit),
+            }, output, indent=2)
+        return name
@@ -0,0 +1,58 @@
+import io
+import csv
+import json
+from datetime import date
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class StreamRenderer(BaseRenderer):
+    """
+    Renders rows of given fields. ``stream`` takes iterable of row chunks
+    and yields rendered text by chunk, to be used with
+    ``StreamingHttpResponse``.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Error responses are not rows, e.g. list of validation messages
+        rows = data if isinstance(data, list) else [data]
+        if not all(isinstance(row, dict) for row in rows):
+            rows = [{'detail': data}]
+        fields = list(rows[0]) if rows else []
+        chunk = [[row[field] for field in fields] for row in rows]
+        return ''.join(self.stream(fields, [chunk])).encode(self.charset)
+
+    def stream(self, fields, chunks):
+        raise NotImplementedError('.stream() must be overridden.')
+
+
+class NDJSONRenderer(StreamRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def stream(self, fields, chunks):
+        for chunk in chunks:
+            yield ''.join(json.dumps(dict(zip(fields, row)), cls=JSONEncoder,
+                                     ensure_ascii=False) + '\n'
+                          for row in chunk)
+
+
+class CSVRenderer(StreamRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, fields, chunks):
+        yield self.write([fields])
+        for chunk in chunks:
+            yield self.write(chunk)
+
+    def write(self, rows):
+        encoder = JSONEncoder()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([encoder.default(value)
+                             if isinstance(value, date) else value
+                             for value in row])
+        return buffer.getvalue()
@@ -0,0 +1,145 @@
+import math
+import time
+import random
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from accounts import sharding
+from accounts.middleware import get_view_option
+
+# Aliases of read-only copies of default database
+DATABASE_REPLICAS = getattr(settings, 'DATABASE_REPLICAS', [])
+# Seconds which replicas may be behind default database
+DATABASE_REPLICA_LAG = getattr(settings, 'DATABASE_REPLICA_LAG', 1)
+# Replica lag tolerated by views without ``replica_lag_tolerance``
+REPLICA_LAG_TOLERANCE = getattr(settings, 'REPLICA_LAG_TOLERANCE', 0)
+LAST_WRITE_KEY = 'accounts:replicas:last-write'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+
+
+def use_replicas(tolerance):
+    """
+    Allows following reads of this thread from one of replicas which is
+    at most ``tolerance`` seconds behind default database.
+    """
+    _state.replica = random.choice(DATABASE_REPLICAS)
+    _state.tolerance = tolerance
+    _state.written = None
+    _state.pinned = False
+
+
+def set_last_write(written):
+    """
+    Sets time of the last write of data read by this thread. By default it
+    is time of the last write of any request.
+    """
+    _state.written = written
+
+
+def pin_to_primary():
+    """
+    Routes following reads of this thread to default database.
+    """
+    _state.pinned = True
+
+
+def get_replica():
+    replica = getattr(_state, 'replica', None)
+    if (replica is None or _state.pinned or
+            connections[DEFAULT_DB_ALIAS].in_atomic_block):
+        return None
+    if _state.tolerance >= DATABASE_REPLICA_LAG:
+        return replica
+
+    # Replica may miss writes made within the lag
+    if _state.written is None:
+        _state.written = cache.get(LAST_WRITE_KEY, 0)
+    if time.time() - _state.written >= DATABASE_REPLICA_LAG:
+        return replica
+    return None
+
+
+class ShardRouter:
+    """
+    Routes queries of objects loaded from user shard (e.g. saving user or
+    reading its related objects) to that shard. User directory, id
+    sequences and pin pool are kept in default database only.
+    """
+    DEFAULT_DB_MODELS = ('userdirectory', 'idsequence', 'unusedpin')
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and \
+                instance._state.db in sharding.USER_SHARDS:
+            return instance._state.db
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == 'accounts' and model_name in self.DEFAULT_DB_MODELS:
+            return db == DEFAULT_DB_ALIAS
+        return None
+
+
+class ReplicaRouter:
+    """
+    Routes reads of safe requests to replicas (see ``ReplicaMiddleware``),
+    other reads and all writes to default database. After the first write
+    reads of the request are pinned to default database, so request reads
+    what it has written.
+    """
+
+    def db_for_read(self, model, **hints):
+        return get_replica()
+
+    def db_for_write(self, model, **hints):
+        _state.pinned = True
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Reads of safe requests go to replica if view tolerates its lag
+    (``replica_lag_tolerance`` seconds, ``None`` reads default database
+    only). Views which tolerate less than ``DATABASE_REPLICA_LAG`` read
+    replica only if no request has written within the lag, time of the
+    last write is kept in cache.
+
+    Writes made outside of requests (e.g. management commands) are not
+    tracked.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        try:
+            return self.get_response(request)
+        finally:
+            _state.replica = None
+            if _state.wrote:
+                cache.set(LAST_WRITE_KEY, time.time(),
+                          math.ceil(DATABASE_REPLICA_LAG))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS or not DATABASE_REPLICAS:
+            return
+        tolerance = get_view_option(view_func, request.method,
+                                    'replica_lag_tolerance',
+                                    REPLICA_LAG_TOLERANCE)
+        if tolerance is not None:
+            use_replicas(tolerance)
@@ -1,14 +1,25 @@
-from django.conf import settings
-from django.core.mail import send_mail
+from datetime import timedelta
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from django.contrib.auth import authenticate
-from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _
 
 from allauth.account.adapter import get_adapter
-from allauth.utils import email_address_exists
+from allauth.account.models import EmailAddress
 from rest_framework import serializers, exceptions
+from rest_framework.settings import api_settings
 
+from accounts.mail import queue_mail
+from accounts.cache import get_manager_emails
+from accounts.counters import count_status_change, get_status_count
+from accounts.history import (
+    STATUS_REPORT_DAYS, STATUS_REPORT_MAX_DAYS, record_status_changes)
 from accounts.models import User
+from accounts.sharding import create_user, get_directory, using_user_shard
+from accounts.tokens import REFRESH, InvalidToken, read_token
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -21,11 +32,24 @@ class UserSerializer(serializers.ModelSerializer):
     is_staff = serializers.ReadOnlyField()
     is_manager = serializers.ReadOnlyField()
     is_active = serializers.ReadOnlyField()
+    version = serializers.ReadOnlyField()
 
     class Meta:
         model = User
         fields = ('id', 'email', 'first_name',  'last_name', 'balance',
-                  'passport_number', 'is_staff', 'is_manager', 'is_active')
+                  'passport_number', 'is_staff', 'is_manager', 'is_active',
+                  'version')
+
+
+class UserValuesSerializer(serializers.BaseSerializer):
+    """
+    Read only ``UserSerializer`` for rows of ``.values(*fields)``. Gives the
+    same output without model instances and per-field serializer calls.
+    """
+    fields = UserSerializer.Meta.fields
+
+    def to_representation(self, row):
+        return OrderedDict([(field, row[field]) for field in self.fields])
 
 
 class RegisterSerializer(serializers.Serializer):
@@ -34,76 +58,176 @@ class RegisterSerializer(serializers.Serializer):
     first_name = serializers.CharField(required=True)
     last_name = serializers.CharField(required=True)
 
+    default_error_messages = {
+        'email_taken': _("A user is already registered "
+                         "with this e-mail address."),
+        'passport_taken': _("A user is already registered with "
+                            "this passport number address."),
+    }
+
     def validate_email(self, email):
-        email = get_adapter().clean_email(email)
-        if email and email_address_exists(email):
-            raise serializers.ValidationError(_("A user is already registered "
-                                                "with this e-mail address."))
-        return email
+        return get_adapter().clean_email(email)
 
     def validate(self, attrs):
-        passport_number = attrs['passport_number']
-        if User.objects.filter(passport_number=passport_number).exists():
-            raise serializers.ValidationError(
-                _("A user is already registered with "
-                  "this passport number address."))
+        errors = self.get_uniqueness_errors(
+            attrs['email'], attrs['passport_number'])
+        if errors:
+            raise serializers.ValidationError(errors)
         return attrs
 
+    def get_uniqueness_errors(self, email, passport_number):
+        """
+        Checks email and passport number of new client with one query,
+        including emails known to allauth. Email error goes first.
+        """
+        taken = get_directory().filter(
+            Q(email__iexact=email) | Q(passport_number=passport_number) |
+            Q(pk__in=EmailAddress.objects.filter(
+                email__iexact=email).values('user_id'))
+        ).values_list('email', 'passport_number')
+
+        errors = {}
+        for taken_email, taken_passport_number in taken:
+            if taken_email.lower() == email.lower() or \
+                    taken_passport_number != passport_number:
+                return {'email': [self.error_messages['email_taken']]}
+            errors[api_settings.NON_FIELD_ERRORS_KEY] = [
+                self.error_messages['passport_taken']]
+        return errors
+
     def get_cleaned_data(self):
         return {
             'email': self.validated_data.get('email', ''),
             'passport_number': self.validated_data.get('passport_number', '')
         }
 
+    @transaction.atomic
     def create(self, validated_data):
-        user = User.objects.create(**validated_data,
-                                   status=User.STATUS_CHOICES.creating)
+        try:
+            with transaction.atomic():
+                user = create_user(
+                    **validated_data, status=User.STATUS_CHOICES.creating)
+        except IntegrityError:
+            # Concurrent registration took email or passport number
+            errors = self.get_uniqueness_errors(
+                validated_data['email'], validated_data['passport_number'])
+            if not errors:
+                raise
+            raise serializers.ValidationError(errors)
+        count_status_change(None, user.status)
+        record_status_changes([user], None, user.status, user.status_changed)
 
         mail_context = {
             'first_name': user.first_name,
             'last_name': user.last_name
         }
-        template_path = 'email/client_registered_mail.txt'
-        send_mail(  # Mail to client
+        queue_mail(  # Mail to client
             subject=_('You have been registered in buddha application!'),
-            message=render_to_string(template_path, mail_context),
-            from_email=settings.DEFAULT_FROM_EMAIL,
+            template_path='email/client_registered_mail.txt',
+            context=mail_context,
             recipient_list=[validated_data['email']])
 
         mail_context = {
-            'waiting': User.objects.filter(status='creating').count()
+            'waiting': get_status_count(User.STATUS_CHOICES.creating)
         }
-        template_path = 'email/client_registered_mail_to_manager.txt'
-        manager_mails = list(User.objects.filter(is_manager=True).\
-                             values_list('email', flat=True))
-        send_mail(  # Mail to managers
+        manager_mails = get_manager_emails()
+        queue_mail(  # Mail to managers
             subject=_('New client registered in buddha application!'),
-            message=render_to_string(template_path, mail_context),
-            from_email=settings.DEFAULT_FROM_EMAIL,
+            template_path='email/client_registered_mail_to_manager.txt',
+            context=mail_context,
             recipient_list=manager_mails)
 
         return user
 
 
+class BulkRegisterRowSerializer(RegisterSerializer):
+    """
+    Validates one client of bulk registration. Uniqueness is checked for
+    the whole chunk at once, see ``accounts.bulk.register_clients``.
+    """
+
+    def validate_email(self, email):
+        return email
+
+    def validate(self, attrs):
+        return attrs
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(),
+                                allow_empty=False)
+
+
+class StatusChangeSerializer(serializers.Serializer):
+    version = serializers.IntegerField(required=False, min_value=0)
+
+
+class StatusReportSerializer(serializers.Serializer):
+    default_error_messages = {
+        'invalid_range': _('Report range must be from 1 to {max_days} '
+                           'days.')
+    }
+
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        until = attrs.get('until') or timezone.localdate()
+        since = attrs.get('since') or until - timedelta(
+            days=STATUS_REPORT_DAYS - 1)
+        if not 0 <= (until - since).days < STATUS_REPORT_MAX_DAYS:
+            self.fail('invalid_range', max_days=STATUS_REPORT_MAX_DAYS)
+        return {'since': since, 'until': until}
+
+
+class LedgerEntrySerializer(serializers.Serializer):
+    user_id = serializers.IntegerField()
+    amount = serializers.IntegerField()
+    idempotency_key = serializers.CharField(
+        max_length=64, required=False, allow_null=True)
+    description = serializers.CharField(
+        max_length=255, required=False, allow_blank=True)
+
+    def validate_amount(self, amount):
+        if not amount:
+            raise serializers.ValidationError(_('Amount must not be zero.'))
+        return amount
+
+
 class LoginSerializer(serializers.Serializer):
     pin = serializers.CharField(style={'input_type': 'password'})
 
     def _validate_pin(self, pin):
         if pin:
-            user = authenticate(pin=pin)
+            user = authenticate(self.context.get('request'), pin=pin)
         else:
             msg = _('Must include "pin".')
             raise exceptions.ValidationError(msg)
 
+        if user is None:
+            raise exceptions.NotFound(_('User with this pin does not exist'))
+
         return user
 
     def validate(self, attrs):
-        pin = attrs.get('pin')
+        attrs['user'] = self._validate_pin(attrs.get('pin'))
+        return attrs
 
+
+class RefreshTokenSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
         try:
-            user = User.objects.get(pin=pin)
-            attrs['user'] = user
-        except User.DoesNotExist:
-            pass
+            user_id, status = read_token(attrs['refresh'], REFRESH)
+        except InvalidToken as error:
+            raise exceptions.AuthenticationFailed(error.args[0])
+
+        user = using_user_shard(User.objects.filter(
+            pk=user_id, is_active=True), user_id).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
 
+        attrs['user'] = user
         return attrs
@@ -0,0 +1,305 @@
+from hashlib import md5
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Max
+
+from accounts.models import User, UserDirectory, IdSequence
+
+# Database aliases of user shards, without them users are in default
+# database. Default database keeps ``UserDirectory`` and ``IdSequence``.
+# Users saved without ``create_user`` (managers, users registered before
+# sharding) stay in default database, directory points there too.
+# Rows which refer to users by id (status history, ledger entries, token
+# revocations) stay in default database too, their foreign keys to users
+# are not enforced across databases.
+USER_SHARDS = getattr(settings, 'USER_SHARDS', [])
+# ``range`` puts blocks of ``USER_SHARD_SIZE`` ids to shards in turn,
+# ``hash`` puts users by hash of email
+USER_SHARDING = getattr(settings, 'USER_SHARDING', 'range')
+USER_SHARD_SIZE = getattr(settings, 'USER_SHARD_SIZE', 1000000)
+USER_SEQUENCE = 'accounts.User'
+DIRECTORY_FIELDS = ('email', 'pin', 'passport_number')
+
+
+def allocate_ids(count):
+    """
+    Returns range of ``count`` new user ids, unique in all shards.
+    """
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        sequence = IdSequence.objects.filter(name=USER_SEQUENCE)
+        if not sequence.update(value=F('value') + count):
+            # The first allocation continues after existing users
+            start = max(User.objects.using(alias).aggregate(
+                Max('id'))['id__max'] or 0
+                for alias in (DEFAULT_DB_ALIAS, *USER_SHARDS))
+            try:
+                with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                    IdSequence.objects.create(
+                        name=USER_SEQUENCE, value=start + count)
+            except IntegrityError:  # concurrent first allocation
+                sequence.update(value=F('value') + count)
+        value = sequence.values_list('value', flat=True).get()
+    return range(value - count + 1, value + 1)
+
+
+def get_shard(user_id, email):
+    """
+    Returns shard of new user.
+    """
+    if USER_SHARDING == 'hash':
+        index = int(md5(email.lower().encode()).hexdigest(), 16)
+    else:
+        index = (int(user_id) - 1) // USER_SHARD_SIZE
+    return USER_SHARDS[index % len(USER_SHARDS)]
+
+
+def get_user_shard(user_id):
+    """
+    Returns database alias of user read from directory, default database
+    for ids without directory entry. ``None`` if ``user_id`` is not an id.
+    """
+    if not USER_SHARDS:
+        return DEFAULT_DB_ALIAS
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    shard = UserDirectory.objects.filter(pk=user_id).values_list(
+        'shard', flat=True).first()
+    return shard or DEFAULT_DB_ALIAS
+
+
+def get_user_shards(user_ids):
+    """
+    Returns dict of existing user id to database alias of the user. Ids
+    without directory entry are looked up in default database.
+    """
+    users = User.objects.using(DEFAULT_DB_ALIAS)
+    if not USER_SHARDS:
+        return dict.fromkeys(users.filter(pk__in=user_ids).
+                             values_list('pk', flat=True), DEFAULT_DB_ALIAS)
+
+    shards = dict(UserDirectory.objects.filter(pk__in=user_ids).
+                  values_list('pk', 'shard'))
+    missing = set(user_ids) - set(shards)
+    if missing:
+        shards.update(dict.fromkeys(users.filter(pk__in=missing).
+                                    values_list('pk', flat=True),
+                                    DEFAULT_DB_ALIAS))
+    return shards
+
+
+def get_directory():
+    """
+    Returns queryset with unique lookup fields of all users (email, pin,
+    passport number), e.g. to check that they are not taken.
+    """
+    if USER_SHARDS:
+        return UserDirectory.objects.all()
+    return User.objects.all()
+
+
+def create_user(**fields):
+    """
+    Saves new user to its shard. Directory entry is inserted first, so
+    email, pin or passport number taken in any shard raises
+    ``IntegrityError``.
+    """
+    return save_new_user(User(**fields))
+
+
+def save_new_user(user):
+    if not USER_SHARDS:
+        user.save(force_insert=True)
+        return user
+
+    if user.pk is None:
+        user.pk = allocate_ids(1)[0]
+    shard = get_shard(user.pk, user.email)
+    with transaction.atomic():
+        UserDirectory.objects.create(**_directory_fields(user, shard))
+        with transaction.atomic(using=shard):
+            user.save(force_insert=True, using=shard)
+    return user
+
+
+def save_new_users(users):
+    """
+    Bulk ``create_user`` of unsaved ``users``, with one insert of directory
+    entries and one insert for each shard. ``post_save`` is not sent and
+    ids are not set by databases which do not return them from bulk insert
+    (only without shards).
+    """
+    if not USER_SHARDS:
+        User.objects.bulk_create(users)
+        return
+
+    by_shard = {}
+    for user, pk in zip(users, allocate_ids(len(users))):
+        user.pk = pk
+        by_shard.setdefault(get_shard(pk, user.email), []).append(user)
+    with transaction.atomic():
+        UserDirectory.objects.bulk_create(
+            UserDirectory(**_directory_fields(user, shard))
+            for shard, group in by_shard.items() for user in group)
+        for shard, group in by_shard.items():
+            with transaction.atomic(using=shard):
+                User.objects.using(shard).bulk_create(group)
+
+
+def _directory_fields(user, shard):
+    return dict({field: getattr(user, field) for field in DIRECTORY_FIELDS},
+                user_id=user.pk, shard=shard)
+
+
+def allocate_user_id(user):
+    """
+    Sets id of new user saved to default database without ``create_user``
+    (e.g. manager), so it does not take id of user in a shard.
+    """
+    if USER_SHARDS and user.pk is None:
+        user.pk = allocate_ids(1)[0]
+
+
+def add_to_directory(user):
+    """
+    Adds directory entry of new user saved to default database, users of
+    shards get it from ``create_user``.
+    """
+    if USER_SHARDS and user._state.db not in USER_SHARDS:
+        UserDirectory.objects.create(
+            **_directory_fields(user, DEFAULT_DB_ALIAS))
+
+
+def sync_directory(chunk_size=500):
+    """
+    Adds missing directory entries of users of all databases, e.g. of users
+    registered before sharding was turned on, and moves id sequence past
+    their ids. Returns number of added entries.
+    """
+    added = max_pk = 0
+    for alias in (DEFAULT_DB_ALIAS, *USER_SHARDS):
+        last_pk = 0
+        while True:
+            users = list(User.objects.using(alias).filter(
+                pk__gt=last_pk).order_by('pk').only(
+                'pk', *DIRECTORY_FIELDS)[:chunk_size])
+            if not users:
+                break
+            last_pk = users[-1].pk
+            existing = set(UserDirectory.objects.filter(
+                pk__in=[user.pk for user in users]).values_list(
+                'pk', flat=True))
+            entries = [UserDirectory(**_directory_fields(user, alias))
+                       for user in users if user.pk not in existing]
+            UserDirectory.objects.bulk_create(entries)
+            added += len(entries)
+        max_pk = max(max_pk, last_pk)
+
+    IdSequence.objects.filter(name=USER_SEQUENCE, value__lt=max_pk).update(
+        value=max_pk)
+    return added
+
+
+def update_directory(user, update_fields=None):
+    """
+    Copies lookup fields of saved user to directory.
+    """
+    if not USER_SHARDS:
+        return
+    fields = DIRECTORY_FIELDS
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    if fields:
+        UserDirectory.objects.filter(pk=user.pk).update(**{
+            field: getattr(user, field) for field in fields})
+
+
+def update_directories(users, fields):
+    """
+    Copies ``fields`` set on ``users`` with UPDATE, which sends no
+    ``post_save``, to directory. Values may be expressions of user ``pk``,
+    e.g. ``Case`` with value for each user.
+    """
+    fields = {field: value for field, value in fields.items()
+              if field in DIRECTORY_FIELDS}
+    pks = [user.pk for user in users]
+    if USER_SHARDS and fields and pks:
+        UserDirectory.objects.filter(pk__in=pks).update(**fields)
+
+
+def remove_from_directory(user):
+    if USER_SHARDS:
+        UserDirectory.objects.filter(pk=user.pk).delete()
+
+
+def find_user(**lookup):
+    """
+    Returns user by unique ``email``, ``pin`` digest or
+    ``passport_number``. Users without directory entry are looked up in
+    default database.
+    """
+    if not USER_SHARDS:
+        return User.objects.get(**lookup)
+
+    try:
+        user_id, shard = UserDirectory.objects.values_list(
+            'user_id', 'shard').get(**lookup)
+    except UserDirectory.DoesNotExist:
+        return User.objects.using(DEFAULT_DB_ALIAS).get(**lookup)
+    return User.objects.using(shard).get(pk=user_id)
+
+
+def using_user_shard(queryset, user_id):
+    """
+    Returns user queryset on shard of ``user_id``.
+    """
+    if not USER_SHARDS:
+        return queryset
+    shard = get_user_shard(user_id)
+    if shard is None:
+        return queryset.none()
+    return queryset.using(shard)
+
+
+def using_all_shards(queryset):
+    """
+    Returns user queryset for each shard, ``KeysetPagination`` merges their
+    results. Unsharded queryset is returned as it is.
+    """
+    if not USER_SHARDS:
+        return queryset
+    return [queryset.using(shard) for shard in USER_SHARDS]
+
+
+def get_shard_querysets(queryset):
+    """
+    Returns list of user querysets of all shards, ``[queryset]`` without
+    shards.
+    """
+    querysets = using_all_shards(queryset)
+    return querysets if isinstance(querysets, list) else [querysets]
+
+
+def atomic_on_shard(alias):
+    """
+    Returns transaction of user shard ``alias``. Changes of users in
+    default database run in transaction of the caller.
+    """
+    if alias in USER_SHARDS:
+        return transaction.atomic(using=alias, savepoint=False)
+    return ExitStack()
+
+
+@contextmanager
+def atomic_on_all_shards():
+    """
+    Transaction of default database and of every user shard, for batch
+    changes of users of many shards. Shards are committed first.
+    """
+    with transaction.atomic(), ExitStack() as stack:
+        for shard in USER_SHARDS:
+            stack.enter_context(transaction.atomic(using=shard))
+        yield
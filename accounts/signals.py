@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models.signals import pre_save, post_save, post_delete
+from rest_framework.authtoken.models import Token
+
+from accounts.models import User
+from accounts.tokens import revoke_tokens
+from accounts.sharding import (
+    add_to_directory, allocate_user_id, update_directory,
+    remove_from_directory)
+from accounts.cache import (
+    invalidate_manager_emails, invalidate_user_tokens, token_cache,
+    bump_users_versions)
+
+
+def _invalidate_manager_emails():
+    invalidate_manager_emails()
+    # Other request may cache old list before transaction is committed
+    transaction.on_commit(invalidate_manager_emails)
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, **kwargs):
+    if not raw:
+        allocate_user_id(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    previous = getattr(instance, '_saved_manager_state', None)
+    current = instance.get_manager_state()
+    instance._saved_manager_state = current
+
+    if created:
+        changed = instance.is_manager
+    elif previous is None:  # instance was not loaded from db
+        changed = True
+    else:
+        is_manager, was_manager = current[0], previous[0]
+        changed = current != previous and (is_manager or was_manager)
+
+    if changed:
+        _invalidate_manager_emails()
+
+    bump_users_versions([instance.pk])
+    if created:
+        add_to_directory(instance)
+    else:
+        update_directory(instance, update_fields)
+
+    previous = getattr(instance, '_saved_auth_state', None)
+    current = instance.get_auth_state()
+    instance._saved_auth_state = current
+
+    if not created and current != previous:
+        invalidate_user_tokens([instance.pk])
+        # Clients get pin and tokens only after ``creating`` status
+        if previous is None or previous[2] != User.STATUS_CHOICES.creating:
+            revoke_tokens([instance.pk])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    bump_users_versions([instance.pk])
+    remove_from_directory(instance)
+    if instance.is_manager:
+        _invalidate_manager_emails()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
+    transaction.on_commit(lambda: token_cache.delete(instance.key))
@@ -0,0 +1,80 @@
+"""
+SQLite backend tuned for concurrent writes, use it as ``ENGINE``
+``accounts.sqlite3``. Pragmas and lock handling are set with ``OPTIONS``,
+other options are passed to ``sqlite3.connect`` as by Django backend.
+"""
+import time
+
+from django.db.backends.sqlite3.base import (
+    Database, DatabaseWrapper as SQLiteDatabaseWrapper, SQLiteCursorWrapper)
+
+PRAGMAS = {
+    # Readers do not block writer and writer does not block readers
+    'journal_mode': 'WAL',
+    # WAL is synced on checkpoint only, commit may be lost on power loss
+    # but database stays consistent
+    'synchronous': 'NORMAL',
+    # Milliseconds to wait for lock before "database is locked"
+    'busy_timeout': 5000,
+    'mmap_size': 64 * 1024 * 1024,
+    # Negative size is in KiB
+    'cache_size': -16 * 1024,
+}
+# Transactions take write lock at start, otherwise transaction which read
+# first fails at once when it needs write lock held by other connection
+TRANSACTION_MODE = 'IMMEDIATE'
+# Statements outside of transaction which still find database locked after
+# busy timeout are retried with doubled delay
+LOCK_RETRIES = 3
+LOCK_RETRY_DELAY = 0.05
+
+
+class RetryingCursorWrapper(SQLiteCursorWrapper):
+
+    def execute(self, query, params=None):
+        return self.retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self.retry(super().executemany, query, param_list)
+
+    def retry(self, execute, *args):
+        retries, delay = self.lock_retries
+        for attempt in range(retries + 1):
+            try:
+                return execute(*args)
+            except Database.OperationalError as error:
+                # Statement inside transaction is not retried, reads of
+                # the transaction may be outdated, retry it as a whole
+                if attempt == retries or self.connection.in_transaction or \
+                        'database is locked' not in str(error):
+                    raise
+            time.sleep(delay * 2 ** attempt)
+
+
+class DatabaseWrapper(SQLiteDatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = {name: kwargs.pop(name, value)
+                        for name, value in PRAGMAS.items()}
+        self.transaction_mode = kwargs.pop(
+            'transaction_mode', TRANSACTION_MODE)
+        self.lock_retries = (kwargs.pop('lock_retries', LOCK_RETRIES),
+                             kwargs.pop('lock_retry_delay', LOCK_RETRY_DELAY))
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            # None keeps SQLite default
+            if value is not None:
+                conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.lock_retries = self.lock_retries
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}'.strip())
@@ -0,0 +1,21 @@
+import os
+
+from django.db import connections
+from django.core.management import call_command
+
+
+def add_database(alias, directory):
+    """
+    Adds migrated SQLite database ``alias`` stored in ``directory``.
+    """
+    connections.databases[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(directory, f'{alias}.sqlite3'),
+    }
+    call_command('migrate', database=alias, verbosity=0)
+
+
+def remove_database(alias):
+    connections[alias].close()
+    del connections.databases[alias]
+    delattr(connections._connections, alias)
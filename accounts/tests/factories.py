@@ -12,7 +12,7 @@ TEST_PASSWORD = 'password'
 class UserFactory(factory.django.DjangoModelFactory):
     email = factory.Sequence(lambda n: 'user%s@example.com' % n)
     password = factory.PostGenerationMethodCall('set_password', TEST_PASSWORD)
-    pin = factory.Faker('password')
+    pin = factory.PostGenerationMethodCall('set_pin', None)
     first_name = factory.Faker('first_name')
     last_name = factory.Faker('last_name')
     passport_number = factory.Faker('password')
@@ -1,7 +1,13 @@
 from datetime import timedelta
+from unittest import mock
+from base64 import urlsafe_b64encode
+from django.db import connection
+from django.core.cache import cache
 from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
 
 from accounts.models import User
+from accounts.pagination import KeysetPagination
 from accounts.tests.factories import UserFactory, ManagerFactory
 
 from rest_framework.test import APITestCase
@@ -11,6 +17,7 @@ from rest_framework.reverse import reverse
 class TestManagerAPI(APITestCase):
 
     def setUp(self):
+        cache.clear()
         self.user = ManagerFactory()
         self.client.force_authenticate(user=self.user)
 
@@ -24,7 +31,7 @@ class TestManagerAPI(APITestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 4)
+        self.assertEqual(len(response.data['results']), 4)
         self.assertContains(response, usr1.first_name)
         self.assertContains(response, usr2.first_name)
         self.assertContains(response, usr3.first_name)
@@ -81,7 +88,7 @@ class TestManagerAPI(APITestCase):
         self.assertEqual(usr.status, User.STATUS_CHOICES.activated)
 
     def test_client_deactivate_himself(self):
-        usr = UserFactory()
+        usr = UserFactory(status=User.STATUS_CHOICES.activated)
         self.client.force_authenticate(user=usr)
 
         url = reverse('accounts:users-deactivate')
@@ -90,7 +97,7 @@ class TestManagerAPI(APITestCase):
         self.assertEqual(response.status_code, 200)
 
     def test_manager_confirm_deactivate_client_account(self):
-        usr = UserFactory()
+        usr = UserFactory(status=User.STATUS_CHOICES.activated)
         self.client.force_authenticate(user=usr)
 
         url = reverse('accounts:users-deactivate')
@@ -109,7 +116,7 @@ class TestManagerAPI(APITestCase):
         self.assertEqual(usr.status, User.STATUS_CHOICES.closed)
 
     def test_client_dont_have_perms_to_deactivate_confirm(self):
-        usr = UserFactory()
+        usr = UserFactory(status=User.STATUS_CHOICES.activated)
         self.client.force_authenticate(user=usr)
 
         url = reverse('accounts:users-deactivate')
@@ -146,7 +153,83 @@ class TestManagerAPI(APITestCase):
         response = self.client.get(url, data=data, format='json')
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data[0]['first_name'], usr1.first_name)
-        self.assertEqual(response.data[1]['first_name'], usr4.first_name)
-        self.assertEqual(response.data[2]['first_name'], usr2.first_name)
-        self.assertEqual(response.data[3]['first_name'], usr3.first_name)
+        results = response.data['results']
+        self.assertEqual(results[0]['first_name'], usr1.first_name)
+        self.assertEqual(results[1]['first_name'], usr4.first_name)
+        self.assertEqual(results[2]['first_name'], usr2.first_name)
+        self.assertEqual(results[3]['first_name'], usr3.first_name)
+
+    def walk_pages(self, url, data=None):
+        pages = []
+        while url:
+            response = self.client.get(url, data=data)
+            self.assertEqual(response.status_code, 200)
+            pages.append([usr['id'] for usr in response.data['results']])
+            url, data = response.data['next'], None
+        return pages
+
+    @mock.patch.object(KeysetPagination, 'page_size', 2)
+    def test_users_list_paginated_by_cursor(self):
+        users = [UserFactory() for _ in range(5)]
+
+        url = reverse('accounts:users-list')
+        pages = self.walk_pages(url)
+
+        self.assertEqual(pages, [[users[0].pk, users[1].pk],
+                                 [users[2].pk, users[3].pk],
+                                 [users[4].pk]])
+
+        response = self.client.get(url)
+        response = self.client.get(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([usr['id'] for usr in response.data['results']],
+                         pages[0])
+        self.assertIsNone(response.data['previous'])
+
+    @mock.patch.object(KeysetPagination, 'page_size', 2)
+    def test_closed_users_paginated_by_status_changed(self):
+        usr1, usr2, usr3 = [UserFactory(status=User.STATUS_CHOICES.closed)
+                            for _ in range(3)]
+        UserFactory(status=User.STATUS_CHOICES.closing)
+
+        # status_changed is auto_now_add, so it is set after creation
+        changed = timezone.now() - timedelta(hours=1)
+        User.objects.filter(pk__in=[usr1.pk, usr3.pk]).update(
+            status_changed=changed)
+        User.objects.filter(pk=usr2.pk).update(
+            status_changed=changed - timedelta(hours=1))
+
+        url = reverse('accounts:users-list')
+        data = {'status': User.STATUS_CHOICES.closed}
+        pages = self.walk_pages(url, data)
+
+        self.assertEqual(pages, [[usr2.pk, usr1.pk], [usr3.pk]])
+
+    @mock.patch.object(KeysetPagination, 'page_size', 2)
+    def test_users_list_page_cost_does_not_depend_on_depth(self):
+        for _ in range(6):
+            UserFactory()
+
+        url = reverse('accounts:users-list')
+        response = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+
+    def test_users_list_invalid_cursor(self):
+        url = reverse('accounts:users-list')
+        response = self.client.get(url, data={'cursor': 'invalid'})
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_users_list_cursor_with_wrong_values(self):
+        url = reverse('accounts:users-list')
+        for position in ('["abc"]', '[[1]]', '[null]', '[{}]'):
+            cursor = urlsafe_b64encode(
+                '[0,{}]'.format(position).encode('ascii')).decode('ascii')
+            response = self.client.get(url, data={'cursor': cursor})
+
+            self.assertEqual(response.status_code, 404, position)
@@ -1,14 +1,24 @@
+import re
+from unittest import mock
+
 from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
 
 from accounts.models import User
+from accounts.serializers import RegisterSerializer
 from accounts.tests.factories import UserFactory, ManagerFactory
 
+from allauth.account.models import EmailAddress
 from rest_framework.test import APITestCase
 from rest_framework.reverse import reverse
 
 
 class UserAuthTestCase(APITestCase):
 
+    def setUp(self):
+        cache.clear()
+
     def test_successful_register(self):
         data = {
             'first_name': 'Michael',
@@ -62,6 +72,23 @@ class UserAuthTestCase(APITestCase):
             response.data['email'],
             ['A user is already registered with this e-mail address.'])
 
+    def test_email_not_unique_ignoring_case_register(self):
+        User.objects.create(email='user@example.com', passport_number='BH400')
+        data = {
+            'first_name': 'Michael',
+            'last_name': 'Spirit',
+            'email': 'USER@example.com',
+            'passport_number': 'BH400'
+        }
+
+        url = reverse('accounts:register')
+        response = self.client.post(url, data=data, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['email'],
+            ['A user is already registered with this e-mail address.'])
+
     def test_passport_number_not_unique_register(self):
         data = {
             'first_name': 'Michael',
@@ -85,14 +112,92 @@ class UserAuthTestCase(APITestCase):
                          ['A user is already registered with '
                           'this passport number address.'])
 
+    def test_uniqueness_checked_with_one_query(self):
+        data = {
+            'first_name': 'Michael',
+            'last_name': 'Spirit',
+            'email': 'user@example.com',
+            'passport_number': 'BH404'
+        }
+        serializer = RegisterSerializer(data=data)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+
+    def test_email_of_allauth_address_not_unique_register(self):
+        user = UserFactory()
+        EmailAddress.objects.create(user=user, email='USER@example.com')
+        data = {
+            'first_name': 'Michael',
+            'last_name': 'Spirit',
+            'email': 'user@example.com',
+            'passport_number': 'BH404'
+        }
+
+        url = reverse('accounts:register')
+        response = self.client.post(url, data=data, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.data)
+
+    def test_concurrent_register_rejected_by_constraint(self):
+        UserFactory(passport_number='BH400')
+        data = {
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'passport_number': 'BH400'
+        }
+
+        url = reverse('accounts:register')
+        # Other registration commits between validation and insert
+        with mock.patch.object(RegisterSerializer, 'validate',
+                               lambda self, attrs: attrs):
+            response = self.client.post(url, data=data, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['non_field_errors'],
+                         ['A user is already registered with '
+                          'this passport number address.'])
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_blank_passport_number_cleaned_to_null(self):
+        ManagerFactory(passport_number=None)
+        user = User(email='manager2@buddha.com', first_name='John',
+                    last_name='Doe', passport_number='')
+
+        user.full_clean(exclude=['password'])
+
+        self.assertIsNone(user.passport_number)
+
     def test_successful_login(self):
-        user = UserFactory(pin='PIN111', is_active=True)
+        UserFactory(pin='PIN111', is_active=True)
 
-        data = {'pin': user.pin}
+        data = {'pin': 'PIN111'}
         url = reverse('accounts:login')
         response = self.client.post(url, data=data, format='json')
 
         self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        self.assertIn('refresh', response.data)
+
+    def test_pin_stored_as_digest(self):
+        user = UserFactory(pin='PIN111')
+
+        self.assertNotEqual(user.pin, 'PIN111')
+        self.assertTrue(user.check_pin('PIN111'))
+        self.assertFalse(user.check_pin('PIN222'))
+        self.assertEqual(User.objects.get_by_pin('PIN111'), user)
+
+    def test_login_looks_up_pin_once(self):
+        UserFactory(pin='PIN111', is_active=True)
+
+        data = {'pin': 'PIN111'}
+        url = reverse('accounts:login')
+        with self.assertNumQueries(1):  # user by pin, tokens are signed
+            response = self.client.post(url, data=data, format='json')
+
+        self.assertEqual(response.status_code, 200)
 
     def test_fail_login_bad_pin(self):
         UserFactory(pin='PIN111', is_active=True)
@@ -120,6 +225,9 @@ class UserAuthTestCase(APITestCase):
         response = self.client.post(url, data=data, format='json')
 
         self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+
+        call_command('send_queued_mail', verbosity=0)
         self.assertEqual(len(mail.outbox), 2)
 
         self.assertIn(data['first_name'], mail.outbox[0].body)
@@ -153,5 +261,7 @@ class UserAuthTestCase(APITestCase):
         usr = User.objects.get(email='user@example.com')
         self.assertIsNotNone(usr.pin)
 
+        call_command('send_queued_mail', verbosity=0)
         self.assertEqual(len(mail.outbox), 2)
-        self.assertIn(usr.pin, mail.outbox[1].body)
+        pin = re.search(r'pin: (\d+)', mail.outbox[1].body).group(1)
+        self.assertTrue(usr.check_pin(pin))
@@ -0,0 +1,113 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from accounts import bulk
+from accounts.models import User
+from accounts.cache import TokenCache, token_cache
+from accounts.benchmarks import benchmark_token_authentication
+from accounts.authentication import CachedTokenAuthentication
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+class CachedTokenAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.manager = ManagerFactory(status=None)
+        self.token = Token.objects.create(user=self.manager)
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self, token=None):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.
+                                       format((token or self.token).key))
+        return self.authentication.authenticate(request)
+
+    def test_token_cached(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+
+        self.assertEqual(user, self.manager)
+        self.assertEqual(token, self.token)
+        self.assertEqual(token_cache.stats['misses'], 1)
+        self.assertEqual(token_cache.stats['local_hits'], 1)
+
+    def test_shared_cache_used_after_local_expired(self):
+        self.authenticate()
+
+        with mock.patch('accounts.cache.time.monotonic',
+                        return_value=10 ** 9), self.assertNumQueries(0):
+            self.authenticate()
+
+        self.assertEqual(token_cache.stats['hits'], 1)
+
+    def test_cached_user_not_changed_by_request(self):
+        user, token = self.authenticate()
+        user.status = User.STATUS_CHOICES.closing
+
+        user, token = self.authenticate()
+
+        self.assertIsNone(user.status)
+        self.assertIs(token.user, user)
+
+    def test_user_change_invalidates_token(self):
+        self.authenticate()
+
+        self.manager.refresh_from_db()
+        self.manager.is_active = False
+        self.manager.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_token_delete_invalidates_token(self):
+        self.authenticate()
+
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_bulk_close_invalidates_token(self):
+        client = UserFactory(status=User.STATUS_CHOICES.closing,
+                             is_active=True)
+        token = Token.objects.create(user=client)
+        self.authenticate(token)
+
+        bulk.close_clients([client.pk])
+
+        user, token = self.authenticate(token)
+        self.assertEqual(user.status, User.STATUS_CHOICES.closed)
+
+    def test_request_with_cached_token(self):
+        url = reverse('accounts:users-counts')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.get(url)
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(token_cache.stats['local_hits'], 1)
+
+    def test_least_recently_used_evicted(self):
+        local_cache = TokenCache(size=2, local_timeout=10, timeout=10)
+        for key in ('a', 'b', 'c'):
+            local_cache.set(key, (self.manager, self.token))
+
+        self.assertEqual(list(local_cache.local), ['b', 'c'])
+
+    def test_benchmark_rolls_back(self):
+        results = benchmark_token_authentication(requests=10)
+
+        self.assertEqual(results['TokenAuthentication'][1], 1)
+        self.assertEqual(results['CachedTokenAuthentication'][1], 0)
+        self.assertEqual(User.objects.count(), 1)
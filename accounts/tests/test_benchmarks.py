@@ -0,0 +1,55 @@
+from django.test import TransactionTestCase
+from django.core.cache import cache
+from django.core.management import CommandError
+
+from accounts.models import User
+from accounts.benchmarks import (
+    benchmark_endpoints, benchmark_registration, percentile)
+from accounts.management.commands.benchmark_endpoints import Command
+
+
+class EndpointBenchmarkTestCase(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_benchmark_endpoints(self):
+        results = benchmark_endpoints(users=20, requests=6, threads=2)
+
+        self.assertEqual(set(results), {
+            'register', 'login', 'users-list', 'users-detail',
+            'users-counts', 'users-activate'})
+        for name in ('login', 'users-list', 'users-detail', 'users-counts'):
+            self.assertEqual(results[name]['errors'], 0)
+            self.assertLessEqual(results[name]['p50'], results[name]['p99'])
+        self.assertEqual(results['login']['queries'], 1)
+        self.assertEqual(User.objects.filter(
+            email__startswith='load').count(),
+            6 - results['register']['errors'])
+
+    def test_benchmark_registration(self):
+        # In-memory test database fails concurrent writes
+        results = benchmark_registration(requests=4, threads=1)
+
+        self.assertEqual(results['errors'], 0)
+        self.assertEqual(User.objects.filter(
+            email__startswith='register').count(), 4)
+
+    def test_percentile(self):
+        latencies = list(range(1, 101))
+        self.assertEqual(percentile(latencies, 50), 50)
+        self.assertEqual(percentile(latencies, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_compare_with_baseline(self):
+        baseline = {'login': {'p95': 10, 'queries': 1}}
+        Command().compare(baseline, {'login': {'p95': 11.5, 'queries': 1},
+                                     'register': {'p95': 1, 'queries': 1}},
+                          max_regression=0.2)
+
+        with self.assertRaisesRegex(CommandError, 'login: queries 1 -> 2'):
+            Command().compare(baseline, {'login': {'p95': 10, 'queries': 2}},
+                              max_regression=0.2)
+        with self.assertRaisesRegex(CommandError, 'login: p95'):
+            Command().compare(baseline, {'login': {'p95': 13, 'queries': 1}},
+                              max_regression=0.2)
@@ -0,0 +1,234 @@
+import re
+import json
+
+from unittest import mock
+
+from django.core import mail
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.management import call_command
+
+from accounts import bulk
+from accounts.models import User
+from accounts.cache import get_manager_emails
+from accounts.counters import get_status_count, reconcile_status_counters
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+def client_rows(count, start=0):
+    return [{
+        'first_name': 'Client',
+        'last_name': f'Number{i}',
+        'email': f'client{i}@example.com',
+        'passport_number': f'BH{i}'
+    } for i in range(start, start + count)]
+
+
+class BulkRegisterTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = ManagerFactory()
+        self.client.force_authenticate(user=self.manager)
+        self.url = reverse('accounts:register-bulk')
+
+    def test_register_json_list(self):
+        response = self.client.post(self.url, data=client_rows(3),
+                                    format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'created': 3, 'errors': []})
+        self.assertEqual(User.objects.filter(
+            status=User.STATUS_CHOICES.creating, is_manager=False).count(), 3)
+        self.assertEqual(get_status_count(User.STATUS_CHOICES.creating), 3)
+
+        call_command('send_queued_mail', verbosity=0)
+        self.assertEqual(len(mail.outbox), 4)  # 3 clients and one digest
+        digest = [message for message in mail.outbox
+                  if self.manager.email in message.recipients()]
+        self.assertEqual(len(digest), 1)
+        self.assertIn('3 new clients', digest[0].body)
+
+    def test_register_ndjson(self):
+        rows = [json.dumps(row) for row in client_rows(2)]
+        data = '\n'.join(rows[:1] + ['not json'] + rows[1:]) + '\n'
+
+        response = self.client.post(self.url, data=data,
+                                    content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['index'] for error in response.data['errors']],
+                         [1])
+
+    def test_register_csv(self):
+        data = 'email,first_name,last_name,passport_number\n' + ''.join(
+            '{email},{first_name},{last_name},{passport_number}\n'.format(
+                **row) for row in client_rows(2))
+
+        response = self.client.post(self.url, data=data,
+                                    content_type='text/csv')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+
+    def test_duplicates_reported_per_row(self):
+        UserFactory(email='client0@example.com')
+        UserFactory(passport_number='BH1')
+        rows = client_rows(4)
+        rows[0]['email'] = 'CLIENT0@example.com'
+        rows[3]['email'] = rows[2]['email'].upper()
+        rows.append({'email': 'not an email'})
+
+        response = self.client.post(self.url, data=rows, format='json')
+
+        self.assertEqual(response.data['created'], 1)
+        errors = {error['index']: error['errors']
+                  for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [0, 1, 3, 4])
+        self.assertIn('email', errors[0])
+        self.assertIn('non_field_errors', errors[1])
+        self.assertIn('email', errors[3])
+        self.assertIn('first_name', errors[4])
+
+    def test_queries_do_not_grow_with_chunk(self):
+        reconcile_status_counters()  # all counter shards exist
+        get_manager_emails()
+
+        def queries_for(rows):
+            with CaptureQueriesContext(connection) as queries:
+                bulk.register_clients(rows, chunk_size=100)
+            return len(queries)
+
+        queries_for(client_rows(1, start=100))  # creates rollup of the day
+        self.assertEqual(queries_for(client_rows(5)),
+                         queries_for(client_rows(50, start=5)))
+
+    def test_client_cannot_register_bulk(self):
+        self.client.force_authenticate(user=UserFactory())
+
+        response = self.client.post(self.url, data=client_rows(1),
+                                    format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_object_instead_of_list_rejected(self):
+        response = self.client.post(self.url, data=client_rows(1)[0],
+                                    format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_json_scalar_rejected(self):
+        for data in ('123', 'null', '"abc"'):
+            response = self.client.post(self.url, data=data,
+                                        content_type='application/json')
+
+            self.assertEqual(response.status_code, 400, data)
+
+
+class BulkStatusChangeTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = ManagerFactory(status=None)
+        self.client.force_authenticate(user=self.manager)
+
+    def test_bulk_activate(self):
+        creating = UserFactory.create_batch(
+            3, status=User.STATUS_CHOICES.creating)
+        closing = UserFactory(status=User.STATUS_CHOICES.closing)
+        reconcile_status_counters()
+
+        ids = [usr.pk for usr in creating] + [closing.pk, 0]
+        url = reverse('accounts:users-bulk-activate')
+        response = self.client.patch(url, data={'ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            creating[0].pk: 'activated',
+            creating[1].pk: 'activated',
+            creating[2].pk: 'activated',
+            closing.pk: 'invalid_status',
+            0: 'not_found'})
+
+        activated = User.objects.filter(pk__in=ids[:3])
+        self.assertTrue(all(usr.is_active and usr.pin for usr in activated))
+        self.assertEqual(len({usr.pin for usr in activated}), 3)
+        self.assertEqual(get_status_count(User.STATUS_CHOICES.activated), 3)
+
+        call_command('send_queued_mail', verbosity=0)
+        self.assertEqual(len(mail.outbox), 3)
+        pin = re.search(r'pin: (\d+)', mail.outbox[0].body).group(1)
+        self.assertTrue(any(usr.check_pin(pin) for usr in activated))
+
+    def test_bulk_activate_queries_do_not_grow_with_ids(self):
+        reconcile_status_counters()
+        get_manager_emails()
+
+        def queries_for(count):
+            ids = [usr.pk for usr in UserFactory.create_batch(
+                count, status=User.STATUS_CHOICES.creating)]
+            with CaptureQueriesContext(connection) as queries:
+                bulk.activate_clients(ids)
+            return len(queries)
+
+        queries_for(1)  # creates status change rollup of the day
+        self.assertEqual(queries_for(2), queries_for(20))
+
+    def test_bulk_activate_within_query_params_limit(self):
+        ids = [usr.pk for usr in UserFactory.create_batch(
+            30, status=User.STATUS_CHOICES.creating)]
+
+        params = []
+        execute = CursorWrapper.execute
+
+        def record_params(cursor, sql, query_params=None):
+            # Bulk inserts are split by Django itself
+            if sql.startswith('UPDATE'):
+                params.append(len(query_params or ()))
+            return execute(cursor, sql, query_params)
+
+        with mock.patch.object(connection.features, 'max_query_params', 50,
+                               create=True), \
+                mock.patch.object(CursorWrapper, 'execute', record_params):
+            results = bulk.activate_clients(ids)
+
+        self.assertLessEqual(max(params), 50)
+        self.assertEqual(set(results.values()),
+                         {User.STATUS_CHOICES.activated})
+        self.assertEqual(len(results), 30)
+
+    def test_bulk_deactivate_confirm(self):
+        closing = UserFactory.create_batch(
+            2, status=User.STATUS_CHOICES.closing)
+        activated = UserFactory(status=User.STATUS_CHOICES.activated)
+        reconcile_status_counters()
+
+        ids = [usr.pk for usr in closing] + [activated.pk]
+        url = reverse('accounts:users-bulk-deactivate-confirm')
+        response = self.client.patch(url, data={'ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            closing[0].pk: 'closed',
+            closing[1].pk: 'closed',
+            activated.pk: 'invalid_status'})
+        self.assertEqual(User.objects.filter(
+            status=User.STATUS_CHOICES.closed).count(), 2)
+        self.assertEqual(get_status_count(User.STATUS_CHOICES.closed), 2)
+        self.assertEqual(get_status_count(User.STATUS_CHOICES.closing), 0)
+
+    def test_client_cannot_bulk_activate(self):
+        usr = UserFactory(status=User.STATUS_CHOICES.creating)
+        self.client.force_authenticate(user=usr)
+
+        url = reverse('accounts:users-bulk-activate')
+        response = self.client.patch(url, data={'ids': [usr.pk]},
+                                     format='json')
+
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from accounts.cache import get_manager_emails
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+
+class ManagerEmailsCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = ManagerFactory()
+
+    def test_manager_emails_cached(self):
+        UserFactory()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_manager_emails(), [self.manager.email])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_manager_emails(), [self.manager.email])
+
+    def test_cache_invalidated_when_manager_added_or_removed(self):
+        self.assertEqual(get_manager_emails(), [self.manager.email])
+
+        usr = UserFactory()
+        usr.is_manager = True
+        usr.save()
+        self.assertCountEqual(get_manager_emails(),
+                              [self.manager.email, usr.email])
+
+        usr.is_manager = False
+        usr.save()
+        self.assertEqual(get_manager_emails(), [self.manager.email])
+
+        self.manager.delete()
+        self.assertEqual(get_manager_emails(), [])
+
+    def test_cache_invalidated_when_manager_email_changed(self):
+        self.assertEqual(get_manager_emails(), [self.manager.email])
+
+        self.manager.email = 'new.manager@buddha.com'
+        self.manager.save()
+        self.assertEqual(get_manager_emails(), ['new.manager@buddha.com'])
+
+    def test_client_changes_keep_cache(self):
+        usr = UserFactory()
+        get_manager_emails()
+
+        usr.email = 'new.client@example.com'
+        usr.first_name = 'John'
+        usr.save()
+        UserFactory().delete()
+
+        with self.assertNumQueries(0):
+            get_manager_emails()
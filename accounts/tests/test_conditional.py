@@ -0,0 +1,100 @@
+import time
+
+from django.db import connection
+from django.utils.http import http_date
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+
+from accounts.models import User
+from accounts.ledger import post_entry
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITransactionTestCase
+from rest_framework.reverse import reverse
+
+
+class ConditionalGetTestCase(APITransactionTestCase):
+    """
+    Versions are changed after commit, so tests run outside transaction.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=ManagerFactory())
+        self.creating = UserFactory(status=User.STATUS_CHOICES.creating)
+        self.closing = UserFactory(status=User.STATUS_CHOICES.closing)
+        self.list_url = reverse('accounts:users-list')
+
+    def detail_url(self, usr):
+        return reverse('accounts:users-detail', kwargs={'pk': usr.pk})
+
+    def test_unchanged_list_is_not_modified(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(
+                self.list_url, HTTP_IF_NONE_MATCH=response['ETag'])
+            cached = self.client.get(self.list_url)
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.data, response.data)
+
+    def test_change_in_the_same_second_is_modified(self):
+        response = self.client.get(self.detail_url(self.closing))
+        self.assertNotIn('Last-Modified', response)
+
+        self.closing.first_name = 'Changed'
+        self.closing.save()
+
+        response = self.client.get(
+            self.detail_url(self.closing),
+            HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], 'Changed')
+
+    def test_status_change_changes_versions(self):
+        list_response = self.client.get(self.list_url)
+        creating = self.client.get(self.detail_url(self.creating))
+        closing = self.client.get(self.detail_url(self.closing))
+
+        url = reverse('accounts:users-activate',
+                      kwargs={'pk': self.creating.pk})
+        self.assertEqual(self.client.patch(url).status_code, 200)
+
+        response = self.client.get(
+            self.list_url, HTTP_IF_NONE_MATCH=list_response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], list_response['ETag'])
+
+        response = self.client.get(self.detail_url(self.creating),
+                                   HTTP_IF_NONE_MATCH=creating['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['is_active'], True)
+
+        response = self.client.get(self.detail_url(self.closing),
+                                   HTTP_IF_NONE_MATCH=closing['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_balance_change_changes_version(self):
+        response = self.client.get(self.detail_url(self.closing))
+
+        post_entry(self.closing.pk, 100)
+
+        response = self.client.get(self.detail_url(self.closing),
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['balance'], self.closing.balance + 100)
+
+    def test_saved_user_changes_version(self):
+        response = self.client.get(self.detail_url(self.closing))
+
+        self.closing.first_name = 'Changed'
+        self.closing.save()
+
+        response = self.client.get(self.detail_url(self.closing),
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.data['first_name'], 'Changed')
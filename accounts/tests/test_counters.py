@@ -0,0 +1,78 @@
+from django.core.management import call_command
+
+from accounts.models import User, StatusCounter
+from accounts.counters import (
+    count_status_change, get_status_count, get_status_counts)
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+class StatusCounterTestCase(APITestCase):
+
+    def setUp(self):
+        self.manager = ManagerFactory(status=None)
+
+    def register(self, email='user@example.com', passport_number='BH404'):
+        data = {
+            'first_name': 'Michael',
+            'last_name': 'Spirit',
+            'email': email,
+            'passport_number': passport_number
+        }
+        url = reverse('accounts:register')
+        response = self.client.post(url, data=data, format='json')
+        self.assertEqual(response.status_code, 201)
+        return User.objects.get(email=email)
+
+    def test_counters_follow_client_lifecycle(self):
+        usr = self.register()
+        self.register('user2@example.com', 'BH405')
+        self.assertEqual(get_status_count(User.STATUS_CHOICES.creating), 2)
+
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('accounts:users-activate', kwargs={'pk': usr.pk})
+        self.client.patch(url)
+
+        usr.refresh_from_db()
+        self.client.force_authenticate(user=usr)
+        self.client.patch(reverse('accounts:users-deactivate'))
+        self.assertEqual(get_status_counts(), {
+            'creating': 1, 'activated': 0, 'closing': 1, 'closed': 0})
+
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('accounts:users-deactivate-confirm',
+                      kwargs={'pk': usr.pk})
+        self.client.patch(url)
+        self.assertEqual(get_status_counts(), {
+            'creating': 1, 'activated': 0, 'closing': 0, 'closed': 1})
+
+    def test_counts_spread_between_shards(self):
+        for _ in range(50):
+            count_status_change(None, User.STATUS_CHOICES.creating)
+
+        self.assertGreater(StatusCounter.objects.filter(
+            status=User.STATUS_CHOICES.creating).count(), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_status_count(User.STATUS_CHOICES.creating), 50)
+
+    def test_reconcile_fixes_counters(self):
+        UserFactory.create_batch(2, status=User.STATUS_CHOICES.activated)
+        UserFactory(status=User.STATUS_CHOICES.closed)
+        count_status_change(None, User.STATUS_CHOICES.creating)
+
+        call_command('reconcile_status_counters', verbosity=0)
+
+        self.assertEqual(get_status_counts(), {
+            'creating': 0, 'activated': 2, 'closing': 0, 'closed': 1})
+
+    def test_manager_get_counts(self):
+        self.register()
+        self.client.force_authenticate(user=self.manager)
+
+        response = self.client.get(reverse('accounts:users-counts'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[User.STATUS_CHOICES.creating], 1)
@@ -0,0 +1,89 @@
+import csv
+import json
+from io import StringIO
+from unittest import mock
+from datetime import timedelta
+
+from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import User
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+def read(response):
+    return b''.join(response.streaming_content).decode('utf-8')
+
+
+class ExportTestCase(APITestCase):
+
+    def setUp(self):
+        self.url = reverse('accounts:users-export')
+        self.manager = ManagerFactory(status=None)
+        self.client.force_authenticate(user=self.manager)
+        self.clients = UserFactory.create_batch(
+            5, status=User.STATUS_CHOICES.activated)
+
+    def test_export_ndjson(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in read(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows],
+                         [client.pk for client in self.clients])
+        self.assertEqual(rows[0]['email'], self.clients[0].email)
+        self.assertEqual(rows[0]['status'], User.STATUS_CHOICES.activated)
+
+    def test_export_csv(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('clients.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(read(response))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['email'], self.clients[0].email)
+        self.assertEqual(rows[0]['passport_number'],
+                         self.clients[0].passport_number)
+
+    def test_export_filters(self):
+        closed = UserFactory(status=User.STATUS_CHOICES.closed)
+        User.objects.filter(pk=self.clients[0].pk).update(
+            status_changed=timezone.now() - timedelta(days=10))
+
+        response = self.client.get(self.url, {'status': 'closed'})
+        self.assertEqual([json.loads(line)['id']
+                          for line in read(response).splitlines()],
+                         [closed.pk])
+
+        since = (timezone.now() - timedelta(days=5)).isoformat()
+        response = self.client.get(self.url, {'changed_since': since})
+        ids = [json.loads(line)['id'] for line in read(response).splitlines()]
+        self.assertNotIn(self.clients[0].pk, ids)
+        self.assertIn(self.clients[1].pk, ids)
+
+    def test_invalid_changed_since(self):
+        response = self.client.get(self.url, {'changed_since': 'yesterday'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_reads_by_chunks(self):
+        with mock.patch('accounts.views.EXPORT_CHUNK_SIZE', 2), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+            lines = read(response).splitlines()
+
+        self.assertEqual(len(lines), 5)
+        # three chunks and one empty query ending the export
+        self.assertEqual(len(queries), 4)
+
+    def test_client_cannot_export(self):
+        self.client.force_authenticate(user=self.clients[0])
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,132 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+
+from accounts import bulk
+from accounts.models import User, StatusChange, StatusChangeRollup
+from accounts.transitions import change_status
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+class StatusHistoryTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = ManagerFactory(status=None)
+        self.client.force_authenticate(user=self.manager)
+
+    def register(self, email='user@example.com', passport_number='BH404'):
+        data = {
+            'first_name': 'Michael',
+            'last_name': 'Spirit',
+            'email': email,
+            'passport_number': passport_number
+        }
+        url = reverse('accounts:register')
+        response = self.client.post(url, data=data, format='json')
+        self.assertEqual(response.status_code, 201)
+        return User.objects.get(email=email)
+
+    def test_every_transition_is_recorded(self):
+        usr = self.register()
+        url = reverse('accounts:users-activate', kwargs={'pk': usr.pk})
+        self.client.patch(url)
+        bulk.close_clients([usr.pk])  # not closing yet, nothing recorded
+        usr = User.objects.get(pk=usr.pk)
+        change_status(usr, User.STATUS_CHOICES.closing)
+        bulk.close_clients([usr.pk])
+
+        history = list(StatusChange.objects.filter(user=usr).
+                       order_by('id').values_list('old_status', 'status'))
+        self.assertEqual(history, [
+            ('', User.STATUS_CHOICES.creating),
+            (User.STATUS_CHOICES.creating, User.STATUS_CHOICES.activated),
+            (User.STATUS_CHOICES.activated, User.STATUS_CHOICES.closing),
+            (User.STATUS_CHOICES.closing, User.STATUS_CHOICES.closed),
+        ])
+        self.assertEqual(StatusChangeRollup.objects.get(
+            old_status=User.STATUS_CHOICES.closing).count, 1)
+
+    def test_duration_of_old_status(self):
+        usr = UserFactory(status=User.STATUS_CHOICES.creating)
+        User.objects.filter(pk=usr.pk).update(
+            status_changed=timezone.now() - timedelta(hours=2))
+        usr = User.objects.get(pk=usr.pk)
+
+        change_status(usr, User.STATUS_CHOICES.activated)
+
+        change = StatusChange.objects.get(user=usr)
+        self.assertAlmostEqual(change.duration, 7200, delta=5)
+        rollup = StatusChangeRollup.objects.get(
+            old_status=User.STATUS_CHOICES.creating)
+        self.assertEqual(rollup.total_duration, change.duration)
+
+    def test_bulk_activation_updates_one_rollup(self):
+        users = [UserFactory(status=User.STATUS_CHOICES.creating)
+                 for _ in range(5)]
+
+        bulk.activate_clients([usr.pk for usr in users])
+
+        self.assertEqual(StatusChange.objects.count(), 5)
+        rollup = StatusChangeRollup.objects.get()
+        self.assertEqual(rollup.count, 5)
+        self.assertEqual(rollup.day, timezone.localdate())
+
+    def test_status_report(self):
+        for i in range(3):
+            self.register(f'user{i}@example.com', f'BH{i}')
+        usr = User.objects.get(email='user0@example.com')
+        self.client.patch(reverse('accounts:users-activate',
+                                  kwargs={'pk': usr.pk}))
+
+        url = reverse('accounts:users-status-report')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['funnel'][
+            User.STATUS_CHOICES.creating], 3)
+        self.assertEqual(response.data['funnel'][
+            User.STATUS_CHOICES.activated], 1)
+        self.assertEqual(response.data['transitions'], [{
+            'from': User.STATUS_CHOICES.creating,
+            'to': User.STATUS_CHOICES.activated,
+            'count': 1,
+            'average_duration': 0.0
+        }])
+
+    def test_status_report_range(self):
+        self.register()
+        url = reverse('accounts:users-status-report')
+        tomorrow = timezone.localdate() + timedelta(days=1)
+
+        response = self.client.get(url, {'since': tomorrow.isoformat()})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(url, {'since': tomorrow.isoformat(),
+                                         'until': tomorrow.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['funnel'][
+            User.STATUS_CHOICES.creating], 0)
+
+    def test_status_report_for_manager_only(self):
+        self.client.force_authenticate(user=UserFactory())
+        url = reverse('accounts:users-status-report')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_rebuild_rollups(self):
+        self.register()
+        self.register('user2@example.com', 'BH405')
+        StatusChangeRollup.objects.update(count=0)
+
+        call_command('rebuild_status_rollups', verbosity=0)
+
+        self.assertEqual(StatusChangeRollup.objects.get().count, 2)
@@ -0,0 +1,148 @@
+from unittest import mock
+
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from accounts import ledger
+from accounts.models import User, BalanceTransaction
+from accounts.benchmarks import stress_ledger
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+def balance(user):
+    return User.objects.values_list('balance', flat=True).get(pk=user.pk)
+
+
+class LedgerTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory(balance=100)
+
+    def test_post_entry(self):
+        entry, created = ledger.post_entry(self.user.pk, -30,
+                                           description='fee')
+
+        self.assertTrue(created)
+        self.assertEqual(entry.amount, -30)
+        self.assertEqual(balance(self.user), 70)
+
+    def test_idempotency_key(self):
+        first, created = ledger.post_entry(self.user.pk, 10, 'payment-1')
+        second, created = ledger.post_entry(self.user.pk, 10, 'payment-1')
+
+        self.assertFalse(created)
+        self.assertEqual(first, second)
+        self.assertEqual(balance(self.user), 110)
+
+    def test_min_balance(self):
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.post_entry(self.user.pk, -101, min_balance=0)
+
+        ledger.post_entry(self.user.pk, -100, min_balance=0)
+        self.assertEqual(balance(self.user), 0)
+        self.assertEqual(BalanceTransaction.objects.count(), 1)
+
+    def test_save_does_not_overwrite_balance(self):
+        user = User.objects.get(pk=self.user.pk)
+        ledger.post_entry(self.user.pk, 50)
+
+        user.first_name = 'John'
+        user.save()
+
+        self.assertEqual(balance(self.user), 150)
+
+    def test_post_entries(self):
+        other = UserFactory(balance=0)
+        ledger.post_entry(other.pk, 5, 'payment-1')
+
+        report = ledger.post_entries([
+            {'user_id': self.user.pk, 'amount': 10},
+            {'user_id': self.user.pk, 'amount': -3, 'idempotency_key': 'a'},
+            {'user_id': self.user.pk, 'amount': -3, 'idempotency_key': 'a'},
+            {'user_id': other.pk, 'amount': 5, 'idempotency_key': 'payment-1'},
+            {'user_id': other.pk, 'amount': 7},
+            {'user_id': 0, 'amount': 7},
+        ], chunk_size=4)
+
+        self.assertEqual(report['posted'], 3)
+        self.assertEqual(report['skipped'], 2)
+        self.assertEqual([error['index'] for error in report['errors']], [5])
+        self.assertEqual(balance(self.user), 107)
+        self.assertEqual(balance(other), 12)
+
+    def test_post_entries_queries_do_not_grow(self):
+        users = UserFactory.create_batch(20)
+
+        def queries_for(count):
+            entries = [{'user_id': users[i % 20].pk, 'amount': 1}
+                       for i in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                ledger.post_entries(entries)
+            return len(queries)
+
+        self.assertEqual(queries_for(5), queries_for(150))
+
+    def test_post_entries_within_query_params_limit(self):
+        users = UserFactory.create_batch(25, balance=0)
+
+        params = []
+        execute = CursorWrapper.execute
+
+        def record_params(cursor, sql, query_params=None):
+            if sql.startswith('UPDATE "accounts_user"'):
+                params.append(len(query_params or ()))
+            return execute(cursor, sql, query_params)
+
+        with mock.patch.object(connection.features, 'max_query_params', 30,
+                               create=True), \
+                mock.patch.object(CursorWrapper, 'execute', record_params):
+            ledger.post_entries([{'user_id': usr.pk, 'amount': 1}
+                                 for usr in users])
+
+        self.assertEqual(len(params), 3)
+        self.assertLessEqual(max(params), 30)
+        self.assertTrue(all(balance(usr) == 1 for usr in users))
+
+    def test_ledger_api(self):
+        self.client.force_authenticate(user=ManagerFactory(status=None))
+        url = reverse('accounts:users-ledger')
+
+        data = [{'user_id': self.user.pk, 'amount': 5,
+                 'idempotency_key': 'payment-1'}]
+        response = self.client.post(url, data=data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['posted'], 1)
+
+        response = self.client.post(url, data=data, format='json')
+        self.assertEqual(response.data['skipped'], 1)
+        self.assertEqual(balance(self.user), 105)
+
+        response = self.client.post(url, data=[{'user_id': self.user.pk,
+                                                'amount': 0}], format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, data=data[0], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_client_cannot_post_ledger(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(reverse('accounts:users-ledger'),
+                                    data=[], format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+
+class LedgerConcurrencyTestCase(TransactionTestCase):
+
+    def test_no_lost_updates(self):
+        result = stress_ledger(threads=4, postings=25)
+
+        self.assertEqual(result['balance'], result['expected'])
+        self.assertEqual(result['ledger'], result['expected'])
@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.core import mail
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.core.mail.backends.locmem import EmailBackend
+
+from accounts import mail as mail_queue
+from accounts.models import QueuedMail
+from accounts.mail import queue_mail, send_queued_mail
+
+
+class CountingBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('Mail server is down')
+
+
+class QueuedMailTestCase(TestCase):
+
+    def queue(self, recipient='user@example.com'):
+        return queue_mail(
+            subject='Subject',
+            template_path='email/client_registered_mail.txt',
+            context={'first_name': 'Michael', 'last_name': 'Spirit'},
+            recipient_list=[recipient])
+
+    def test_mail_is_not_sent_until_queue_processed(self):
+        self.queue()
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(send_queued_mail(), (1, 1))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Michael', mail.outbox[0].body)
+
+        queued = QueuedMail.objects.get()
+        self.assertEqual(queued.status, QueuedMail.STATUS_CHOICES.sent)
+        self.assertEqual(queued.message, '')
+        self.assertEqual(send_queued_mail(), (0, 0))
+
+    def test_empty_recipient_list_is_not_queued(self):
+        self.assertIsNone(queue_mail('Subject', 'email/client_registered_'
+                                     'mail.txt', {}, []))
+        self.assertFalse(QueuedMail.objects.exists())
+
+    def test_rolled_back_transaction_drops_mail(self):
+        try:
+            with transaction.atomic():
+                self.queue()
+                raise ValueError
+        except ValueError:
+            pass
+
+        self.assertFalse(QueuedMail.objects.exists())
+
+    @override_settings(
+        EMAIL_BACKEND='accounts.tests.test_mail.CountingBackend')
+    def test_batch_sent_over_one_connection(self):
+        for i in range(5):
+            self.queue(f'user{i}@example.com')
+
+        CountingBackend.opened = 0
+        self.assertEqual(send_queued_mail(batch_size=3), (3, 3))
+        self.assertEqual(send_queued_mail(batch_size=3), (2, 2))
+
+        self.assertEqual(CountingBackend.opened, 2)
+        self.assertEqual(len(mail.outbox), 5)
+
+    @override_settings(
+        EMAIL_BACKEND='accounts.tests.test_mail.FailingBackend')
+    def test_failed_mail_retried_with_backoff(self):
+        queued = self.queue()
+
+        with self.assertLogs('accounts.mail', 'WARNING'):
+            self.assertEqual(send_queued_mail(), (1, 0))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, QueuedMail.STATUS_CHOICES.pending)
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('Mail server is down', queued.last_error)
+        self.assertIn('Michael', queued.message)
+        self.assertGreater(queued.next_attempt, timezone.now())
+
+        # Not due yet
+        self.assertEqual(send_queued_mail(), (0, 0))
+
+        for attempt in range(2, mail_queue.MAX_ATTEMPTS + 1):
+            QueuedMail.objects.update(
+                next_attempt=timezone.now() - timedelta(seconds=1))
+            with self.assertLogs('accounts.mail', 'WARNING'):
+                send_queued_mail()
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.attempts, mail_queue.MAX_ATTEMPTS)
+        self.assertEqual(queued.status, QueuedMail.STATUS_CHOICES.failed)
+        self.assertEqual(queued.message, '')
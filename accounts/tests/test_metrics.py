@@ -0,0 +1,143 @@
+import os
+import json
+from unittest import mock
+from threading import Thread
+from tempfile import TemporaryDirectory
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.management import call_command
+
+from accounts import metrics, views
+from accounts.mail import queue_mail
+from accounts.models import User
+from accounts.counters import reconcile_status_counters
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+class MetricsTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        self.manager = ManagerFactory(status=None)
+        # Repeated requests are measured, not served from response cache
+        for name, value in (('METRICS_TOKEN', 'secret'),
+                            ('USERS_RESPONSE_TIMEOUT', 0)):
+            patcher = mock.patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_metrics(self):
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_request_metrics_by_view_and_action(self):
+        UserFactory.create_batch(2)
+        self.client.force_authenticate(user=self.manager)
+        self.client.get(reverse('accounts:users-list'))
+        self.client.get(reverse('accounts:users-list'))
+        self.client.post(reverse('accounts:login'), {'pin': '000000'})
+
+        text = self.get_metrics()
+        labels = 'view="UserAPI",action="list"'
+        self.assertIn(
+            f'buddha_http_requests_total{{{labels},status="200"}} 2', text)
+        self.assertIn(
+            f'buddha_http_request_duration_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'buddha_http_request_duration_seconds_bucket'
+                      f'{{{labels},le="+Inf"}} 2', text)
+        self.assertIn(f'buddha_db_queries_total{{{labels}}} 2', text)
+        self.assertIn('buddha_http_requests_total{view="LoginView",'
+                      'action="post",status=', text)
+        self.assertIn('# TYPE buddha_http_request_duration_seconds '
+                      'histogram', text)
+
+    def test_client_gauges_are_cached(self):
+        UserFactory(status=User.STATUS_CHOICES.closed)
+        reconcile_status_counters()
+        self.assertIn('buddha_clients{status="closed"} 1', self.get_metrics())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.get_metrics()
+        self.assertEqual(len(queries), 0)
+
+    def test_mail_metrics(self):
+        queue_mail('Subject', 'email/client_registered_mail.txt', {},
+                   ['client@example.com'])
+        call_command('send_queued_mail', verbosity=0)
+
+        text = self.get_metrics()
+        self.assertIn('buddha_mails_total{result="sent"} 1', text)
+        self.assertIn('buddha_mail_send_duration_seconds_count 1', text)
+
+    def test_threads_are_merged(self):
+        def work():
+            for i in range(1000):
+                metrics.registry.inc('buddha_mails_total',
+                                     (('result', 'sent'), ))
+
+        threads = [Thread(target=work) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(metrics.registry.collect()[
+            'buddha_mails_total', (('result', 'sent'), )], 4000)
+
+    def test_shards_of_exited_threads_are_retired(self):
+        def work():
+            metrics.registry.inc('buddha_mails_total', (('result', 'sent'), ))
+
+        shards = len(metrics.registry._shards)
+        for i in range(100):
+            thread = Thread(target=work)
+            thread.start()
+            thread.join()
+
+        self.assertLessEqual(len(metrics.registry._shards), shards + 1)
+        self.assertEqual(metrics.registry.collect()[
+            'buddha_mails_total', (('result', 'sent'), )], 100)
+
+    def test_processes_are_merged(self):
+        metrics.registry.inc('buddha_mails_total', (('result', 'sent'), ))
+        with TemporaryDirectory() as directory, \
+                mock.patch.object(metrics, 'METRICS_DIR', directory):
+            with open(os.path.join(directory, '1.json'), 'w') as dump:
+                json.dump([['buddha_mails_total', [['result', 'sent']], 2]],
+                          dump)
+
+            samples = metrics.collect()
+            self.assertTrue(os.path.exists(
+                os.path.join(directory, f'{os.getpid()}.json')))
+
+        self.assertEqual(
+            samples['buddha_mails_total', (('result', 'sent'), )], 3)
+
+    def test_metrics_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    @mock.patch.object(views, 'METRICS_TOKEN', None)
+    def test_metrics_require_staff_without_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        self.client.force_login(self.manager)
+        self.assertEqual(self.client.get(url).status_code, 401)
+        admin = UserFactory(is_staff=True, is_active=True)
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    @mock.patch.object(views, 'METRICS_PUBLIC', True)
+    def test_public_metrics(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
@@ -0,0 +1,120 @@
+import json
+from unittest import mock
+
+from django.db import connection
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from accounts import counters, views
+from accounts.models import User
+from accounts.views import UserAPI
+from accounts.tokens import issue_tokens
+from accounts.middleware import (
+    QueryBudgetExceeded, QueryInstrumentationMiddleware, fingerprint)
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryInstrumentationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        # Repeated requests are measured, not served from response cache
+        patcher = mock.patch.object(views, 'USERS_RESPONSE_TIMEOUT', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manager = ManagerFactory()
+        self.client.force_authenticate(user=self.manager)
+
+    def test_server_timing_header(self):
+        UserFactory.create_batch(3)
+
+        response = self.client.get(reverse('accounts:users-list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'],
+                         r'^db;dur=[\d.]+;desc="1 queries", total;dur=')
+
+    # Every status counter row is new, like with empty caches, counters,
+    # rollups and pin pool after deploy
+    @mock.patch.object(counters, 'SHARDS', 10 ** 9)
+    def test_status_changes_within_budget(self):
+        data = {
+            'first_name': 'Michael',
+            'last_name': 'Spirit',
+            'email': 'user@example.com',
+            'passport_number': 'BH404'
+        }
+        response = self.client.post(reverse('accounts:register'), data)
+        self.assertEqual(response.status_code, 201)
+
+        usr = User.objects.get(email='user@example.com')
+        url = reverse('accounts:users-activate', kwargs={'pk': usr.pk})
+        cache.clear()
+        self.assertEqual(self.client.patch(url).status_code, 200)
+
+        tokens = issue_tokens(usr)
+        self.client.force_authenticate(user=None)
+        cache.clear()
+        response = self.client.patch(
+            reverse('accounts:users-deactivate'),
+            HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('accounts:users-deactivate-confirm',
+                      kwargs={'pk': usr.pk})
+        cache.clear()
+        self.assertEqual(self.client.patch(url).status_code, 200)
+
+    def test_over_budget_fails(self):
+        budget = dict(UserAPI.query_budget, list=0)
+        with mock.patch.object(UserAPI, 'query_budget', budget), \
+                self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('accounts:users-list'))
+
+    def test_repeated_queries_are_logged(self):
+        users = UserFactory.create_batch(5)
+
+        def get_response(request):
+            for usr in users:  # N+1
+                User.objects.get(pk=usr.pk)
+            return HttpResponse()
+
+        middleware = QueryInstrumentationMiddleware(get_response)
+        with self.assertLogs('accounts.middleware') as logs:
+            response = middleware(RequestFactory().get('/users/'))
+
+        self.assertIn('desc="5 queries"', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['queries'], 5)
+        self.assertEqual(list(record['repeated'].values()), [5])
+        self.assertIsNone(record['budget'])
+
+    @override_settings(QUERY_BUDGET_STRICT=False,
+                       QUERY_INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_not_sampled_request(self):
+        response = self.client.get(reverse('accounts:users-list'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(QUERY_BUDGET_STRICT=False,
+                       QUERY_INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_query_log_is_left_as_it_was(self):
+        url = reverse('accounts:users-list')
+        self.client.get(url)
+        self.assertEqual(len(connection.queries_log), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertEqual(len(queries), 1)
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x''y' AND b IN (1, 22)"),
+            'SELECT * FROM t WHERE a = ? AND b IN (?)')
@@ -0,0 +1,118 @@
+from unittest import mock
+from datetime import timedelta
+
+from django.db import DatabaseError
+from django.utils import timezone
+from django.core.cache import cache
+from django.core.management import call_command
+
+from accounts import metrics, pins
+from accounts.models import User, UnusedPin, make_pin_digest
+from accounts.pins import (
+    claim_pins, generate_pin, generate_pins, refill_pin_pool)
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework.reverse import reverse
+
+
+class PinPoolTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generate_pin(self):
+        pin = generate_pin()
+        self.assertEqual(len(pin), pins.PIN_LENGTH)
+        self.assertTrue(pin.isdigit())
+
+    def test_generated_pins_are_not_used(self):
+        UserFactory(pin='000000000000001')
+        UnusedPin.objects.create(pin='000000000000002')
+
+        with mock.patch.object(pins, 'generate_pin', side_effect=[
+                '000000000000001', '000000000000002', '000000000000003']):
+            self.assertEqual(generate_pins(1), ['000000000000003'])
+
+    def test_refill(self):
+        self.assertEqual(refill_pin_pool(50), 50)
+        self.assertEqual(refill_pin_pool(50), 0)
+        self.assertEqual(refill_pin_pool(60), 10)
+        self.assertEqual(
+            UnusedPin.objects.values('pin').distinct().count(), 60)
+
+    def test_claim_takes_pins_once(self):
+        refill_pin_pool(5)
+        pool = set(UnusedPin.objects.values_list('pin', flat=True))
+
+        claimed = claim_pins(3)
+        self.assertEqual(len(set(claimed)), 3)
+        self.assertLess(set(claimed), pool)
+        self.assertEqual(UnusedPin.objects.count(), 2)
+
+        # Short pool is completed with generated pins
+        metrics.registry.clear()
+        more = claim_pins(4)
+        self.assertEqual(len(set(more + claimed)), 7)
+        self.assertFalse(UnusedPin.objects.exists())
+        self.assertEqual(metrics.registry.collect()[
+            'buddha_pin_pool_misses_total', ()], 2)
+
+    def test_expired_pins_are_replaced(self):
+        refill_pin_pool(3)
+        expired = set(UnusedPin.objects.values_list('pin', flat=True)[:2])
+        UnusedPin.objects.filter(pin__in=expired).update(
+            created=timezone.now() - timedelta(
+                seconds=pins.PIN_POOL_MAX_AGE + 1))
+
+        self.assertEqual(len(set(claim_pins(2)) & expired), 0)
+        self.assertEqual(refill_pin_pool(3), 3)
+        self.assertFalse(UnusedPin.objects.filter(pin__in=expired).exists())
+
+    def test_activation_claims_pin(self):
+        refill_pin_pool(1)
+        pin = UnusedPin.objects.get().pin
+        usr = UserFactory(status=User.STATUS_CHOICES.creating)
+        self.client.force_authenticate(user=ManagerFactory())
+
+        url = reverse('accounts:users-activate', kwargs={'pk': usr.pk})
+        self.assertEqual(self.client.patch(url).status_code, 200)
+
+        usr.refresh_from_db()
+        self.assertTrue(usr.check_pin(pin))
+        self.assertFalse(UnusedPin.objects.exists())
+
+    def test_activation_retries_pin_saved_concurrently(self):
+        other = UserFactory(status=User.STATUS_CHOICES.activated)
+        User.objects.filter(pk=other.pk).update(
+            pin=make_pin_digest('000000000000001'))
+        usr = UserFactory(status=User.STATUS_CHOICES.creating)
+        self.client.force_authenticate(user=ManagerFactory())
+
+        url = reverse('accounts:users-activate', kwargs={'pk': usr.pk})
+        with mock.patch('accounts.views.claim_pin', side_effect=[
+                '000000000000001', '000000000000002']):
+            self.assertEqual(self.client.patch(url).status_code, 200)
+
+        usr.refresh_from_db()
+        self.assertTrue(usr.check_pin('000000000000002'))
+
+    def test_refill_command(self):
+        call_command('refill_pin_pool', size=5, verbosity=0)
+        self.assertEqual(UnusedPin.objects.count(), 5)
+
+
+class PinClaimTransactionTestCase(APITransactionTestCase):
+    """
+    Claim runs outside of test transaction, as in autocommit mode.
+    """
+
+    def test_failed_claim_leaves_pins_in_pool(self):
+        refill_pin_pool(2)
+
+        with mock.patch('django.db.models.query.QuerySet.delete',
+                        side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                claim_pins(2)
+
+        self.assertEqual(UnusedPin.objects.filter(claim=None).count(), 2)
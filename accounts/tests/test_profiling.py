@@ -0,0 +1,110 @@
+import os
+import json
+import tracemalloc
+from threading import Event, Thread
+from tempfile import TemporaryDirectory
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.utils.six import StringIO
+
+from accounts.profiling import ProfilingMiddleware, make_profiling_token
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+class ProfilingTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=ManagerFactory())
+        UserFactory.create_batch(3)
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        profiling_dir = override_settings(PROFILING_DIR=self.directory)
+        profiling_dir.enable()
+        self.addCleanup(profiling_dir.disable)
+        self.url = reverse('accounts:users-list')
+
+    def read_profile(self, response):
+        name = response['X-Profile-Id']
+        self.assertTrue(os.path.exists(
+            os.path.join(self.directory, name + '.prof')))
+        with open(os.path.join(self.directory, name + '.json')) as dump:
+            return json.load(dump)
+
+    def test_profile_with_header(self):
+        response = self.client.get(
+            self.url, HTTP_X_PROFILE=make_profiling_token())
+
+        self.assertEqual(response.status_code, 200)
+        profile = self.read_profile(response)
+        self.assertEqual(profile['path'], self.url)
+        self.assertTrue(any('views.py' in row['function'] and
+                            '(list)' in row['function']
+                            for row in profile['functions']))
+        self.assertTrue(profile['allocations'])
+
+    def test_profile_with_query_param(self):
+        response = self.client.get(
+            self.url, {'profile': make_profiling_token()})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.read_profile(response)['status'], 200)
+
+    def test_invalid_token_is_ignored(self):
+        response = self.client.get(self.url, HTTP_X_PROFILE='profile')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request(self):
+        response = self.client.get(self.url)
+        self.assertIn('X-Profile-Id', response)
+
+    def test_overlapping_requests(self):
+        # First request finishes while second one is still profiled
+        first_started, second_started = Event(), Event()
+        first_finished = Event()
+
+        def get_response(request):
+            if request.path == '/first':
+                first_started.set()
+                second_started.wait(5)
+            else:
+                second_started.set()
+                first_finished.wait(5)
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(get_response)
+        factory = RequestFactory(HTTP_X_PROFILE=make_profiling_token())
+        responses = {}
+
+        def first():
+            responses['first'] = middleware(factory.get('/first'))
+            first_finished.set()
+
+        thread = Thread(target=first)
+        thread.start()
+        first_started.wait(5)
+        responses['second'] = middleware(factory.get('/second'))
+        thread.join()
+
+        self.assertIn('X-Profile-Id', responses['first'])
+        self.assertIn('X-Profile-Id', responses['second'])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_token_command(self):
+        output = StringIO()
+        call_command('profiling_token', stdout=output)
+
+        response = self.client.get(
+            self.url, HTTP_X_PROFILE=output.getvalue().strip())
+        self.assertIn('X-Profile-Id', response)
@@ -0,0 +1,123 @@
+import re
+
+from django.db import connection
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+
+from accounts.models import User
+from accounts.pagination import KeysetPagination
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+TABLE = User._meta.db_table
+
+
+class QueryPlanTestCase(APITestCase):
+    """
+    Checks that hot queries on users table are served by index. Plans are
+    taken with SQLite ``EXPLAIN QUERY PLAN`` from queries code really runs.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = ManagerFactory()
+        for status, _ in User.STATUS_CHOICES:
+            UserFactory.create_batch(3, status=status)
+
+    def setUp(self):
+        cache.clear()  # requests must not be served from response cache
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertPlanUsesIndex(self, sql, params=(), constraint=None):
+        plan = self.explain(sql, params)
+        steps = [step for step in plan if TABLE in step]
+        self.assertTrue(steps, plan)
+        for step in steps:
+            # "SCAN users" and "SCAN users USING INDEX" both read every row
+            self.assertRegex(step, r'^SEARCH (TABLE )?' + TABLE + ' ', plan)
+            if constraint is not None:
+                self.assertIn(constraint, step, plan)
+        for step in plan:
+            self.assertNotIn('TEMP B-TREE', step, plan)
+
+    def assertQuerysetUsesIndex(self, queryset, constraint=None):
+        sql, params = queryset.query.sql_with_params()
+        self.assertPlanUsesIndex(sql, params, constraint)
+
+    def assertRequestUsesIndex(self, url, data=None, constraint=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data=data)
+        self.assertEqual(response.status_code, 200)
+
+        user_queries = [query['sql'] for query in queries
+                        if re.search(r'FROM "%s"' % TABLE, query['sql'])]
+        self.assertTrue(user_queries)
+        for sql in user_queries:
+            self.assertPlanUsesIndex(sql, constraint=constraint)
+        return response
+
+    @mock.patch.object(KeysetPagination, 'page_size', 2)
+    def test_users_list_uses_index(self):
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('accounts:users-list')
+
+        response = self.assertRequestUsesIndex(url)
+        self.assertRequestUsesIndex(response.data['next'],
+                                    constraint='rowid>?')
+
+    @mock.patch.object(KeysetPagination, 'page_size', 2)
+    def test_users_list_by_status_uses_index(self):
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('accounts:users-list')
+        data = {'status': User.STATUS_CHOICES.creating}
+
+        response = self.assertRequestUsesIndex(
+            url, data, constraint='status=?')
+        self.assertRequestUsesIndex(response.data['next'],
+                                    constraint='status=? AND rowid>?')
+
+    @mock.patch.object(KeysetPagination, 'page_size', 2)
+    def test_closed_users_list_uses_index(self):
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('accounts:users-list')
+        data = {'status': User.STATUS_CHOICES.closed}
+
+        response = self.assertRequestUsesIndex(
+            url, data, constraint='status=?')
+        self.assertRequestUsesIndex(response.data['next'],
+                                    constraint='status_changed>?')
+
+    def test_user_detail_uses_index(self):
+        self.client.force_authenticate(user=self.manager)
+        usr = User.objects.filter(is_manager=False).first()
+        url = reverse('accounts:users-detail', kwargs={'pk': usr.pk})
+
+        self.assertRequestUsesIndex(url)
+
+    def test_passport_number_lookup_uses_index(self):
+        queryset = User.objects.filter(passport_number='BH404')
+        self.assertQuerysetUsesIndex(queryset, 'passport_number=?')
+
+    def test_manager_mails_use_covering_index(self):
+        queryset = User.objects.filter(is_manager=True).\
+            values_list('email', flat=True)
+        self.assertQuerysetUsesIndex(queryset, 'COVERING INDEX')
+
+    def test_waiting_clients_count_uses_covering_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            User.objects.filter(status=User.STATUS_CHOICES.creating).count()
+        self.assertPlanUsesIndex(queries[0]['sql'],
+                                 constraint='COVERING INDEX')
+
+    def test_pin_lookup_uses_index(self):
+        UserFactory(pin='PIN111', is_active=True)
+        with CaptureQueriesContext(connection) as queries:
+            User.objects.get_by_pin('PIN111')
+        self.assertPlanUsesIndex(queries[0]['sql'], constraint='pin=?')
@@ -0,0 +1,95 @@
+import time
+from unittest import mock
+from tempfile import TemporaryDirectory
+
+from django.db import transaction
+from django.core.cache import cache
+
+from accounts import routers
+from accounts.models import User
+from accounts.cache import USERS_VERSION_KEY
+from accounts.tests.factories import UserFactory, ManagerFactory
+from accounts.tests.databases import add_database, remove_database
+
+from rest_framework.test import APITransactionTestCase
+from rest_framework.reverse import reverse
+
+
+class ReplicaRoutingTestCase(APITransactionTestCase):
+    """
+    Replica is separate SQLite file, so routed reads see its data only.
+    """
+    multi_db = True
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = TemporaryDirectory()
+        add_database('replica', cls.directory.name)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        remove_database('replica')
+        cls.directory.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(routers, 'DATABASE_REPLICAS', ['replica'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(routers._state.__dict__.clear)
+
+        self.client.force_authenticate(user=ManagerFactory())
+        self.primary = UserFactory(status=User.STATUS_CHOICES.creating)
+        self.replica = UserFactory.build(password=None)
+        User.objects.using('replica').bulk_create([self.replica])
+
+    def get_emails(self):
+        response = self.client.get(reverse('accounts:users-list'))
+        self.assertEqual(response.status_code, 200)
+        return [row['email'] for row in response.data['results']]
+
+    def test_safe_request_reads_replica(self):
+        # Data of version older than the lag is on replica
+        cache.set(USERS_VERSION_KEY, ('old', int(time.time()) - 10))
+
+        self.assertEqual(self.get_emails(), [self.replica.email])
+
+    def test_new_version_is_read_from_primary(self):
+        self.assertIn(self.primary.email, self.get_emails())
+
+    def test_unsafe_request_uses_primary(self):
+        url = reverse('accounts:users-activate',
+                      kwargs={'pk': self.primary.pk})
+        self.assertEqual(self.client.patch(url).status_code, 200)
+        self.assertIsNotNone(cache.get(routers.LAST_WRITE_KEY))
+
+    def test_reads_after_write_use_primary(self):
+        routers.use_replicas(60)
+        self.assertEqual(User.objects.all().db, 'replica')
+
+        UserFactory()
+        self.assertEqual(User.objects.all().db, 'default')
+
+    def test_lag_tolerance(self):
+        cache.set(routers.LAST_WRITE_KEY, time.time())
+        routers.use_replicas(0)
+        self.assertEqual(User.objects.all().db, 'default')
+        routers.use_replicas(60)
+        self.assertEqual(User.objects.all().db, 'replica')
+
+        cache.set(routers.LAST_WRITE_KEY, time.time() - 10)
+        routers.use_replicas(0)
+        self.assertEqual(User.objects.all().db, 'replica')
+
+    def test_transaction_uses_primary(self):
+        routers.use_replicas(60)
+        with transaction.atomic():
+            self.assertEqual(User.objects.all().db, 'default')
+
+    @mock.patch.object(routers, 'REPLICA_LAG_TOLERANCE', None)
+    def test_view_without_tolerance_uses_primary(self):
+        cache.set(USERS_VERSION_KEY, ('old', int(time.time()) - 10))
+
+        self.assertIn(self.primary.email, self.get_emails())
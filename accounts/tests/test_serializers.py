@@ -0,0 +1,57 @@
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import User
+from accounts.benchmarks import benchmark_serializers
+from accounts.serializers import UserSerializer, UserValuesSerializer
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+class UserValuesSerializerTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = ManagerFactory(status=None)
+        self.client.force_authenticate(user=self.manager)
+        self.clients = UserFactory.create_batch(3, balance=1250)
+
+    def test_same_json_as_model_serializer(self):
+        queryset = User.objects.filter(is_manager=False).order_by('id')
+        renderer = JSONRenderer()
+
+        expected = renderer.render(UserSerializer(queryset, many=True).data)
+        rows = queryset.values(*UserValuesSerializer.fields)
+        actual = renderer.render(UserValuesSerializer(rows, many=True).data)
+
+        self.assertEqual(actual, expected)
+
+    def test_list_and_retrieve(self):
+        User.objects.filter(pk=self.clients[0].pk).update(status='closed')
+
+        response = self.client.get(reverse('accounts:users-list'),
+                                   {'status': 'closed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data['results'][0]),
+                         list(UserSerializer.Meta.fields))
+
+        client = self.clients[1]
+        response = self.client.get(
+            reverse('accounts:users-detail', kwargs={'pk': client.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, UserSerializer(client).data)
+
+    def test_retrieve_not_found(self):
+        for pk in (self.manager.pk, 0, 'abc'):
+            response = self.client.get(
+                reverse('accounts:users-detail', kwargs={'pk': pk}))
+            self.assertEqual(response.status_code, 404)
+
+    def test_benchmark_rolls_back(self):
+        results = benchmark_serializers(sizes=(10, ))
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][0], 10)
+        self.assertEqual(User.objects.count(), 4)
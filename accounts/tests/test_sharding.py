@@ -0,0 +1,284 @@
+import re
+import json
+from datetime import timedelta
+from unittest import mock
+from tempfile import TemporaryDirectory
+
+from django.core import mail
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+
+from accounts import sharding
+from accounts.models import User, UserDirectory, make_pin_digest
+from accounts.pins import refill_pin_pool
+from accounts.ledger import post_entry
+from accounts.counters import get_status_counts, reconcile_status_counters
+from accounts.pagination import KeysetPagination
+from accounts.sharding import (
+    create_user, find_user, get_shard, get_user_shard)
+from accounts.tests.factories import ManagerFactory, UserFactory
+from accounts.tests.databases import add_database, remove_database
+
+from rest_framework.test import APITransactionTestCase
+from rest_framework.reverse import reverse
+
+SHARDS = ['users1', 'users2']
+
+
+# Query budgets are measured without shards, each shard adds its own
+# transaction, directory and id sequence queries
+@override_settings(QUERY_BUDGET_STRICT=False)
+class ShardingTestCase(APITransactionTestCase):
+    """
+    Clients are split between two SQLite files by blocks of two ids.
+    """
+    multi_db = True
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = TemporaryDirectory()
+        for alias in SHARDS:
+            add_database(alias, cls.directory.name)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS:
+            remove_database(alias)
+        cls.directory.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        for name, value in (('USER_SHARDS', SHARDS),
+                            ('USER_SHARD_SIZE', 2)):
+            patcher = mock.patch.object(sharding, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.manager = ManagerFactory()
+        self.client.force_authenticate(user=self.manager)
+
+    def create_clients(self, count, status=User.STATUS_CHOICES.creating):
+        return [create_user(
+            email=f'client{index}@example.com', first_name='First',
+            last_name='Last', passport_number=f'P{index}', status=status)
+            for index in range(count)]
+
+    def get_ids(self, **params):
+        ids = []
+        url = reverse('accounts:users-list')
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            url, params = response.data['next'], {}
+        return ids
+
+    def test_clients_are_split_by_id_range(self):
+        clients = self.create_clients(5)
+
+        # Ids continue after the manager in default database
+        self.assertEqual([user.pk for user in clients],
+                         list(range(self.manager.pk + 1,
+                                    self.manager.pk + 6)))
+        self.assertEqual([user._state.db for user in clients],
+                         [SHARDS[(user.pk - 1) // 2 % 2] for user in clients])
+        self.assertEqual(User.objects.using('users1').count() +
+                         User.objects.using('users2').count(), 5)
+        self.assertEqual(User.objects.count(), 1)
+        # Manager in default database has directory entry too
+        self.assertEqual(UserDirectory.objects.count(), 6)
+        self.assertEqual(get_user_shard(self.manager.pk), DEFAULT_DB_ALIAS)
+
+    @mock.patch.object(sharding, 'USER_SHARDING', 'hash')
+    def test_clients_are_split_by_email_hash(self):
+        for user in self.create_clients(4):
+            self.assertEqual(user._state.db, get_shard(None, user.email))
+            self.assertEqual(get_user_shard(user.pk), user._state.db)
+
+            url = reverse('accounts:users-detail', kwargs={'pk': user.pk})
+            self.assertEqual(self.client.get(url).data['email'], user.email)
+
+        self.assertEqual(get_user_shard(100), DEFAULT_DB_ALIAS)
+        self.assertIsNone(get_user_shard('abc'))
+
+    def test_lookups_use_directory(self):
+        user = self.create_clients(3)[2]
+        user.set_pin('PIN111')
+        user.is_active = True
+        user.save()
+
+        self.assertEqual(find_user(email=user.email), user)
+        self.assertEqual(find_user(passport_number='P2'), user)
+        self.assertEqual(find_user(pin=make_pin_digest('PIN111')), user)
+        with self.assertRaises(User.DoesNotExist):
+            find_user(email='missing@example.com')
+
+        response = self.client.post(reverse('accounts:login'),
+                                    {'pin': 'PIN111'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_manager_logs_in(self):
+        self.manager.set_pin('PIN222')
+        self.manager.save()
+        self.client.force_authenticate(user=None)
+
+        response = self.client.post(reverse('accounts:login'),
+                                    {'pin': 'PIN222'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse('accounts:users-list'),
+            HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_users_registered_before_sharding(self):
+        with mock.patch.object(sharding, 'USER_SHARDS', []):
+            user = UserFactory(is_active=True)
+            user.set_pin('PIN333')
+            user.save()
+        self.assertFalse(UserDirectory.objects.filter(pk=user.pk).exists())
+
+        self.assertEqual(find_user(pin=make_pin_digest('PIN333')), user)
+        url = reverse('accounts:users-detail', kwargs={'pk': user.pk})
+        self.assertEqual(self.client.get(url).data['email'], user.email)
+
+        call_command('sync_user_directory', verbosity=0)
+        self.assertEqual(UserDirectory.objects.get(pk=user.pk).shard,
+                         DEFAULT_DB_ALIAS)
+        new_user = self.create_clients(1)[0]
+        self.assertGreater(new_user.pk, user.pk)
+
+    def test_register_checks_all_shards(self):
+        data = {
+            'first_name': 'Michael',
+            'last_name': 'Spirit',
+            'email': 'user@example.com',
+            'passport_number': 'BH404'
+        }
+        url = reverse('accounts:register')
+        self.assertEqual(self.client.post(url, data).status_code, 201)
+        self.assertEqual(find_user(email='user@example.com').passport_number,
+                         'BH404')
+
+        response = self.client.post(
+            url, dict(data, email='other@example.com'))
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch.object(KeysetPagination, 'page_size', 2)
+    def test_list_merges_shards(self):
+        clients = self.create_clients(5)
+        self.assertEqual(self.get_ids(), [user.pk for user in clients])
+
+        # Closed clients are ordered by status change, newest id first
+        now = timezone.now()
+        for index, user in enumerate(clients):
+            user.status = User.STATUS_CHOICES.closed
+            user.status_changed = now - timedelta(minutes=index)
+            user.save(update_fields=['status', 'status_changed'])
+        self.assertEqual(self.get_ids(status='closed'),
+                         [user.pk for user in reversed(clients)])
+
+    def login_with_mailed_pin(self):
+        call_command('send_queued_mail', verbosity=0)
+        pin = [re.search(r'pin: (\d+)', message.body).group(1)
+               for message in mail.outbox if 'pin: ' in message.body][-1]
+        self.client.force_authenticate(user=None)
+        response = self.client.post(reverse('accounts:login'), {'pin': pin})
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(user=self.manager)
+        return response
+
+    def test_activated_client_logs_in(self):
+        refill_pin_pool(1)
+        data = {
+            'first_name': 'Michael',
+            'last_name': 'Spirit',
+            'email': 'user@example.com',
+            'passport_number': 'BH404'
+        }
+        self.client.post(reverse('accounts:register'), data)
+        user = find_user(email='user@example.com')
+        self.assertIn(user._state.db, SHARDS)
+
+        url = reverse('accounts:users-activate', kwargs={'pk': user.pk})
+        self.assertEqual(self.client.patch(url).status_code, 200)
+
+        tokens = self.login_with_mailed_pin().data
+        self.client.force_authenticate(user=None)
+        response = self.client.post(reverse('accounts:token-refresh'), {
+            'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(
+            reverse('accounts:users-deactivate'),
+            HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('accounts:users-deactivate-confirm',
+                      kwargs={'pk': user.pk})
+        self.assertEqual(self.client.patch(url).status_code, 200)
+        self.assertEqual(User.objects.using(user._state.db).get(
+            pk=user.pk).status, User.STATUS_CHOICES.closed)
+
+    def test_bulk_register_and_activate(self):
+        rows = [{'email': f'client{index}@example.com', 'first_name': 'F',
+                 'last_name': 'L', 'passport_number': f'P{index}'}
+                for index in range(5)]
+        response = self.client.post(reverse('accounts:register-bulk'),
+                                    rows, format='json')
+        self.assertEqual(response.data, {'created': 5, 'errors': []})
+
+        response = self.client.post(reverse('accounts:register-bulk'), [
+            dict(rows[0], email='CLIENT0@example.com')], format='json')
+        self.assertEqual(response.data['created'], 0)
+
+        ids = sorted(UserDirectory.objects.exclude(
+            pk=self.manager.pk).values_list('pk', flat=True))
+        self.assertEqual(len({sharding.get_user_shard(pk) for pk in ids}), 2)
+        response = self.client.patch(
+            reverse('accounts:users-bulk-activate'), {'ids': ids + [100]},
+            format='json')
+        results = {pk: User.STATUS_CHOICES.activated for pk in ids}
+        results[100] = 'not_found'
+        self.assertEqual(response.data, results)
+
+        self.assertEqual(UserDirectory.objects.filter(
+            pin__isnull=False).exclude(pk=self.manager.pk).count(), 5)
+        self.login_with_mailed_pin()
+
+    def test_ledger_and_counters(self):
+        user = self.create_clients(3)[2]
+        post_entry(user.pk, 100)
+        response = self.client.post(reverse('accounts:users-ledger'), [
+            {'user_id': user.pk, 'amount': 50},
+            {'user_id': 100, 'amount': 50}], format='json')
+        self.assertEqual(response.data['posted'], 1)
+
+        user.refresh_from_db()
+        self.assertEqual(user.balance, 150)
+        self.assertEqual(reconcile_status_counters(),
+                         get_status_counts())
+        self.assertEqual(
+            get_status_counts()[User.STATUS_CHOICES.creating], 3)
+
+    def test_export_merges_shards(self):
+        clients = self.create_clients(5)
+
+        response = self.client.get(reverse('accounts:users-export'))
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(row)['id'] for row in rows],
+                         [user.pk for user in clients])
+
+    def test_retrieve_from_shard(self):
+        user = self.create_clients(2)[1]
+
+        url = reverse('accounts:users-detail', kwargs={'pk': user.pk})
+        self.assertEqual(self.client.get(url).data['email'], user.email)
+        url = reverse('accounts:users-detail', kwargs={'pk': 100})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        url = reverse('accounts:users-activate', kwargs={'pk': 'abc'})
+        self.assertEqual(self.client.patch(url).status_code, 404)
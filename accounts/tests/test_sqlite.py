@@ -0,0 +1,74 @@
+import os
+import sqlite3
+from threading import Timer
+from tempfile import TemporaryDirectory
+
+from django.db import OperationalError, connections, transaction
+from django.test import SimpleTestCase
+
+from accounts.tests.databases import remove_database
+
+
+class TunedSQLiteTestCase(SimpleTestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'tuned.sqlite3')
+
+    def connect(self, **options):
+        connections.databases['tuned'] = {
+            'ENGINE': 'accounts.sqlite3',
+            'NAME': self.path,
+            'OPTIONS': options,
+        }
+        self.addCleanup(remove_database, 'tuned')
+        return connections['tuned']
+
+    def lock(self):
+        # Other process holds write lock
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None,
+                                check_same_thread=False)
+        other.execute('BEGIN IMMEDIATE')
+        return other
+
+    def test_pragmas(self):
+        connection = self.connect(busy_timeout=100, cache_size=None)
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout',
+                         'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1,
+                                   'busy_timeout': 100, 'cache_size': -2000})
+
+    def test_transaction_takes_write_lock(self):
+        connection = self.connect()
+        other = sqlite3.connect(self.path, timeout=0)
+
+        with transaction.atomic(using='tuned'):
+            connection.cursor().execute('SELECT 1')
+            with self.assertRaisesRegex(sqlite3.OperationalError, 'locked'):
+                other.execute('BEGIN IMMEDIATE')
+        other.close()
+
+    def test_locked_statement_is_retried(self):
+        connection = self.connect(busy_timeout=0, lock_retries=5)
+        connection.cursor().execute('CREATE TABLE counter (value INTEGER)')
+        other = self.lock()
+        Timer(0.2, other.rollback).start()
+
+        connection.cursor().execute('INSERT INTO counter VALUES (1)')
+
+        other.close()
+
+    def test_retries_are_limited(self):
+        connection = self.connect(busy_timeout=0, lock_retries=0)
+        connection.cursor().execute('CREATE TABLE counter (value INTEGER)')
+        other = self.lock()
+
+        with self.assertRaisesRegex(OperationalError, 'locked'):
+            connection.cursor().execute('INSERT INTO counter VALUES (1)')
+        other.close()
@@ -0,0 +1,137 @@
+from unittest import mock
+from datetime import timedelta
+
+from django.utils import timezone
+from django.core.cache import cache
+from django.test import RequestFactory
+from rest_framework.exceptions import AuthenticationFailed
+
+from accounts import bulk
+from accounts.models import User, TokenRevocation
+from accounts.authentication import SignedTokenAuthentication
+from accounts.tokens import (
+    ACCESS, REFRESH, InvalidToken, deny_list, make_token, read_token)
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+class SignedTokenTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        deny_list.clear()
+        self.user = UserFactory(pin='PIN111', is_active=True,
+                                status=User.STATUS_CHOICES.activated)
+
+    def login(self):
+        response = self.client.post(reverse('accounts:login'),
+                                    data={'pin': 'PIN111'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def authenticate(self, token):
+        request = RequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return SignedTokenAuthentication().authenticate(request)
+
+    def test_access_token_authenticates_without_queries(self):
+        token = self.login()['access']
+        deny_list.sync()
+
+        with self.assertNumQueries(0):
+            user, auth = self.authenticate(token)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.status, User.STATUS_CHOICES.activated)
+        with self.assertNumQueries(1):  # other fields are loaded on access
+            self.assertEqual(user.email, self.user.email)
+
+    def test_invalid_tokens_rejected(self):
+        token = make_token(self.user)
+        user_id, status, expires, signature = token.split('.')
+
+        for invalid in (f'{user_id}.closed.{expires}.{signature}',
+                        make_token(self.user, REFRESH), 'token'):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(invalid)
+
+    def test_expired_token_rejected(self):
+        token = make_token(self.user, ACCESS, now=1000)
+
+        with self.assertRaisesMessage(InvalidToken, 'expired'):
+            read_token(token)
+
+    def test_refresh(self):
+        tokens = self.login()
+
+        response = self.client.post(reverse('accounts:token-refresh'),
+                                    data={'refresh': tokens['refresh']},
+                                    format='json')
+
+        self.assertEqual(response.status_code, 200)
+        user, auth = self.authenticate(response.data['access'])
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_access_token_can_not_refresh(self):
+        tokens = self.login()
+
+        response = self.client.post(reverse('accounts:token-refresh'),
+                                    data={'refresh': tokens['access']},
+                                    format='json')
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivate_revokes_tokens(self):
+        tokens = self.login()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+
+        url = reverse('accounts:users-deactivate')
+        response = self.client.patch(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], self.user.email)
+
+        response = self.client.patch(url)
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post(reverse('accounts:token-refresh'),
+                                    data={'refresh': tokens['refresh']},
+                                    format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivate_confirm_revokes_tokens(self):
+        User.objects.filter(pk=self.user.pk).update(
+            status=User.STATUS_CHOICES.closing)
+        token = self.login()['access']
+
+        self.client.force_authenticate(user=ManagerFactory(status=None))
+        url = reverse('accounts:users-deactivate-confirm',
+                      kwargs={'pk': self.user.pk})
+        response = self.client.patch(url)
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_bulk_close_revokes_tokens(self):
+        User.objects.filter(pk=self.user.pk).update(
+            status=User.STATUS_CHOICES.closing)
+        token = self.login()['access']
+
+        bulk.close_clients([self.user.pk])
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_revocation_of_other_process_synced(self):
+        token = self.login()['access']
+        self.authenticate(token)
+
+        TokenRevocation.objects.create(
+            user=self.user, revoked_at=timezone.now() + timedelta(seconds=1))
+        self.authenticate(token)  # not synced yet
+
+        with mock.patch.object(deny_list, 'sync_interval', 0):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(token)
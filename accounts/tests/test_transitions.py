@@ -0,0 +1,138 @@
+from django.core.cache import cache
+
+from accounts import transitions
+from accounts.models import User
+from accounts.tests.factories import UserFactory, ManagerFactory
+
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+
+
+class ChangeStatusTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_change_status_increments_version(self):
+        usr = UserFactory(status=User.STATUS_CHOICES.activated)
+
+        transitions.change_status(usr, User.STATUS_CHOICES.closing)
+
+        self.assertEqual(usr.version, 1)
+        self.assertEqual(usr.is_active, False)
+        usr = User.objects.get(pk=usr.pk)
+        self.assertEqual(usr.status, User.STATUS_CHOICES.closing)
+        self.assertEqual(usr.version, 1)
+
+    def test_invalid_transition(self):
+        usr = UserFactory(status=User.STATUS_CHOICES.creating)
+
+        with self.assertRaises(transitions.InvalidTransition):
+            transitions.change_status(usr, User.STATUS_CHOICES.closed)
+        self.assertEqual(User.objects.get(pk=usr.pk).version, 0)
+
+    def test_stale_version_conflicts(self):
+        usr = UserFactory(status=User.STATUS_CHOICES.activated)
+        stale = User.objects.get(pk=usr.pk)
+        transitions.change_status(usr, User.STATUS_CHOICES.closing)
+
+        stale.status = User.STATUS_CHOICES.closing
+        with self.assertRaises(transitions.Conflict):
+            transitions.change_status(stale, User.STATUS_CHOICES.closed)
+        self.assertEqual(User.objects.get(pk=usr.pk).status,
+                         User.STATUS_CHOICES.closing)
+
+    def test_change_keeps_concurrent_changes(self):
+        usr = UserFactory(status=User.STATUS_CHOICES.activated, balance=10)
+        User.objects.filter(pk=usr.pk).update(first_name='Changed',
+                                              balance=20)
+
+        transitions.change_status(usr, User.STATUS_CHOICES.closing)
+
+        usr = User.objects.get(pk=usr.pk)
+        self.assertEqual(usr.first_name, 'Changed')
+        self.assertEqual(usr.balance, 20)
+
+    def test_change_statuses_reports_failures(self):
+        closing = [UserFactory(status=User.STATUS_CHOICES.closing)
+                   for _ in range(3)]
+        creating = UserFactory(status=User.STATUS_CHOICES.creating)
+        User.objects.filter(pk=closing[0].pk).update(version=5)
+
+        changed, failed = transitions.change_statuses(
+            closing + [creating], User.STATUS_CHOICES.closed)
+
+        self.assertEqual({user.pk for user in changed},
+                         {closing[1].pk, closing[2].pk})
+        self.assertEqual(failed, {closing[0].pk: transitions.CONFLICT,
+                                  creating.pk: transitions.INVALID_STATUS})
+        self.assertEqual(User.objects.filter(
+            status=User.STATUS_CHOICES.closed).count(), 2)
+
+
+class StatusAPITestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = ManagerFactory()
+        self.client.force_authenticate(user=self.manager)
+
+    def test_activate_returns_new_version(self):
+        usr = UserFactory(status=User.STATUS_CHOICES.creating)
+
+        url = reverse('accounts:users-activate', kwargs={'pk': usr.pk})
+        response = self.client.patch(url, data={'version': 0},
+                                     format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], 1)
+        self.assertEqual(response.data['is_active'], True)
+
+    def test_activate_stale_version_conflicts(self):
+        usr = UserFactory(status=User.STATUS_CHOICES.creating)
+        User.objects.filter(pk=usr.pk).update(version=3)
+
+        url = reverse('accounts:users-activate', kwargs={'pk': usr.pk})
+        response = self.client.patch(url, data={'version': 2},
+                                     format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(User.objects.get(pk=usr.pk).status,
+                         User.STATUS_CHOICES.creating)
+
+    def test_activate_twice_conflicts(self):
+        usr = UserFactory(status=User.STATUS_CHOICES.creating)
+        url = reverse('accounts:users-activate', kwargs={'pk': usr.pk})
+
+        self.assertEqual(self.client.patch(url).status_code, 200)
+        self.assertEqual(self.client.patch(url).status_code, 409)
+
+    def test_confirm_not_closing_client(self):
+        usr = UserFactory(status=User.STATUS_CHOICES.activated)
+
+        url = reverse('accounts:users-deactivate-confirm',
+                      kwargs={'pk': usr.pk})
+        response = self.client.patch(url)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(User.objects.get(pk=usr.pk).status,
+                         User.STATUS_CHOICES.activated)
+
+    def test_admin_actions(self):
+        self.manager.is_staff = True
+        self.manager.is_superuser = True
+        self.manager.save()
+        self.client.force_login(self.manager)
+        creating = UserFactory(status=User.STATUS_CHOICES.creating)
+        closing = UserFactory(status=User.STATUS_CHOICES.closing)
+        url = reverse('admin:accounts_user_changelist')
+
+        self.client.post(url, {'action': 'activate',
+                               '_selected_action': [creating.pk, closing.pk]})
+        self.client.post(url, {'action': 'confirm_deactivation',
+                               '_selected_action': [closing.pk]})
+
+        self.assertEqual(User.objects.get(pk=creating.pk).status,
+                         User.STATUS_CHOICES.activated)
+        self.assertEqual(User.objects.get(pk=closing.pk).status,
+                         User.STATUS_CHOICES.closed)
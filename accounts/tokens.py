@@ -0,0 +1,150 @@
+import time
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.translation import ugettext_lazy as _
+
+from accounts.models import TokenRevocation
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+# Token lifetimes in seconds
+TOKEN_LIFETIMES = {
+    ACCESS: getattr(settings, 'ACCESS_TOKEN_LIFETIME', 15 * 60),
+    REFRESH: getattr(settings, 'REFRESH_TOKEN_LIFETIME', 7 * 24 * 60 * 60),
+}
+# Revocation made by other process takes effect after this many seconds
+DENY_LIST_SYNC_INTERVAL = getattr(
+    settings, 'TOKEN_DENY_LIST_SYNC_INTERVAL', 5)
+# Revocations committed after their ``revoked_at`` time are still synced
+DENY_LIST_SYNC_OVERLAP = 60
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _sign(kind, payload):
+    return salted_hmac(f'accounts.tokens.{kind}', payload).hexdigest()
+
+
+def make_token(user, kind=ACCESS, now=None):
+    """
+    Returns signed token ``<user id>.<status>.<expires>.<signature>``,
+    signature is HMAC of the rest keyed with ``SECRET_KEY``.
+    """
+    expires = int(now or time.time()) + TOKEN_LIFETIMES[kind]
+    payload = f'{user.pk}.{user.status or ""}.{expires}'
+    return f'{payload}.{_sign(kind, payload)}'
+
+
+def issue_tokens(user):
+    now = time.time()
+    return {
+        'access': make_token(user, ACCESS, now),
+        'refresh': make_token(user, REFRESH, now),
+        'expires_in': TOKEN_LIFETIMES[ACCESS]
+    }
+
+
+def read_token(token, kind=ACCESS):
+    """
+    Returns user id and status of valid token, raises ``InvalidToken``
+    otherwise. Database is queried only to sync deny list.
+    """
+    try:
+        payload, signature = token.rsplit('.', 1)
+        user_id, status, expires = payload.split('.')
+        user_id, expires = int(user_id), int(expires)
+    except ValueError:
+        raise InvalidToken(_('Malformed token.'))
+
+    if not constant_time_compare(signature, _sign(kind, payload)):
+        raise InvalidToken(_('Invalid token signature.'))
+    if expires <= time.time():
+        raise InvalidToken(_('Token has expired.'))
+    if deny_list.is_revoked(user_id, expires - TOKEN_LIFETIMES[kind]):
+        raise InvalidToken(_('Token has been revoked.'))
+
+    return user_id, status or None
+
+
+class DenyList(object):
+    """
+    In-process map of user id to time of the last ``TokenRevocation``.
+    Synced from database at most every ``sync_interval`` seconds, entries
+    older than the longest token lifetime are dropped.
+    """
+
+    def __init__(self, sync_interval):
+        self.sync_interval = sync_interval
+        self.revoked = {}
+        self.synced = None
+        self.lock = threading.Lock()
+
+    def is_revoked(self, user_id, issued):
+        if self.synced is None or \
+                time.time() - self.synced >= self.sync_interval:
+            self.sync()
+        revoked_at = self.revoked.get(user_id)
+        # Tokens issued in the second of revocation are revoked too
+        return revoked_at is not None and issued <= revoked_at
+
+    def add(self, user_ids, revoked_at):
+        with self.lock:
+            for user_id in user_ids:
+                self.revoked[user_id] = max(
+                    revoked_at, self.revoked.get(user_id, revoked_at))
+
+    def sync(self):
+        now = time.time()
+        max_lifetime = max(TOKEN_LIFETIMES.values())
+        with self.lock:
+            if self.synced is None:
+                since = now - max_lifetime
+            else:
+                since = self.synced - DENY_LIST_SYNC_OVERLAP
+            # Concurrent requests skip sync instead of repeating it
+            self.synced = now
+
+        rows = TokenRevocation.objects.filter(
+            revoked_at__gte=datetime.fromtimestamp(since, timezone.utc)).\
+            values_list('user_id', 'revoked_at')
+        revoked = [(user_id, revoked_at.timestamp())
+                   for user_id, revoked_at in rows]
+
+        with self.lock:
+            for user_id, revoked_at in revoked:
+                self.revoked[user_id] = max(
+                    revoked_at, self.revoked.get(user_id, revoked_at))
+            self.revoked = {user_id: revoked_at for user_id, revoked_at
+                            in self.revoked.items()
+                            if revoked_at > now - max_lifetime}
+
+    def clear(self):
+        with self.lock:
+            self.revoked = {}
+            self.synced = None
+
+
+deny_list = DenyList(DENY_LIST_SYNC_INTERVAL)
+
+
+def revoke_tokens(user_ids):
+    """
+    Revokes all signed tokens of given users issued until now. Takes
+    effect immediately in this process and after deny list sync in others.
+    """
+    now = timezone.now()
+    revoked = set(TokenRevocation.objects.filter(user_id__in=user_ids).
+                  values_list('user_id', flat=True))
+    if revoked:
+        TokenRevocation.objects.filter(user_id__in=revoked).update(
+            revoked_at=now)
+    TokenRevocation.objects.bulk_create(
+        TokenRevocation(user_id=user_id, revoked_at=now)
+        for user_id in user_ids if user_id not in revoked)
+    deny_list.add(user_ids, now.timestamp())
@@ -0,0 +1,151 @@
+from django.db import router
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from accounts.models import User
+from accounts.tokens import revoke_tokens
+from accounts.cache import bump_users_versions, invalidate_user_tokens
+from accounts.counters import count_status_change
+from accounts.history import record_status_changes
+from accounts.sharding import atomic_on_shard, update_directories
+
+STATUS = User.STATUS_CHOICES
+# Status to statuses it can be reached from
+TRANSITIONS = {
+    STATUS.activated: (STATUS.creating, ),
+    STATUS.closing: (STATUS.activated, ),
+    STATUS.closed: (STATUS.closing, ),
+}
+# Fields set together with status
+TRANSITION_FIELDS = {
+    STATUS.activated: {'is_active': True},
+    STATUS.closing: {'is_active': False},
+    STATUS.closed: {},
+}
+
+INVALID_STATUS = 'invalid_status'
+CONFLICT = 'conflict'
+
+
+class TransitionError(Exception):
+    pass
+
+
+class InvalidTransition(TransitionError):
+
+    def __init__(self, user, status):
+        super().__init__(_('Can not change status from {} to {}.').format(
+            user.status, status))
+
+
+class Conflict(TransitionError):
+
+    def __init__(self, user):
+        super().__init__(_('Client was changed by other request.'))
+
+
+def can_change_status(user, status):
+    return user.status in TRANSITIONS.get(status, ())
+
+
+def change_status(user, status, **fields):
+    """
+    Moves loaded ``user`` to ``status`` with one conditional UPDATE of
+    status, its fields and given ``fields``. UPDATE matches only while
+    status and version are the loaded ones, otherwise ``Conflict`` is
+    raised, no row is locked. ``user`` is updated in place.
+    """
+    if not can_change_status(user, status):
+        raise InvalidTransition(user, status)
+
+    alias = router.db_for_write(User, instance=user)
+    values = dict(TRANSITION_FIELDS[status], status=status,
+                  status_changed=timezone.now(), **fields)
+    with atomic_on_shard(alias):
+        updated = User.objects.using(alias).filter(
+            pk=user.pk, status=user.status, version=user.version).update(
+            version=F('version') + 1, **values)
+        if not updated:
+            raise Conflict(user)
+
+        update_directories([user], fields)
+        _changed([user], user.status, status, values)
+    return user
+
+
+def change_statuses(users, status, **fields):
+    """
+    Bulk ``change_status`` of loaded ``users``, one UPDATE for all users
+    of the same shard in the same status. Values of ``fields`` may be
+    expressions, e.g. ``Case`` with value for each user.
+
+    Returns changed users and dict of user id to ``INVALID_STATUS`` or
+    ``CONFLICT`` for the rest.
+    """
+    failed = {}
+    groups = {}
+    for user in users:
+        if can_change_status(user, status):
+            alias = router.db_for_write(User, instance=user)
+            groups.setdefault((alias, user.status), []).append(user)
+        else:
+            failed[user.pk] = INVALID_STATUS
+
+    changed = []
+    for (alias, previous_status), group in groups.items():
+        with atomic_on_shard(alias):
+            changed += _change_group(group, alias, previous_status, status,
+                                     fields, failed)
+    return changed, failed
+
+
+def _change_group(users, alias, previous_status, status, fields, failed):
+    by_version = {}
+    for user in users:
+        by_version.setdefault(user.version, []).append(user.pk)
+    matches_version = Q()
+    for version, pks in by_version.items():
+        matches_version |= Q(version=version, pk__in=pks)
+
+    now = timezone.now()
+    values = dict(TRANSITION_FIELDS[status], status=status,
+                  status_changed=now)
+    updated = User.objects.using(alias).filter(
+        matches_version, status=previous_status).update(
+        version=F('version') + 1, **values, **fields)
+
+    if updated < len(users):
+        # Rows changed by other request have other version or time
+        changed = set(User.objects.using(alias).filter(
+            pk__in=[user.pk for user in users], status=status,
+            status_changed=now).values_list('pk', flat=True))
+        for user in users:
+            if user.pk not in changed:
+                failed[user.pk] = CONFLICT
+        users = [user for user in users if user.pk in changed]
+
+    if users:
+        update_directories(users, fields)
+        _changed(users, previous_status, status, values)
+    return users
+
+
+def _changed(users, previous_status, status, values):
+    record_status_changes(users, previous_status, status,
+                          values['status_changed'])
+    for user in users:
+        for field, value in values.items():
+            setattr(user, field, value)
+        user.version += 1
+    count_status_change(previous_status, status, len(users))
+
+    # UPDATE does not send ``post_save``, see ``accounts.signals``
+    pks = [user.pk for user in users]
+    bump_users_versions(pks)
+    invalidate_user_tokens(pks)
+    # Clients get pin and tokens only after ``creating`` status
+    if previous_status != STATUS.creating:
+        revoke_tokens(pks)
+    for user in users:
+        user._saved_auth_state = user.get_auth_state()
@@ -1,6 +1,7 @@
 from django.conf.urls import url
 
-from accounts.views import RegisterView, LoginView, UserAPI
+from accounts.views import (
+    RegisterView, BulkRegisterView, LoginView, RefreshTokenView, UserAPI)
 
 from rest_framework import routers
 
@@ -8,8 +9,12 @@ router = routers.DefaultRouter()
 router.register(r'users', UserAPI, base_name='users')
 
 urlpatterns = [
+    url(r'^auth/registration/bulk/', BulkRegisterView.as_view(),
+        name='register-bulk'),
     url(r'^auth/registration/', RegisterView.as_view(), name='register'),
     url(r'^auth/login/', LoginView.as_view(), name='login'),
+    url(r'^auth/token/refresh/', RefreshTokenView.as_view(),
+        name='token-refresh'),
 ]
 
 urlpatterns += router.urls
@@ -1,28 +1,72 @@
-import string
-from factory.fuzzy import FuzzyText
+import heapq
+from hashlib import md5
+from itertools import islice
+from operator import itemgetter
+from collections.abc import Iterator
 
+from django.db import transaction
 from django.conf import settings
-from django.utils import timezone
-from django.core.mail import send_mail
-from django.contrib.auth import authenticate
-from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.utils.http import quote_etag
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.translation import ugettext_lazy as _
 
 from rest_framework.response import Response
-from rest_framework import status, viewsets, mixins
+from rest_framework import status, viewsets, mixins, serializers, exceptions
+from rest_framework.generics import GenericAPIView, get_object_or_404
+from rest_framework.parsers import JSONParser
 from rest_auth.views import LoginView as BaseLoginView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import list_route, detail_route
 from rest_auth.registration.urls import RegisterView as BaseRegisterView
 
-from accounts.models import User
+from accounts.mail import queue_mail, activation_mail
+from accounts.cache import (
+    USERS_RESPONSE_KEY, USERS_RESPONSE_TIMEOUT, get_users_version)
+from accounts.counters import get_status_counts
+from accounts.models import User, make_pin_digest
+from accounts.transitions import TransitionError, change_status
+from accounts.pins import claim_pin, retry_pin_collisions
+from accounts.authentication import SignedTokenAuthentication
+from accounts.tokens import ACCESS, TOKEN_LIFETIMES, issue_tokens, make_token
+from accounts.bulk import (
+    register_clients, activate_clients, close_clients)
+from accounts.ledger import post_entries
+from accounts.history import get_status_report
+from accounts.metrics import render as render_metrics
+from accounts.routers import set_last_write
+from accounts.sharding import (
+    get_shard_querysets, using_all_shards, using_user_shard)
+from accounts.parsers import NDJSONParser, CSVParser
+from accounts.renderers import NDJSONRenderer, CSVRenderer
 from accounts.permissions import IsManager
+from accounts.pagination import KeysetPagination
 from accounts.serializers import (
     UserSerializer,
+    UserValuesSerializer,
     RegisterSerializer,
-    LoginSerializer
+    LoginSerializer,
+    RefreshTokenSerializer,
+    BulkIdsSerializer,
+    LedgerEntrySerializer,
+    StatusChangeSerializer,
+    StatusReportSerializer
 )
 
+# Rows read from database per query of streaming export
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 1000)
+# Bearer token of metrics scraper, without it metrics are served to staff
+# only, unless ``METRICS_PUBLIC`` is set
+METRICS_TOKEN = getattr(settings, 'METRICS_TOKEN', None)
+METRICS_PUBLIC = getattr(settings, 'METRICS_PUBLIC', False)
+
+
+class StatusConflict(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _('Client status was changed.')
+
 
 class RegisterView(BaseRegisterView):
     """
@@ -31,6 +75,10 @@ class RegisterView(BaseRegisterView):
     Required fields: email, first_name, last_name, passport_number
     """
     serializer_class = RegisterSerializer
+    # Queries allowed in strict mode, see ``accounts.middleware``. Budgets
+    # are measured on cold paths: new status counter and rollup rows,
+    # empty caches and empty pin pool
+    query_budget = 23
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -39,24 +87,73 @@ class RegisterView(BaseRegisterView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class BulkRegisterView(GenericAPIView):
+    """
+    API call for manager to register many clients at once
+
+    Accepts JSON list, NDJSON or CSV (with header row) of clients with
+    fields: email, first_name, last_name, passport_number.
+    Returns number of created clients and errors of rejected rows.
+    """
+    permission_classes = (IsManager, )
+    parser_classes = (JSONParser, NDJSONParser, CSVParser)
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        # JSON body must be a list, stream parsers return iterators of rows
+        if not isinstance(rows, (list, Iterator)):
+            return Response({'detail': _('Expected a list of clients.')},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(register_clients(rows))
+
+
 class LoginView(BaseLoginView):
     """
     API cal for login
     
     Required field: pin code 
     (pin code generated when manager activate client account)
+    Returns signed access and refresh tokens, access token is sent as
+    ``Authorization: Bearer <token>`` header
     """
     serializer_class = LoginSerializer
+    query_budget = 2
 
-    def post(self, request, *args, **kwargs):
-        if not User.objects.filter(pin=request.data['pin']).exists():
-            return Response({"detail": _("User with this pin does not exist")},
-                            status=status.HTTP_404_NOT_FOUND)
+    def login(self):
+        # Signed tokens are not stored, so there is no token row and no
+        # session login
+        self.user = self.serializer.validated_data['user']
+        if not self.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+
+    def get_response(self):
+        return Response(issue_tokens(self.user))
+
+
+class RefreshTokenView(GenericAPIView):
+    """
+    API call for new access token
+
+    Required field: refresh token returned by login
+    """
+    permission_classes = (AllowAny, )
+    authentication_classes = ()
+    serializer_class = RefreshTokenSerializer
+    query_budget = 2
 
-        return super().post(request, *args, **kwargs)
+    def get_authenticate_header(self, request):
+        # Failed refresh is 401, client has to login again
+        return SignedTokenAuthentication.keyword
 
-    def process_login(self):
-        authenticate(pin=self.request.data['pin'])
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({
+            'access': make_token(serializer.validated_data['user'], ACCESS),
+            'expires_in': TOKEN_LIFETIMES[ACCESS]
+        })
 
 
 class UserAPI(mixins.RetrieveModelMixin,
@@ -64,9 +161,29 @@ class UserAPI(mixins.RetrieveModelMixin,
               viewsets.GenericViewSet):
     serializer_class = UserSerializer
     permission_classes = (IsManager, )
+    pagination_class = KeysetPagination
+    # Bulk actions run the same queries for each chunk of ids
+    query_budget = {
+        'list': 3,
+        'retrieve': 3,
+        'counts': 2,
+        'status_report': 2,
+        'activate': 31,
+        'deactivate': 27,
+        'deactivate_confirm': 26,
+        'bulk_activate': 26,
+        'bulk_deactivate_confirm': 21,
+        'ledger': 8,
+    }
+    # Seconds of replica lag tolerated by reads, see ``accounts.routers``
+    replica_lag_tolerance = {
+        'counts': 10,
+        'status_report': 60,
+        'export': 60,
+    }
 
     def get_queryset(self):
-        return User.objects.filter(is_manager=False)
+        return User.objects.filter(is_manager=False).order_by('id')
 
     def filter_queryset(self, queryset):
         queryset = self.get_queryset()
@@ -76,7 +193,7 @@ class UserAPI(mixins.RetrieveModelMixin,
                 queryset = queryset.filter(status=status)
 
                 if status == 'closed':
-                    queryset = queryset.order_by('status_changed')
+                    queryset = queryset.order_by('status_changed', 'id')
 
         return queryset
 
@@ -85,79 +202,265 @@ class UserAPI(mixins.RetrieveModelMixin,
         API call for client list
         
         :query_param client status (creating, activated, closing, closed)
+        :query_param cursor: page cursor from ``next``/``previous`` links
         """
-        queryset = self.filter_queryset(self.queryset)
-        serializer = self.get_serializer(queryset, many=True)
+        return self.get_versioned_response(get_users_version(),
+                                           self.list_data)
 
-        return Response(serializer.data)
+    def list_data(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        # Ordering fields are needed for page cursor
+        ordering = [field.lstrip('-') for field in queryset.query.order_by]
+        fields = UserValuesSerializer.fields + tuple(
+            field for field in ordering
+            if field not in UserValuesSerializer.fields)
 
-    def retrieve(self, request, *args, **kwargs):
+        page = self.paginate_queryset(
+            using_all_shards(queryset.values(*fields)))
+        serializer = UserValuesSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data).data
+
+    def retrieve(self, request, pk=None):
         """
         API call for account detail
         """
-        return super().retrieve(request, *args, **kwargs)
+        def retrieve_data():
+            queryset = using_user_shard(
+                self.filter_queryset(self.get_queryset()), pk)
+            row = get_object_or_404(
+                queryset.values(*UserValuesSerializer.fields), pk=pk)
+            return UserValuesSerializer(row).data
+
+        return self.get_versioned_response(get_users_version(pk),
+                                           retrieve_data)
+
+    def get_versioned_response(self, version, get_data):
+        """
+        Returns 304 response if client has current ``version`` of data
+        (``If-None-Match``). Otherwise returns data cached under the
+        version, ``get_data`` is called on cache miss.
+
+        ``Last-Modified`` is not sent, version time is truncated to seconds
+        and versions of the same second would be taken as not modified.
+        """
+        token, modified = version
+        # Page links in data are absolute
+        url = self.request.build_absolute_uri()
+        etag = quote_etag(md5(' '.join((
+            token, url, self.request.accepted_media_type)).encode()).
+            hexdigest())
+        response = get_conditional_response(self.request, etag=etag)
+
+        if response is None:
+            key = USERS_RESPONSE_KEY.format(
+                md5(f'{token} {url}'.encode()).hexdigest())
+            data = cache.get(key)
+            if data is None:
+                # Data must not be older than version, which is truncated
+                # to seconds
+                set_last_write(modified + 1)
+                data = get_data()
+                cache.set(key, data, USERS_RESPONSE_TIMEOUT)
+            response = Response(data)
+
+        response['ETag'] = etag
+        return response
+
+    def change_status(self, user, status, **fields):
+        """
+        Changes client status and returns changed client. Optional
+        ``version`` of request data must match current one, so change is
+        not based on outdated client data.
+        """
+        serializer = StatusChangeSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        version = serializer.validated_data.get('version')
+        if version is not None:
+            user.version = version
+
+        try:
+            change_status(user, status, **fields)
+        except TransitionError as error:
+            raise StatusConflict(error.args[0])
+        return user
 
     @detail_route(methods=['PATCH'], permission_classes=[IsManager])
+    @retry_pin_collisions
+    @transaction.atomic
     def activate(self, request, pk=None):
         """
         API call for activate new client
         After activation will sen email to client with generated pin
         
         :param pk: Client id what will be activated
+        :param version: optional client version, to fail if client changed
         """
-        user = self.get_queryset().get(pk=pk)
-        user.is_active = True
-        user.status = User.STATUS_CHOICES.activated
-        user.status_changed = timezone.now()
-        user.pin = FuzzyText(length=15, chars=string.digits).fuzz()
+        user = get_object_or_404(
+            using_user_shard(self.get_queryset(), pk), pk=pk)
+        pin = claim_pin()
+        self.change_status(user, User.STATUS_CHOICES.activated,
+                           pin=make_pin_digest(pin))
 
-        serializer = self.get_serializer(instance=user, data=request.data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        queue_mail(**activation_mail(user, pin))
 
-        mail_context = {
-            'pin': user.pin,
-            'first_name': user.first_name,
-            'last_name': user.last_name
-        }
-        template_path = 'email/client_account_have_been_activated.txt'
-        manager_mails = list(User.objects.filter(is_manager=True).
-                             values_list('email', flat=True))
-        send_mail(  # Mail pin to client
-            subject=_('Your account approved in buddha application!'),
-            message=render_to_string(template_path, mail_context),
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=manager_mails)
-
-        return Response(serializer.data)
+        return Response(UserSerializer(user).data)
 
     @list_route(methods=['PATCH'], permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def deactivate(self, request):
         """
         API call for client to deactivate his account. 
         Client can deactivate only himself (must be logged in)
         """
-        self.request.user.status = User.STATUS_CHOICES.closing
-        self.request.user.status_changed = timezone.now()
-        self.request.user.is_active = False
-
-        serializer = self.get_serializer(
-            instance=self.request.user, data=request.data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data)
+        # Signed token user has only few fields loaded
+        user = using_user_shard(User.objects.all(), request.user.pk).get(
+            pk=request.user.pk)
+        self.change_status(user, User.STATUS_CHOICES.closing)
+        return Response(UserSerializer(user).data)
 
     @detail_route(methods=['PATCH'], permission_classes=[IsManager])
+    @transaction.atomic
     def deactivate_confirm(self, request, pk=None):
         """
         API call for confirm user deactivation account
         :param pk: pk=id for user with closing status
+        :param version: optional client version, to fail if client changed
         """
-        user = self.get_queryset().get(pk=pk)
-        user.status = User.STATUS_CHOICES.closed
-        user.status_changed = timezone.now()
+        user = get_object_or_404(
+            using_user_shard(self.get_queryset(), pk), pk=pk)
+        self.change_status(user, User.STATUS_CHOICES.closed)
+        return Response(UserSerializer(user).data)
 
-        serializer = self.get_serializer(instance=user, data=request.data)
+    @list_route(methods=['PATCH'], permission_classes=[IsManager])
+    def bulk_activate(self, request):
+        """
+        API call for activate many new clients at once
+
+        :param ids: list of client ids to activate
+        Returns result for each id (activated, not_found, invalid_status,
+        conflict)
+        """
+        serializer = BulkIdsSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data)
+        return Response(activate_clients(serializer.validated_data['ids']))
+
+    @list_route(methods=['PATCH'], permission_classes=[IsManager])
+    def bulk_deactivate_confirm(self, request):
+        """
+        API call for confirm deactivation of many clients at once
+
+        :param ids: list of client ids with closing status
+        Returns result for each id (closed, not_found, invalid_status,
+        conflict)
+        """
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(close_clients(serializer.validated_data['ids']))
+
+    @list_route(methods=['POST'], permission_classes=[IsManager])
+    def ledger(self, request):
+        """
+        API call for posting many balance changes in one transaction
+
+        Accepts list of entries with fields: user_id, amount,
+        idempotency_key (optional), description (optional).
+        Entries with already posted idempotency_key are skipped, so failed
+        request can be repeated. Returns number of posted and skipped
+        entries and errors of entries for unknown users.
+        """
+        if not isinstance(request.data, list):
+            return Response({'detail': _('Expected a list of entries.')},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = LedgerEntrySerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        return Response(post_entries(serializer.validated_data))
+
+    @list_route(methods=['GET'], permission_classes=[IsManager],
+                renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        API call for streaming export of all clients
+
+        :query_param format: ndjson (default) or csv
+        :query_param status: client status
+        :query_param changed_since: export clients with status changed
+            at or after this ISO 8601 date/time
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        if 'changed_since' in request.query_params:
+            changed_since = serializers.DateTimeField().run_validation(
+                request.query_params['changed_since'])
+            queryset = queryset.filter(status_changed__gte=changed_since)
+
+        fields = UserSerializer.Meta.fields + ('status', 'status_changed')
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(fields, self.export_chunks(
+                get_shard_querysets(queryset), fields)),
+            content_type=renderer.media_type)
+        response['Content-Disposition'] = \
+            f'attachment; filename="clients.{renderer.format}"'
+        return response
+
+    @staticmethod
+    def export_chunks(querysets, fields):
+        """
+        Reads rows by short keyset queries, so memory does not depend on
+        number of rows and no read lock is held while client downloads.
+        Rows of querysets of all shards are merged by id.
+        """
+        id_index = fields.index('id')
+        rows = heapq.merge(*[
+            UserAPI.export_rows(queryset, fields, id_index)
+            for queryset in querysets], key=itemgetter(id_index))
+        while True:
+            chunk = list(islice(rows, EXPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            yield chunk
+
+    @staticmethod
+    def export_rows(queryset, fields, id_index):
+        queryset = queryset.order_by('id').values_list(*fields)
+        last_id = 0
+        while True:
+            chunk = list(queryset.filter(id__gt=last_id)[:EXPORT_CHUNK_SIZE])
+            if not chunk:
+                break
+            yield from chunk
+            last_id = chunk[-1][id_index]
+
+    @list_route(methods=['GET'], permission_classes=[IsManager])
+    def counts(self, request):
+        """
+        API call for number of clients in each status
+        """
+        return Response(get_status_counts())
+
+    @list_route(methods=['GET'], permission_classes=[IsManager])
+    def status_report(self, request):
+        """
+        API call for clients funnel and average time between statuses
+
+        :query_param since: first day of report, 30 days ago by default
+        :query_param until: last day of report, today by default
+        """
+        serializer = StatusReportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(get_status_report(**serializer.validated_data))
+
+
+def metrics(request):
+    """
+    Prometheus metrics of accounts API, served without database queries
+    except cached client counts
+    """
+    allowed = METRICS_PUBLIC or request.user.is_staff or (
+        METRICS_TOKEN and constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''),
+            f'Bearer {METRICS_TOKEN}'))
+    if not allowed:
+        return HttpResponse(status=401)
+    return HttpResponse(render_metrics(),
+                        content_type='text/plain; version=0.0.4')
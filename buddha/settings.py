@@ -1,4 +1,5 @@
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -43,6 +44,10 @@ AUTH_USER_MODEL = 'accounts.User'
 ADMIN_URL = r'^admin/'
 
 MIDDLEWARE = [
+    'accounts.metrics.MetricsMiddleware',
+    'accounts.profiling.ProfilingMiddleware',
+    'accounts.middleware.QueryInstrumentationMiddleware',
+    'accounts.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,14 +84,46 @@ WSGI_APPLICATION = 'buddha.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # WAL journal, write lock taken at transaction start and retries of
+        # locked statements, pragmas are set in OPTIONS, see
+        # accounts.sqlite3.base
+        'ENGINE': 'accounts.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Connection (and its page cache) is reused by requests of thread
+        'CONN_MAX_AGE': 60,
+    }
+}
+
+# Safe requests may read from read-only copies of default database, see
+# accounts.routers. Locally copy of SQLite file works as replica, e.g.
+# ``cp db.sqlite3 replica.sqlite3`` and add to DATABASES:
+# 'replica': {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+#     'TEST': {'MIRROR': 'default'},
+# }
+DATABASE_REPLICAS = []
+# Seconds which replicas may be behind default database
+DATABASE_REPLICA_LAG = 1
+# Users may be split between several databases, see accounts.sharding.
+# E.g. USER_SHARDS = ['users1', 'users2'] with both aliases in DATABASES
+USER_SHARDS = []
+DATABASE_ROUTERS = [
+    'accounts.routers.ShardRouter',
+    'accounts.routers.ReplicaRouter',
+]
+
+# Cached data is invalidated by model signals, so with several server
+# processes use shared backend (e.g. memcached) to keep it consistent
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
 AUTHENTICATION_BACKENDS = (
-    'django.contrib.auth.backends.ModelBackend',
     'accounts.auth_backend.PinBackend',
+    'django.contrib.auth.backends.ModelBackend',
     'allauth.account.auth_backends.AuthenticationBackend',
 )
 
@@ -101,7 +138,8 @@ REST_AUTH_REGISTER_SERIALIZERS = {
 }
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.SignedTokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ),
     'DEFAULT_RENDERER_CLASSES': (
@@ -145,3 +183,7 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 DEFAULT_FROM_EMAIL = 'admin@buddha.com'
+
+# Tests fail on requests over query budget of their view, see
+# accounts.middleware
+QUERY_BUDGET_STRICT = sys.argv[1:2] == ['test']
@@ -3,6 +3,8 @@ from django.contrib import admin
 
 from rest_framework_swagger.views import get_swagger_view
 
+from accounts.views import metrics
+
 schema_view = get_swagger_view(title='swagger')
 
 prefix = r'^api/v1/'
@@ -10,6 +12,7 @@ prefix = r'^api/v1/'
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^docs/', schema_view, name='swagger'),
+    url(r'^metrics$', metrics, name='metrics'),
 
     url(prefix, include([
         url(r'^accounts/', include("accounts.urls", namespace="accounts")),